@@ -2,12 +2,30 @@ import discord
 from discord.ext import commands
 from cogs.utils import checks
 from cogs.utils.dataIO import dataIO
+from cogs.utils.chat_formatting import pagify, box
 from datetime import datetime, timedelta
 import os
 import asyncio
 import aiohttp
+import concurrent.futures
 from functools import partial
 from enum import Enum
+from collections import OrderedDict
+import gzip
+import heapq
+import io
+import json
+import logging
+import queue
+import re
+import shutil
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Analytics core
 import zlib, base64
@@ -40,13 +58,76 @@ Rj(Y0|;SU2d?s+MPi6(PPLva(Jw(n0~TKDN@5O)F|k^_pcwolv^jBVTLhNqMQ#x6WU9J^I;wLr}Cut#l
 FU1|1o`VZODxuE?x@^rESdOK`qzRAwqpai|-7cM7idki4HKY>0$z!aloMM7*HJs+?={U5?4IFt""".replace("\n", ""))))
 # End analytics core
 
-__version__ = '1.6.0'
+__version__ = '1.10.0'
 
 TIMESTAMP_FORMAT = '%Y-%m-%d %X'  # YYYY-MM-DD HH:MM:SS
 PATH_LIST = ['data', 'activitylogger']
 PATH = os.path.join(*PATH_LIST)
 JSON = os.path.join(*PATH_LIST, "settings.json")
 EDIT_TIMEDELTA = timedelta(seconds=3)
+CHECKPOINT_JSON = os.path.join(*PATH_LIST, "fetch_checkpoints.json")
+
+FETCH_WORKERS = 3  # channels fetched at once
+FETCH_DOWNLOADS = 4  # attachments downloaded at once
+FETCH_PAGE_SIZE = 100  # messages per history request, the API maximum
+FETCH_STATUS_LENGTH = 1800  # collapse finished/pending channels in the status past this
+
+MAX_HANDLES = 256  # default open logfile limit, shared between writer threads
+HANDLE_CHECK_INTERVAL = 10  # seconds between checks for deleted or replaced logfiles
+WRITER_THREADS = 1
+WRITE_QUEUE_SIZE = 10000  # entries per writer thread before log() waits
+WRITE_BATCH_SIZE = 500  # entries per batch
+FLUSH_BYTES = 64 * 1024  # buffered mode: flush a file once this much is pending
+FLUSH_INTERVAL = 1.0  # buffered mode: flush everything at least this often
+QUEUE_FULL_WAIT = 0.01  # how long log() sleeps between retries on a full queue
+CLOSE_TIMEOUT = 10  # seconds to wait for the writers to drain on unload
+
+# durability mode -> description
+DURABILITY_MODES = OrderedDict([
+    ('buffered', 'flushed every %g seconds or %i KiB per file' % (FLUSH_INTERVAL, FLUSH_BYTES // 1024)),
+    ('flush', 'flushed to the OS after every batch'),
+    ('fsync', 'flushed and synced to disk after every batch')
+])
+DEFAULT_DURABILITY = 'flush'
+
+ARCHIVE_INTERVAL = 600  # seconds between archival passes
+ARCHIVE_GRACE = timedelta(hours=1)  # how long after a rotation period ends before it's archived
+ARCHIVE_CHUNK = 1024 * 1024
+ARCHIVE_PENDING_EXT = '.archiving'
+ARCHIVE_JOURNAL_EXT = '.journal'  # holds an archive's size before an append, until the append is done
+ARCHIVE_STOP_TIMEOUT = 5  # seconds to wait for the archiver on unload
+
+# archive format -> file extension
+ARCHIVE_FORMATS = OrderedDict([
+    ('gzip', '.gz'),
+    ('zstd', '.zst')
+])
+
+# log format -> description
+LOG_FORMATS = OrderedDict([
+    ('text', 'plain text .log files'),
+    ('jsonl', 'searchable .jsonl files'),
+    ('both', 'both plain text .log and searchable .jsonl files')
+])
+DEFAULT_LOG_FORMAT = 'text'
+
+INDEX_EXT = '.idx'
+INDEX_BLOCK_RECORDS = 256  # records per sparse index entry
+SEARCH_LIMIT = 25
+SEARCH_MAX_LIMIT = 200
+
+# matches structured logfiles: optional rotation prefix, channel ID, optional archive extension
+JSONL_LOG_RE = re.compile(r'^(?:(\d{8})--P(1Y|1M|7D|1D)_)?(\d+)\.jsonl(\.gz|\.zst)?$')
+SEARCH_DURATION_RE = re.compile(r'^(\d+)([smhdw])$')
+SEARCH_TIME_FORMATS = ('%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S')
+SEARCH_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24, 'w': 60 * 60 * 24 * 7}
+MENTION_RE = re.compile(r'^<[#@]!?(\d+)>$')
+
+# matches names made by format_rotation_string, with or without an index or archive extension
+ROTATED_LOG_RE = re.compile(r'^(\d{8})--P(1Y|1M|7D|1D)_.+\.(log|jsonl)(%s|%s|\.gz|\.zst)?$'
+                            % (re.escape(INDEX_EXT), re.escape(ARCHIVE_PENDING_EXT)))
+
+log = logging.getLogger('red.activitylog')
 
 # 0 is Message object
 AUTHOR_TEMPLATE = "@{0.author.name}#{0.author.discriminator}"
@@ -67,16 +148,36 @@ DELETE_TEMPLATE = AUTHOR_TEMPLATE + " deleted message from {1} ({0.clean_content
 
 
 class FetchCookie(object):
-    def __init__(self, ctx, start, status_msg, last_edit=None):
+    def __init__(self, ctx, start, status_msg, subfolder):
         self.ctx = ctx
         self.start = start
         self.status_msg = status_msg
-        self.last_edit = last_edit
+        self.subfolder = subfolder
+        self.end = datetime.utcnow()  # history is fetched up to here
+        self.progress = OrderedDict()  # channel ID -> FetchProgress
         self.total_messages = 0
-        self.completed_messages = []
+
+    @property
+    def fraction(self):
+        """Estimated share of the history fetched, by time covered rather than message count"""
+        span = sum(p.span for p in self.progress.values())
+        covered = sum(p.covered for p in self.progress.values())
+        return (covered / span) if span else 1
+
+    @property
+    def eta(self):
+        elapsed = (datetime.now() - self.start).total_seconds()
+        span = sum(p.span for p in self.progress.values())
+        covered = sum(p.covered for p in self.progress.values())
+
+        if not (covered and elapsed):
+            return None
+
+        return timedelta(seconds=int((span - covered) / (covered / elapsed)))
 
 
 class FetchStatus(Enum):
+    PENDING = 'pending'
     STARTING = 'starting'
     FETCHING = 'fetching'
     CANCELLED = 'cancelled'
@@ -84,27 +185,988 @@ class FetchStatus(Enum):
     COMPLETED = 'completed'
 
 
+class FetchProgress(object):
+    """Tracks a channel's fetch, starting after its checkpoint if it has one"""
+    def __init__(self, channel, end, checkpoint=None):
+        checkpoint = checkpoint or {}
+
+        self.channel = channel
+        self.status = FetchStatus.PENDING
+        self.exception = None
+        self.count = 0
+        self.failed_downloads = 0
+        self.last_id = checkpoint.get('last')
+        self.total = checkpoint.get('count', 0)  # including earlier runs
+        self.resumed = bool(self.last_id)
+
+        if self.last_id:
+            self.begin = discord.utils.snowflake_time(self.last_id)
+        else:
+            self.begin = channel.created_at
+
+        self.position = self.begin
+        self.end = end
+
+    @property
+    def span(self):
+        return max(0, (self.end - self.begin).total_seconds())
+
+    @property
+    def covered(self):
+        if self.status is FetchStatus.COMPLETED:
+            return self.span
+
+        return min(self.span, max(0, (self.position - self.begin).total_seconds()))
+
+    def advance(self, messages):
+        """Moves past a page of messages, once the log writer has confirmed they're written"""
+        self.last_id = messages[-1].id
+        self.position = messages[-1].timestamp
+        self.count += len(messages)
+        self.total += len(messages)
+
+    def checkpoint(self):
+        return {'last': self.last_id, 'count': self.total}
+
+
+class LogIndex:
+    """
+    Sparse index for a .jsonl logfile, kept next to it in a .idx file.
+
+    Each line covers a block of records: their byte range, time range and authors.
+    Searches use it to skip blocks outside the time range or without the wanted authors.
+    """
+    def __init__(self, path):
+        self.path = path + INDEX_EXT
+        self.handle = None
+        self.reset()
+
+    def reset(self):
+        self.start = self.end = None
+        self.first = self.last = None
+        self.count = 0
+        self.authors = set()
+
+    def add(self, offset, length, timestamp, author):
+        if not self.count:
+            self.start = offset
+            self.first = self.last = timestamp
+
+        self.first = min(self.first, timestamp)
+        self.last = max(self.last, timestamp)
+        self.end = offset + length
+        self.count += 1
+
+        if author:
+            self.authors.add(author)
+
+        if self.count >= INDEX_BLOCK_RECORDS:
+            self.commit()
+
+    def recover(self, log_path, size):
+        """
+        Indexes the records between the last committed block and size, such as a block that was lost
+        when the bot stopped before committing it. Also drops a partly written last index line.
+        """
+        end = 0
+
+        try:
+            with open(self.path, 'rb+') as f:
+                data = f.read()
+                complete = data.rfind(b'\n') + 1
+
+                if complete < len(data):
+                    f.truncate(complete)
+
+                for line in data[:complete].splitlines():
+                    try:
+                        end = max(end, json.loads(line.decode())['e'])
+                    except (ValueError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+
+        if end >= size:
+            return
+
+        with open(log_path, 'rb') as f:
+            f.seek(end)
+            offset = end
+
+            for line in f:
+                if offset + len(line) > size:
+                    break
+
+                try:
+                    record = json.loads(line.decode())
+                    self.add(offset, len(line), record['t'], record.get('a'))
+                except (ValueError, KeyError):  # partly written
+                    pass
+
+                offset += len(line)
+
+    def commit(self):
+        if not self.count:
+            return
+
+        if not self.handle:
+            self.handle = open(self.path, 'a')
+
+        block = {
+            'o': self.start,
+            'e': self.end,
+            't0': self.first,
+            't1': self.last,
+            'n': self.count,
+            'a': sorted(self.authors)
+        }
+
+        self.handle.write(json.dumps(block) + '\n')
+        self.reset()
+
+    def flush(self):
+        if self.handle:
+            self.handle.flush()
+
+    def close(self):
+        self.commit()
+
+        if self.handle:
+            self.handle.close()
+
+
 class LogHandle:
     """basic wrapper for logfile handles, used to keep track of stale handles"""
-    def __init__(self, path, time=None, mode='a', buf=1):
-        self.handle = open(path, mode, buf, errors='backslashreplace')
-        self.lock = asyncio.Lock()
+    def __init__(self, path, mode='a', buf=-1):
+        structured = path.endswith('.jsonl')
 
-        if time:
-            self.time = time
-        else:
-            self.time = datetime.fromtimestamp(os.path.getmtime(path))
+        self.path = path
+        # untranslated newlines, so that index offsets match the file on every platform
+        self.handle = open(path, mode, buf, errors='backslashreplace', newline='' if structured else None)
+        self.pending = 0  # bytes written since the last flush
+
+        st = os.fstat(self.handle.fileno())
+        self.inode = (st.st_dev, st.st_ino)
+        self.size = st.st_size  # only exact for ASCII, which is all .jsonl writes
+        self.index = None
+
+        if structured:
+            self.index = LogIndex(path)
+
+            if self.size:
+                self.index.recover(path, self.size)
+
+                # a record cut off by a crash would swallow the next one
+                with open(path, 'rb') as f:
+                    f.seek(self.size - 1)
+
+                    if f.read(1) != b'\n':
+                        self.write('\n')
+
+    def is_stale(self):
+        """Whether the file at path was deleted or replaced since it was opened"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+
+        return (st.st_dev, st.st_ino) != self.inode
+
+    def write(self, value):
+        self.handle.write(value)
+        self.pending += len(value)
+        self.size += len(value)
+
+    def flush(self, sync=False):
+        if self.pending:
+            self.handle.flush()
+            self.pending = 0
 
-    async def write(self, value):
-        async with self.lock:
-            self._write(value)
+            if sync:
+                os.fsync(self.handle.fileno())
+
+            # the index should never point past data on disk
+            if self.index:
+                self.index.flush()
 
     def close(self):
         self.handle.close()
 
-    def _write(self, value):
-        self.time = datetime.utcnow()
-        self.handle.write(value)
+        if self.index:
+            self.index.close()
+
+
+class WriteMarker(concurrent.futures.Future):
+    """Queued by LogWriter.confirm(), and resolved by the writer thread once the entries before it are flushed"""
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = paths
+
+
+class LogWriter:
+    """
+    Writes log entries from background threads, so the event loop never blocks on file IO.
+
+    Each logfile is pinned to one writer thread, which keeps entries in order. Threads drain
+    their queue in batches and do one write per file per batch, then flush by durability mode.
+    """
+    def __init__(self, threads=WRITER_THREADS, durability=DEFAULT_DURABILITY, max_handles=MAX_HANDLES):
+        self.durability = durability
+        self.max_handles = max_handles
+        self.closed = False
+        self.queues = [queue.Queue(WRITE_QUEUE_SIZE) for _ in range(threads)]
+        self.handles = [OrderedDict() for _ in range(threads)]  # path -> LogHandle, oldest use first
+        self.known_dirs = [set() for _ in range(threads)]
+        self.failed = [set() for _ in range(threads)]  # paths that failed to write or flush, until a marker reports them
+        self.threads = []
+
+        # writers waiting on a full queue take turns, so later entries can't overtake them
+        self.put_locks = [asyncio.Lock() for _ in range(threads)]
+        self.waiting = [0] * threads
+
+        # held while opening a logfile, so the archiver can't move it out from under a writer
+        self.open_lock = threading.Lock()
+
+        # counters below are shared by the writer threads
+        self.stats_lock = threading.Lock()
+
+        # backpressure and throughput counters
+        self.queued = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.batches = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.errors = 0
+
+        # handle pool counters
+        self.handle_hits = 0
+        self.handle_misses = 0
+        self.evictions = 0
+        self.stale_handles = 0
+
+        for i, q in enumerate(self.queues):
+            thread = threading.Thread(target=self.run, args=(i,), daemon=True,
+                                      name='activitylog-writer-%i' % i)
+            thread.start()
+            self.threads.append(thread)
+
+    @property
+    def depth(self):
+        return sum(q.qsize() for q in self.queues)
+
+    @property
+    def open_handles(self):
+        return sum(len(h) for h in self.handles)
+
+    def is_open(self, path):
+        return any(path in handles for handles in self.handles)
+
+    def claim_closed(self, path, dest=None):
+        """
+        Renames path to dest, or removes it if dest is None, unless a writer thread has it open.
+        Returns whether it did. Writers can't open the file in the meantime, so no entry is lost to it.
+
+        A renamed file's index is removed too, before a new file at path could start its own.
+        """
+        with self.open_lock:
+            if self.is_open(path):
+                return False
+
+            if dest is None:
+                os.remove(path)
+                return True
+
+            os.rename(path, dest)
+
+            if os.path.exists(path + INDEX_EXT):
+                os.remove(path + INDEX_EXT)
+
+            return True
+
+    @property
+    def thread_handles(self):
+        return max(1, self.max_handles // len(self.queues))
+
+    async def write(self, path, value, mode='a', meta=None):
+        """
+        Queues value to be written to path. Waits without blocking the loop if the writer is behind.
+
+        For .jsonl files, meta is a (timestamp, author id) tuple for the index.
+        """
+        await self.write_many([(path, value, mode, meta)])
+
+    async def write_many(self, items):
+        """Queues several (path, value, mode, meta) items, such as a page of fetched history"""
+        if self.closed:
+            return
+
+        for item in items:
+            index = hash(item[0]) % len(self.queues)
+            await self.put(index, item)
+            self.queued += 1
+            self.max_depth = max(self.max_depth, self.queues[index].qsize())
+
+    async def confirm(self, paths):
+        """
+        Waits until everything queued so far for paths has been written and flushed to the OS,
+        whatever the durability mode. Raises RuntimeError if the writer is closed, or if writing
+        or flushing any of the paths failed since the last confirm() that covered it.
+        """
+        if self.closed:
+            raise RuntimeError('The log writer is closed')
+
+        grouped = {}
+        markers = []
+
+        for path in paths:
+            grouped.setdefault(hash(path) % len(self.queues), set()).add(path)
+
+        for index, group in sorted(grouped.items()):
+            marker = WriteMarker(frozenset(group))
+            await self.put(index, marker)
+            markers.append(asyncio.wrap_future(marker))
+
+        await asyncio.gather(*markers)
+
+    async def put(self, index, item):
+        """Queues item for a writer thread, waiting for room behind any writers already waiting on it"""
+        q = self.queues[index]
+
+        if not self.waiting[index]:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+
+        self.stalls += 1
+        self.waiting[index] += 1
+        start = time.perf_counter()
+
+        try:
+            async with self.put_locks[index]:
+                while True:
+                    try:
+                        q.put_nowait(item)
+                        break
+                    except queue.Full:
+                        await asyncio.sleep(QUEUE_FULL_WAIT)
+        finally:
+            self.waiting[index] -= 1
+
+        self.stall_time += time.perf_counter() - start
+
+    def count(self, **counts):
+        """Adds to counters from a writer thread"""
+        with self.stats_lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Drains all queued entries and closes the files. Blocks for up to timeout seconds."""
+        if self.closed:
+            return
+
+        self.closed = True
+        deadline = time.monotonic() + timeout
+
+        for q in self.queues:
+            try:
+                q.put(None, timeout=max(0, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def gethandle(self, index, path, mode='a'):
+        """Manages logfile handles, evicting the least recently used and creating folders"""
+        handles = self.handles[index]
+        handle = handles.get(path)
+
+        if handle:
+            handles.move_to_end(path)
+            self.count(handle_hits=1)
+            return handle
+
+        self.count(handle_misses=1)
+
+        # Clean up excess handles before creating a new one
+        while handles and len(handles) >= self.thread_handles:
+            _, oldest = handles.popitem(last=False)
+            self.close_handle(oldest, index)
+            self.count(evictions=1)
+
+        dirname = os.path.dirname(path)
+        known_dirs = self.known_dirs[index]
+
+        if dirname not in known_dirs:
+            os.makedirs(dirname, exist_ok=True)
+            known_dirs.add(dirname)
+
+        # the archiver can't move or remove the file while it's being opened (see claim_closed)
+        with self.open_lock:
+            try:
+                handle = LogHandle(path, mode=mode)
+            except FileNotFoundError:  # folder was deleted since we cached it
+                known_dirs.discard(dirname)
+                os.makedirs(dirname, exist_ok=True)
+                known_dirs.add(dirname)
+                handle = LogHandle(path, mode=mode)
+
+            handles[path] = handle
+
+        return handle
+
+    def close_handle(self, handle, index):
+        try:
+            self.flush_handles((handle,), index)
+            handle.close()
+        except Exception:
+            self.failed[index].add(handle.path)
+            self.count(errors=1)
+            log.exception('Error closing activity log %s', handle.path)
+
+    def cull_stale(self, index):
+        """
+        Closes handles whose files were deleted or replaced, so the next write reopens them.
+        Also closes rotated logs whose period is over, so they can be archived.
+        """
+        handles = self.handles[index]
+        now = datetime.utcnow()
+
+        for path, handle in list(handles.items()):
+            end = rotated_log_end(os.path.basename(path))
+
+            if end and now >= end:
+                del handles[path]
+                self.close_handle(handle, index)
+                self.count(evictions=1)
+            elif handle.is_stale():
+                del handles[path]
+                self.close_handle(handle, index)
+                self.count(stale_handles=1)
+
+        # Folders may have gone with them
+        self.known_dirs[index].clear()
+
+    def run(self, index):
+        q = self.queues[index]
+        handles = self.handles[index]
+        last_flush = last_check = time.monotonic()
+        stop = False
+
+        while not stop:
+            try:
+                batch = [q.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                batch = []
+
+            while batch and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                stop = True
+                batch = [e for e in batch if e is not None]
+
+            markers = [e for e in batch if isinstance(e, WriteMarker)]
+
+            if markers:
+                batch = [e for e in batch if not isinstance(e, WriteMarker)]
+
+            now = time.monotonic()
+
+            if now - last_check >= HANDLE_CHECK_INTERVAL:
+                last_check = now
+                self.cull_stale(index)
+
+            try:
+                self.write_batch(index, batch)
+            except Exception:
+                self.failed[index].update(e[0] for e in batch)
+                log.exception('Error writing activity log batch')
+
+            if stop or markers or now - last_flush >= FLUSH_INTERVAL:
+                last_flush = now
+                self.flush_handles(handles.values(), index)
+
+            self.resolve_markers(index, markers)
+
+        # A write() that was waiting on a full queue can land behind the sentinel
+        leftover = []
+        markers = []
+        while True:
+            try:
+                e = q.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(e, WriteMarker):
+                markers.append(e)
+            elif e is not None:
+                leftover.append(e)
+
+        try:
+            try:
+                self.write_batch(index, leftover)
+            except Exception:
+                self.failed[index].update(e[0] for e in leftover)
+                log.exception('Error writing activity log batch')
+
+            while handles:
+                _, handle = handles.popitem()
+                self.close_handle(handle, index)
+        finally:
+            # a confirm() caller must never be left waiting, even if the thread is going down
+            self.resolve_markers(index, markers)
+
+    def resolve_markers(self, index, markers):
+        """
+        Tells confirm() callers whether everything queued before their markers was written,
+        then forgets the failures reported so far.
+        """
+        if not markers:
+            return
+
+        failed = self.failed[index]
+
+        for marker in markers:
+            if not marker.set_running_or_notify_cancel():
+                continue
+
+            lost = marker.paths & failed
+
+            if lost:
+                marker.set_exception(RuntimeError('Error writing activity log(s): %s' % ', '.join(sorted(lost))))
+            else:
+                marker.set_result(None)
+
+        failed.clear()
+
+    def write_batch(self, index, batch):
+        if not batch:
+            return
+
+        grouped = OrderedDict()
+
+        for path, value, mode, meta in batch:
+            if path not in grouped:
+                grouped[path] = (mode, [], [])
+            grouped[path][1].append(value)
+            grouped[path][2].append(meta)
+
+        touched = []
+
+        for path, (mode, values, metas) in grouped.items():
+            data = ''.join(values)
+
+            try:
+                handle = self.gethandle(index, path, mode=mode)
+                offset = handle.size
+
+                # Index only what made it into the file, or later offsets would point at the wrong records
+                handle.write(data)
+
+                if handle.index:
+                    for value, meta in zip(values, metas):
+                        timestamp, author = meta
+                        handle.index.add(offset, len(value), timestamp, author)
+                        offset += len(value)
+            except Exception:
+                self.failed[index].add(path)
+                self.count(errors=1)
+                log.exception('Error writing to activity log %s', path)
+                continue
+
+            touched.append(handle)
+            self.count(written=len(values), bytes_written=len(data))
+
+        self.count(batches=1)
+
+        if self.durability == 'buffered':
+            touched = [h for h in touched if h.pending >= FLUSH_BYTES]
+
+        self.flush_handles(touched, index)
+
+    def flush_handles(self, to_flush, index):
+        sync = self.durability == 'fsync'
+
+        for handle in list(to_flush):
+            if not handle.pending:
+                continue
+
+            try:
+                handle.flush(sync=sync)
+                self.count(flushes=1)
+            except Exception:
+                self.failed[index].add(handle.path)
+                self.count(errors=1)
+                log.exception('Error flushing activity log %s', handle.path)
+
+
+def rotation_period_end(start, period):
+    """Returns when a rotation period (as in format_rotation_string) starting at start ends"""
+    if period == '1Y':
+        return start.replace(year=start.year + 1)
+    elif period == '1M':
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    elif period == '7D':
+        return start + timedelta(days=7)
+    else:
+        return start + timedelta(days=1)
+
+
+def rotated_log_end(filename):
+    """Returns when the rotation period of a logfile ended, or None if it isn't rotated"""
+    match = ROTATED_LOG_RE.match(filename)
+
+    if not match:
+        return None
+
+    start = datetime.strptime(match.group(1), '%Y%m%d')
+    return rotation_period_end(start, match.group(2))
+
+
+def zstd_reads_frames():
+    """Checks that zstandard can read an archive with several frames, as appended by the archiver"""
+    try:
+        frames = b''.join(zstandard.ZstdCompressor().compress(b) for b in (b'a', b'b'))
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(frames), read_across_frames=True)
+        return reader.read(4) + reader.read(4) == b'ab'
+    except Exception:
+        return False
+
+
+if zstandard and not zstd_reads_frames():  # too old; treated as missing
+    zstandard = None
+
+
+def open_log(path):
+    """Opens a logfile for reading as text, decompressing it if it's an archive"""
+    if path.endswith(ARCHIVE_FORMATS['gzip']):
+        return gzip.open(path, 'rt', errors='backslashreplace')
+    elif path.endswith(ARCHIVE_FORMATS['zstd']):
+        if not zstandard:
+            raise RuntimeError('An up to date zstandard module is needed to read %s' % path)
+
+        # archives may hold several frames if late entries were added
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                            closefd=True)
+
+        return io.TextIOWrapper(io.BufferedReader(reader), errors='backslashreplace')
+    else:
+        return open(path, 'r', errors='backslashreplace')
+
+
+def indexed_ranges(path, after=None, before=None, authors=None):
+    """
+    Returns the byte ranges of a .jsonl logfile that may hold matching records, using its
+    sparse index. Unindexed gaps and the tail are always included. Returns None if there's no index.
+    """
+    try:
+        size = os.path.getsize(path)
+        index = open(path + INDEX_EXT)
+    except FileNotFoundError:
+        return None
+
+    ranges = []
+    covered = 0
+
+    with index:
+        for line in index:
+            try:
+                block = json.loads(line)
+            except ValueError:  # partly written
+                continue
+
+            if block['e'] > size:  # data not flushed yet
+                break
+            elif block['o'] > covered:  # records that were never indexed
+                ranges.append((covered, block['o']))
+
+            covered = max(covered, block['e'])
+
+            if after and block['t1'] < after:
+                continue
+            elif before and block['t0'] >= before:
+                continue
+            elif authors and authors.isdisjoint(block['a']):
+                continue
+
+            ranges.append((block['o'], block['e']))
+
+    if covered < size:
+        ranges.append((covered, size))
+
+    return ranges
+
+
+def iter_log_records(path, after=None, before=None, authors=None):
+    """Yields records from a structured logfile, reading only the indexed blocks that may match"""
+    ranges = None
+
+    if path.endswith('.jsonl'):
+        ranges = indexed_ranges(path, after, before, authors)
+
+    if ranges is None:
+        with open_log(path) as f:
+            yield from parse_records(f)
+    else:
+        with open(path, 'rb') as f:
+            for start, end in ranges:
+                f.seek(start)
+                yield from parse_records(f.read(end - start).decode(errors='backslashreplace').splitlines())
+
+
+def parse_records(lines):
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:  # partly written
+            continue
+
+
+def search_logs(root, after=None, before=None, channels=None, authors=None, text=None, limit=SEARCH_LIMIT):
+    """
+    Searches the structured logs under root. after and before are TIMESTAMP_FORMAT strings,
+    channels and authors are sets of IDs. Returns the earliest matches in time order.
+    """
+    if text:
+        text = text.lower()
+
+    def records():
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.endswith('_attachments')]
+
+            for filename in filenames:
+                match = JSONL_LOG_RE.match(filename)
+
+                if not match or (channels and match.group(3) not in channels):
+                    continue
+
+                if match.group(1):  # skip rotated files outside the time range
+                    start = datetime.strptime(match.group(1), '%Y%m%d')
+                    end = rotation_period_end(start, match.group(2))
+
+                    if before and start.strftime(TIMESTAMP_FORMAT) >= before:
+                        continue
+                    elif after and end.strftime(TIMESTAMP_FORMAT) <= after:
+                        continue
+
+                path = os.path.join(dirpath, filename)
+
+                for record in iter_log_records(path, after, before, authors):
+                    if after and record['t'] < after:
+                        continue
+                    elif before and record['t'] >= before:
+                        continue
+                    elif authors and record.get('a') not in authors:
+                        continue
+                    elif text and text not in record['m'].lower():
+                        continue
+
+                    yield record
+
+    return heapq.nsmallest(limit, records(), key=lambda r: r['t'])
+
+
+def parse_search_time(value):
+    """Parses a logsearch time: a UTC date/time, or a duration ago like 3d"""
+    match = SEARCH_DURATION_RE.match(value)
+
+    if match:
+        seconds = int(match.group(1)) * SEARCH_UNITS[match.group(2)]
+        return datetime.utcnow() - timedelta(seconds=seconds)
+
+    for fmt in SEARCH_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+
+    raise ValueError(value)
+
+
+class LogArchiver:
+    """
+    Compresses rotated logfiles once their period is over, and deletes old ones per server.
+
+    Runs on its own thread. Files are renamed before compressing, so entries written late
+    (e.g. by logfetch) go to a new file that is appended to the archive on the next pass.
+    """
+    def __init__(self, cog, interval=ARCHIVE_INTERVAL):
+        self.cog = cog
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.wakeup = threading.Event()
+
+        self.archived = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.removed = 0
+        self.errors = 0
+        self.last_pass = None
+
+        self.thread = threading.Thread(target=self.run, daemon=True, name='activitylog-archiver')
+        self.thread.start()
+
+    def stop(self, timeout=ARCHIVE_STOP_TIMEOUT):
+        self.stopping.set()
+        self.wakeup.set()
+        self.thread.join(timeout)
+
+    def wake(self):
+        self.wakeup.set()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.archive_pass()
+            except Exception:
+                self.errors += 1
+                log.exception('Error archiving activity logs')
+
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def archive_pass(self):
+        settings = self.cog.settings
+        fmt = settings.get('archive')
+        now = datetime.utcnow()
+
+        if fmt == 'zstd' and not zstandard:
+            fmt = 'gzip'
+
+        for folder in os.listdir(PATH):
+            root = os.path.join(PATH, folder)
+
+            if not os.path.isdir(root):
+                continue
+
+            server_settings = settings.get(folder)
+            retention = None
+
+            if isinstance(server_settings, dict) and server_settings.get('retention'):
+                retention = timedelta(days=server_settings['retention'])
+
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if not d.endswith('_attachments')]
+
+                for filename in filenames:
+                    if self.stopping.is_set():
+                        return
+
+                    end = rotated_log_end(filename)
+
+                    if not end or now < end + ARCHIVE_GRACE:
+                        continue
+
+                    path = os.path.join(dirpath, filename)
+
+                    try:
+                        if retention and now >= end + retention:
+                            self.remove(path)
+                        elif fmt and not filename.endswith(tuple(ARCHIVE_FORMATS.values()) + (INDEX_EXT,)):
+                            self.compress(path, fmt)
+                    except Exception:
+                        self.errors += 1
+                        log.exception('Error archiving activity log %s', path)
+
+        self.last_pass = now
+
+    def remove(self, path):
+        if self.cog.writer.claim_closed(path):
+            self.removed += 1
+
+    def compress(self, path, fmt):
+        """
+        Compresses a logfile into its archive, appending if the archive exists.
+
+        The file is renamed to pending first, and only removed once it's in the archive. Before an
+        append, the archive's size goes in a journal, so a pass that finishes an interrupted one can
+        cut off a partial or complete append before redoing it instead of adding the entries twice.
+        """
+        resumed = path.endswith(ARCHIVE_PENDING_EXT)
+
+        if resumed:  # left over from an interrupted pass
+            pending = path
+            path = path[:-len(ARCHIVE_PENDING_EXT)]
+        elif os.path.exists(path + ARCHIVE_PENDING_EXT):
+            # finish that first, or the rename would clobber it; this file goes on the next pass
+            self.compress(path + ARCHIVE_PENDING_EXT, fmt)
+            return
+        else:
+            pending = path + ARCHIVE_PENDING_EXT
+
+            # archives are scanned whole, so the index goes with it
+            if not self.cog.writer.claim_closed(path, pending):
+                return
+
+        dest = path + ARCHIVE_FORMATS[fmt]
+        part = dest + '.part'
+        journal = dest + ARCHIVE_JOURNAL_EXT
+
+        with open(pending, 'rb') as src, open(part, 'wb') as raw:
+            if fmt == 'zstd':
+                out = zstandard.ZstdCompressor().stream_writer(raw)
+            else:
+                out = gzip.GzipFile(fileobj=raw, mode='wb')
+
+            while True:
+                if self.stopping.is_set():
+                    out.close()
+                    os.remove(part)
+                    return
+
+                chunk = src.read(ARCHIVE_CHUNK)
+
+                if not chunk:
+                    break
+
+                out.write(chunk)
+
+            out.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        part_size = os.path.getsize(part)
+
+        if resumed and os.path.exists(journal):
+            with open(journal) as f:
+                size = int(f.read())
+        else:  # any journal left without a pending file is from a pass that finished
+            size = os.path.getsize(dest) if os.path.exists(dest) else 0
+
+            with open(journal + '.part', 'w') as f:
+                f.write(str(size))
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(journal + '.part', journal)
+
+        if size:  # gzip and zstd both allow appending members/frames
+            with open(part, 'rb') as src, open(dest, 'r+b') as out:
+                out.truncate(size)
+                out.seek(size)
+                shutil.copyfileobj(src, out)
+                out.flush()
+                os.fsync(out.fileno())
+            os.remove(part)
+        else:
+            os.replace(part, dest)
+
+        self.archived += 1
+        self.bytes_in += os.path.getsize(pending)
+        self.bytes_out += part_size
+        os.remove(pending)
+        os.remove(journal)
 
 
 class ActivityLogger(object):
@@ -113,10 +1175,14 @@ class ActivityLogger(object):
     def __init__(self, bot):
         self.bot = bot
         self.settings = dataIO.load_json(JSON)
-        self.handles = {}
         self.lock = False
+        self.writer = LogWriter(threads=self.settings.get('writer_threads', WRITER_THREADS),
+                                durability=self.settings.get('durability', DEFAULT_DURABILITY),
+                                max_handles=self.settings.get('max_handles', MAX_HANDLES))
         self.session = aiohttp.ClientSession(loop=self.bot.loop)
         self.fetch_handle = None
+        self.fetch_checkpoints = dataIO.load_json(CHECKPOINT_JSON)
+        self.archiver = LogArchiver(self)
 
         try:
             self.analytics = CogAnalytics(self)
@@ -126,15 +1192,15 @@ class ActivityLogger(object):
 
     def __unload(self):
         self.lock = True
-        self.session.close()
-
-        for h in self.handles.values():
-            h.close()
 
         if isinstance(self.fetch_handle, asyncio.Future):
-            if not self.fetch_handle.cancelled():
+            if not self.fetch_handle.done():
                 self.fetch_handle.cancel()
 
+        self.session.close()
+        self.archiver.stop()
+        self.writer.close()
+
     async def _robust_edit(self, msg, content=None, embed=None):
         try:
             msg = await self.bot.edit_message(msg, new_content=content, embed=embed)
@@ -148,97 +1214,224 @@ class ActivityLogger(object):
     async def cookie_edit_task(self, cookie, **kwargs):
         cookie.status_msg = await self._robust_edit(cookie.status_msg, **kwargs)
 
-    async def fetch_task(self, channels, subfolder, attachments=None, status_cb=None):
-        channel = None
-        completed_channels = []
-        pending_channels = channels.copy()
+    async def fetch_task(self, cookie, channels, attachments=None):
+        checkpoints = self.fetch_checkpoints.get(cookie.subfolder, {})
 
-        def update(count, last_msg, status, channel, exception=None):
-            if not callable(status_cb):
-                return
-            elif type(last_msg) is not discord.Message:
-                last_msg = None
+        for channel in channels:
+            progress = FetchProgress(channel, cookie.end, checkpoints.get(channel.id))
+            cookie.progress[channel.id] = progress
 
-            status_cb(count=count, channel=channel, subfolder=subfolder,
-                      status=status, exception=exception, last_msg=last_msg,
-                      completed_channels=completed_channels,
-                      pending_channels=pending_channels)
+        pending = list(cookie.progress.values())
+        downloads = asyncio.Semaphore(FETCH_DOWNLOADS)
+        worker_count = min(len(pending), self.settings.get('fetch_workers', FETCH_WORKERS))
+        workers = [self.fetch_worker(cookie, pending, attachments, downloads) for _ in range(worker_count)]
+        status_task = self.bot.loop.create_task(self.fetch_status_task(cookie))
 
         try:
-            for channel in channels:
-                pending_channels.remove(channel)
-                count = 0
-                fetch_begin = channel.created_at
+            await asyncio.gather(*workers)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            status_task.cancel()
+
+            for progress in cookie.progress.values():
+                if progress.status in (FetchStatus.PENDING, FetchStatus.STARTING, FetchStatus.FETCHING):
+                    progress.status = FetchStatus.CANCELLED
+
+            self.save_checkpoints(cookie)
+
+        await self.cookie_edit_task(cookie, content=self.format_fetch_status(cookie))
+
+        dest = cookie.ctx.message.channel
+        elapsed = datetime.now() - cookie.start
+        statuses = [p.status for p in cookie.progress.values()]
+
+        if all(status is FetchStatus.COMPLETED for status in statuses):
+            msg = 'Fetched a total of %i messages in %s.' % (cookie.total_messages, elapsed)
+        else:
+            msg = ('Fetch stopped after %i messages in %s. Run the same command again to resume.'
+                   % (cookie.total_messages, elapsed))
+
+        await self.bot.send_message(dest, msg)
 
-                update(count, None, FetchStatus.STARTING, channel)
+    async def fetch_worker(self, cookie, pending, attachments, downloads):
+        while pending:
+            progress = pending.pop(0)
+            channel = progress.channel
+            progress.status = FetchStatus.STARTING
 
+            if progress.last_id:
+                after = discord.Object(id=progress.last_id)
+            else:
+                after = channel.created_at
+
+            try:
                 while True:
-                    last_count = count
-                    async for message in self.bot.logs_from(channel, after=fetch_begin, reverse=True):
-                        await self.message_handler(message, force=True, subfolder=subfolder,
-                                                   force_attachments=attachments)
-                        fetch_begin = message
-                        update(count, fetch_begin, FetchStatus.FETCHING, channel)
-                        count += 1
-
-                    if count == last_count:
+                    messages = await self.fetch_page(cookie, progress, after, attachments, downloads)
+
+                    if not messages:
                         break
 
-                update(count, fetch_begin, FetchStatus.COMPLETED, channel)
-                completed_channels.append(channel)
+                    progress.status = FetchStatus.FETCHING
+                    after = messages[-1]
+
+                progress.status = FetchStatus.COMPLETED
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                progress.status = FetchStatus.EXCEPTION
+                progress.exception = e
+
+    async def fetch_page(self, cookie, progress, after, attachments, downloads):
+        """
+        Fetches one page of history, logs it in one go and downloads its attachments.
+
+        The page is only counted in the progress (and so its checkpoint) once the log writer confirms
+        it's written and its downloads are done. Once any of it is queued, it's counted even if the fetch
+        is cancelled, with unfinished downloads as failed, so a resumed fetch doesn't log it again.
+        If the writer reports it wasn't written, it isn't counted, and is fetched again on resume.
+        """
+        messages = []
+        items = []
+        to_download = []
+
+        async for message in self.bot.logs_from(progress.channel, limit=FETCH_PAGE_SIZE, after=after, reverse=True):
+            messages.append(message)
+
+        if not messages:
+            return messages
+
+        for message in messages:
+            entry, download = self.format_message(message, force_attachments=attachments)
+            items.extend(self.format_log_items(message.channel, entry, message.timestamp,
+                                               subfolder=cookie.subfolder, author=message.author))
+
+            if download:
+                to_download.append(download)
 
+        async def write():
+            await self.writer.write_many(items)
+            await self.writer.confirm({item[0] for item in items})
+
+        async def download(args):
+            try:
+                async with downloads:
+                    await self.download_attachment(*args)
+            except asyncio.CancelledError:
+                progress.failed_downloads += 1
+                raise
+            except Exception:
+                progress.failed_downloads += 1
+                log.exception('Error downloading attachment %s', args[0])
+
+        writing = asyncio.ensure_future(write())
+        downloading = asyncio.ensure_future(asyncio.gather(*map(download, to_download)))
+
+        try:
+            await asyncio.shield(writing)
+            await downloading
         except asyncio.CancelledError:
-            update(count, fetch_begin, FetchStatus.CANCELLED, channel)
-        except Exception as e:
-            update(count, fetch_begin, FetchStatus.EXCEPTION, channel, exception=e)
+            downloading.cancel()
+
+            try:
+                await writing
+            except Exception:  # not counted, so a resumed fetch logs it again
+                log.exception('Error logging fetched messages in #%s', progress.channel.name)
+            else:
+                progress.advance(messages)
+                cookie.total_messages += len(messages)
+
             raise
+        except Exception:
+            downloading.cancel()
+            raise
+
+        progress.advance(messages)
+        cookie.total_messages += len(messages)
+        return messages
 
-    def format_fetch_line(self, cookie, count, status, exception, channel, **kwargs):
-        elapsed = datetime.now() - (cookie.last_edit or cookie.start)
-        edit_to = None
-        base = '#%s: ' % channel.name
+    async def fetch_status_task(self, cookie):
+        while True:
+            await asyncio.sleep(EDIT_TIMEDELTA.total_seconds())
+            self.save_checkpoints(cookie)
 
-        if status is FetchStatus.STARTING:
-            edit_to = base + 'initializing...'
+            try:
+                await self.cookie_edit_task(cookie, content=self.format_fetch_status(cookie))
+            except discord.errors.HTTPException:
+                pass
+
+    def save_checkpoints(self, cookie):
+        checkpoints = self.fetch_checkpoints.setdefault(cookie.subfolder, {})
+
+        for channel_id, progress in cookie.progress.items():
+            checkpoint = progress.checkpoint()
+
+            if checkpoint['last']:
+                checkpoints[channel_id] = checkpoint
+
+        dataIO.save_json(CHECKPOINT_JSON, self.fetch_checkpoints)
+
+    def format_fetch_line(self, progress):
+        base = '#%s: ' % progress.channel.name
+        status = progress.status
+        count = progress.count
+
+        if status is FetchStatus.PENDING:
+            return base + 'pending'
+        elif status is FetchStatus.STARTING:
+            return base + ('resuming...' if progress.resumed else 'initializing...')
         elif status is FetchStatus.EXCEPTION:
-            edit_to = base + 'error after %i messages.' % count
+            line = base + 'error after %i messages.' % count
 
-            if isinstance(exception, Exception):
-                ename = type(exception).__name__
-                estr = str(exception)
-                edit_to += ': %s: %s' % (ename, estr)
+            if isinstance(progress.exception, Exception):
+                ename = type(progress.exception).__name__
+                estr = str(progress.exception)
+                line += ': %s: %s' % (ename, estr)
         elif status is FetchStatus.CANCELLED:
-            edit_to = base + 'cancelled after %i messages.' % count
+            line = base + 'cancelled after %i messages.' % count
         elif status is FetchStatus.COMPLETED:
-            edit_to = base + 'fetched %i messages.' % count
-        elif status is FetchStatus.FETCHING:
-            if elapsed > EDIT_TIMEDELTA:
-                edit_to = base + '%i messages retrieved so far...' % count
+            line = base + 'fetched %i messages.' % count
+        else:
+            line = base + '%i messages retrieved so far, up to %s...' % (count, progress.position.strftime('%Y-%m-%d'))
 
-        return edit_to
+        if progress.failed_downloads:
+            line += ' (%i attachments failed)' % progress.failed_downloads
 
-    def fetch_callback(self, cookie, pending_channels, **kwargs):
-        status = kwargs.get('status')
-        count = kwargs.get('count')
+        return line
 
-        format_line = self.format_fetch_line(cookie, **kwargs)
+    def format_fetch_status(self, cookie):
+        elapsed = (datetime.now() - cookie.start).total_seconds()
+        rate = (cookie.total_messages / elapsed) if elapsed else 0
+        eta = cookie.eta
+        footer = 'Total: %i messages at %.1f/s, %.0f%% of history, ETA %s' % (
+            cookie.total_messages, rate, cookie.fraction * 100, eta if eta is not None else 'unknown')
 
-        if format_line:
-            rows = cookie.completed_messages + [format_line]
-            rows.extend([('#%s: pending' % c.name) for c in pending_channels])
-            cookie.last_edit = datetime.now()
-            task = self.cookie_edit_task(cookie, content='\n'.join(rows))
-            self.bot.loop.create_task(task)
+        rows = [self.format_fetch_line(p) for p in cookie.progress.values()]
 
-        if status is FetchStatus.COMPLETED:
-            cookie.total_messages += count
-            cookie.completed_messages.append(format_line)
+        if sum(len(r) + 1 for r in rows) > FETCH_STATUS_LENGTH:
+            collapse = (FetchStatus.PENDING, FetchStatus.COMPLETED)
+            rows = [self.format_fetch_line(p) for p in cookie.progress.values() if p.status not in collapse]
+            completed = sum(p.status is FetchStatus.COMPLETED for p in cookie.progress.values())
+            pending = sum(p.status is FetchStatus.PENDING for p in cookie.progress.values())
+            rows.append('%i channels fetched, %i pending' % (completed, pending))
 
-            if not pending_channels:
-                dest = cookie.ctx.message.channel
-                elapsed = datetime.now() - cookie.start
-                msg = ('Fetched a total of %i messages in %s.' % (cookie.total_messages, elapsed))
-                self.bot.loop.create_task(self.bot.send_message(dest, msg))
+        content = '\n'.join(rows)
+
+        if len(content) > FETCH_STATUS_LENGTH:
+            content = content[:FETCH_STATUS_LENGTH] + '...'
+
+        return content + '\n' + footer
+
+    async def start_fetch(self, ctx, channels, subfolder, attachments=None):
+        if isinstance(self.fetch_handle, asyncio.Future) and not self.fetch_handle.done():
+            await self.bot.say('A fetch is already running. Cancel it with `%slogfetch cancel` first.' % ctx.prefix)
+            return
+
+        msg = await self.bot.say('Dispatching fetch task...')
+        start = datetime.now()
+        cookie = FetchCookie(ctx, start, msg, subfolder)
+        task = self.fetch_task(cookie, channels, attachments=attachments)
+        self.fetch_handle = self.bot.loop.create_task(task)
 
     @commands.group(pass_context=True)
     @checks.is_owner()
@@ -255,30 +1448,67 @@ class ActivityLogger(object):
         Cancels a running fetch operation.
         """
         if isinstance(self.fetch_handle, asyncio.Future):
-            if not self.fetch_handle.cancelled():
+            if not self.fetch_handle.done():
                 self.fetch_handle.cancel()
                 self.fetch_handle = None
-                await self.bot.say('Fetch cancelled.')
+                await self.bot.say('Fetch cancelled. Its progress was saved, so it can be resumed later.')
                 return
 
         await self.bot.say('Nothing to cancel.')
 
+    @logfetch.command(name='reset')
+    async def fetch_reset(self, subfolder: str, channel_id: str = None):
+        """
+        Forgets where fetches into a subfolder left off, so they start over.
+
+        Fetches resume from the last fetched message of each channel. Resetting one
+        channel (by ID) or a whole subfolder makes the next fetch start from the beginning.
+        """
+        checkpoints = self.fetch_checkpoints.get(subfolder, {})
+
+        if channel_id:
+            found = checkpoints.pop(channel_id, None)
+        else:
+            found = self.fetch_checkpoints.pop(subfolder, None)
+
+        if not found:
+            await self.bot.say('No fetch progress saved for that.')
+            return
+
+        dataIO.save_json(CHECKPOINT_JSON, self.fetch_checkpoints)
+        await self.bot.say('Fetch progress cleared.')
+
+    @logfetch.command(name='workers')
+    async def fetch_workers(self, count: int = None):
+        """
+        Show or set how many channels are fetched at once
+
+        Takes effect on the next fetch.
+        """
+        if count is not None:
+            if count < 1:
+                await self.bot.say('At least one channel must be fetched at a time.')
+                return
+
+            self.settings['fetch_workers'] = count
+            self.save_json()
+            adj = 'will now be'
+        else:
+            adj = 'are'
+            count = self.settings.get('fetch_workers', FETCH_WORKERS)
+
+        await self.bot.say('Up to %i channels %s fetched at once.' % (count, adj))
+
     @logfetch.command(pass_context=True, name='channel')
     async def fetch_channel(self, ctx, subfolder: str, channel: discord.Channel = None, attachments: bool = None):
         """
         Fetch complete logs for a channel. Defaults to the current one.
         """
 
-        msg = await self.bot.say('Dispatching fetch task...')
-        start = datetime.now()
-        cookie = FetchCookie(ctx, start, msg)
-
         if channel is None:
             channel = ctx.message.channel
 
-        callback = partial(self.fetch_callback, cookie)
-        task = self.fetch_task([channel], subfolder, attachments=attachments, status_cb=callback)
-        self.fetch_handle = self.bot.loop.create_task(task)
+        await self.start_fetch(ctx, [channel], subfolder, attachments=attachments)
 
     @logfetch.command(pass_context=True, name='server', allow_dm=False)
     async def fetch_server(self, ctx, subfolder: str, attachments: bool = None):
@@ -297,12 +1527,7 @@ class ActivityLogger(object):
             return channel.permissions_for(server.me).read_message_history
 
         channels = [c for c in server.channels if check(c)]
-        msg = await self.bot.say('Dispatching fetch task...')
-        start = datetime.now()
-        cookie = FetchCookie(ctx, start, msg)
-        callback = partial(self.fetch_callback, cookie)
-        task = self.fetch_task(channels, subfolder, attachments=attachments, status_cb=callback)
-        self.fetch_handle = self.bot.loop.create_task(task)
+        await self.start_fetch(ctx, channels, subfolder, attachments=attachments)
 
     @logfetch.command(pass_context=True, name='remote-channel')
     async def fetch_rchannel(self, ctx, subfolder: str, channel_id: str, attachments: bool = None):
@@ -310,11 +1535,6 @@ class ActivityLogger(object):
         Fetch complete logs for any channel the bot can see.
         """
 
-        msg = await self.bot.say('Dispatching fetch task...')
-        start = datetime.now()
-
-        cookie = FetchCookie(ctx, start, msg)
-
         channel = self.bot.get_channel(channel_id)
         if not channel:
             await self.bot.say('Could not find that server.')
@@ -323,10 +1543,7 @@ class ActivityLogger(object):
             await self.bot.say('Missing the "read message history" permission in that channel.')
             return
 
-        callback = partial(self.fetch_callback, cookie)
-        task = self.fetch_task([channel], subfolder, attachments=attachments, status_cb=callback)
-
-        self.fetch_handle = self.bot.loop.create_task(task)
+        await self.start_fetch(ctx, [channel], subfolder, attachments=attachments)
 
     @logfetch.command(pass_context=True, name='remote-server')
     async def fetch_rserver(self, ctx, subfolder: str, server_id: str, attachments: bool = None):
@@ -349,16 +1566,82 @@ class ActivityLogger(object):
             return channel.permissions_for(server.me).read_message_history
 
         channels = [c for c in server.channels if check(c)]
+        await self.start_fetch(ctx, channels, subfolder, attachments=attachments)
 
-        msg = await self.bot.say('Dispatching fetch task...')
-        start = datetime.now()
+    @commands.command(pass_context=True, no_pm=True)
+    @checks.is_owner()
+    async def logsearch(self, ctx, *terms: str):
+        """
+        Search this server's structured logs
+
+        Filters (all optional, can be combined):
+        - in:#channel : only in this channel (can be repeated)
+        - from:@user : only by this user, mention or ID (can be repeated)
+        - after:when : at or after a UTC time, e.g. 2018-07-01 or 2018-07-01T18:30
+        - before:when : before a UTC time
+        - limit:count : show up to this many entries (default 25)
+        Times can also be given as a duration ago, e.g. after:3d or before:12h.
+        Everything else is searched for in the entry text (case insensitive).
+
+        Only covers logs written while logset format is jsonl or both.
+        """
+        server = ctx.message.server
+        channels = set()
+        authors = set()
+        after = before = None
+        limit = SEARCH_LIMIT
+        words = []
 
-        cookie = FetchCookie(ctx, start, msg)
+        for term in terms:
+            key, _, value = term.partition(':')
+            key = key.lower()
 
-        callback = partial(self.fetch_callback, cookie)
-        task = self.fetch_task(channels, subfolder, attachments=attachments, status_cb=callback)
+            try:
+                if key in ('in', 'from') and value:
+                    match = MENTION_RE.match(value)
+                    (channels if key == 'in' else authors).add(match.group(1) if match else value)
+                elif key in ('after', 'before') and value:
+                    when = parse_search_time(value).strftime(TIMESTAMP_FORMAT)
+
+                    if key == 'after':
+                        after = when
+                    else:
+                        before = when
+                elif key == 'limit' and value:
+                    limit = max(1, min(SEARCH_MAX_LIMIT, int(value)))
+                else:
+                    words.append(term)
+            except ValueError:
+                await self.bot.say('Invalid %s value: %s' % (key, value))
+                return
 
-        self.fetch_handle = self.bot.loop.create_task(task)
+        root = os.path.join(PATH, server.id)
+        search = partial(search_logs, root, after=after, before=before, channels=channels,
+                         authors=authors, text=' '.join(words), limit=limit)
+
+        await self.bot.type()
+        results = await self.bot.loop.run_in_executor(None, search)
+
+        if not results:
+            await self.bot.say('No matching log entries found.')
+            return
+
+        lines = []
+
+        for record in results:
+            channel = server.get_channel(record['c'])
+            name = ('#' + channel.name) if channel else record['c']
+            lines.append('%s %s %s' % (record['t'], name, record['m'].replace('\n', '\\n')))
+
+        header = '%i matching log entries' % len(results)
+
+        if len(results) == limit:
+            header += ' (limit reached, narrow the search or raise limit:)'
+
+        await self.bot.say(header + ':')
+
+        for page in pagify('\n'.join(lines), shorten_by=10):
+            await self.bot.say(box(page))
 
     @commands.group(pass_context=True)
     @checks.is_owner()
@@ -557,6 +1840,200 @@ class ActivityLogger(object):
 
             await self.bot.say('Log rotation period is %s %s.' % (adj, desc))
 
+    @logset.command(pass_context=True, name='durability')
+    async def set_durability(self, ctx, mode: str = None):
+        """
+        Show or set how eagerly log writes reach the disk
+
+        Log entries are written from background threads in batches. Valid modes are:
+        - buffered: flush each file every second or once 64 KiB is pending (fastest)
+        - flush: flush to the OS after every batch, survives a bot crash (default)
+        - fsync: flush and sync to disk after every batch, survives power loss (slowest)
+        """
+        if mode:
+            mode = mode.lower().strip('"\'` ')
+
+            if mode not in DURABILITY_MODES:
+                await self.bot.send_cmd_help(ctx)
+                return
+
+            self.settings['durability'] = mode
+            self.writer.durability = mode
+            self.save_json()
+            adj = 'now'
+        else:
+            adj = 'currently'
+            mode = self.writer.durability
+
+        await self.bot.say('Log durability is %s %s: entries are %s.' % (adj, mode, DURABILITY_MODES[mode]))
+
+    @logset.command(pass_context=True, name='format')
+    async def set_format(self, ctx, log_format: str = None):
+        """
+        Show or set the format of new log entries
+
+        Valid options are:
+        - text: plain text .log files (default)
+        - jsonl: JSON lines .jsonl files, indexed for [p]logsearch
+        - both: write both
+        """
+        if log_format:
+            log_format = log_format.lower().strip('"\'` ')
+
+            if log_format not in LOG_FORMATS:
+                await self.bot.send_cmd_help(ctx)
+                return
+
+            self.settings['format'] = log_format
+            self.save_json()
+            adj = 'now'
+        else:
+            adj = 'currently'
+            log_format = self.settings.get('format', DEFAULT_LOG_FORMAT)
+
+        await self.bot.say('Log entries are %s written to %s.' % (adj, LOG_FORMATS[log_format]))
+
+    @logset.command(pass_context=True, name='archive')
+    async def set_archive(self, ctx, fmt: str = None):
+        """
+        Show or set compression of old rotated logs
+
+        Once a rotation period is over, its logfiles are compressed in the background.
+        Needs log rotation to be enabled. Valid options are:
+        - none: disable archival
+        - gzip: compress with gzip
+        - zstd: compress with zstandard (needs an up to date zstandard module installed)
+        """
+        if fmt:
+            fmt = fmt.lower().strip('"\'` ')
+
+            if fmt in ('none', 'disable', 'off'):
+                fmt = None
+            elif fmt not in ARCHIVE_FORMATS:
+                await self.bot.send_cmd_help(ctx)
+                return
+            elif fmt == 'zstd' and not zstandard:
+                await self.bot.say('The zstandard module is missing or too old. Install or upgrade it with pip, '
+                                   'or use gzip.')
+                return
+
+            self.settings['archive'] = fmt
+            self.save_json()
+            self.archiver.wake()
+            adj = 'now'
+        else:
+            adj = 'currently'
+            fmt = self.settings.get('archive')
+
+        if fmt:
+            await self.bot.say('Old rotated logs are %s compressed with %s.' % (adj, fmt))
+        else:
+            await self.bot.say('Archival of old rotated logs is %s disabled.' % adj)
+
+    @logset.command(pass_context=True, no_pm=True, name='retention')
+    async def set_retention(self, ctx, days: str = None):
+        """
+        Show or set how long rotated logs are kept for this server
+
+        Logfiles are deleted once their rotation period has been over for this many days.
+        Use "off" to keep them forever. Needs log rotation to be enabled.
+        """
+        server = ctx.message.server
+
+        if days:
+            days = days.lower().strip('"\'` ')
+
+            if days in ('none', 'disable', 'off', '0'):
+                days = None
+            elif days.isdigit():
+                days = int(days)
+            else:
+                await self.bot.send_cmd_help(ctx)
+                return
+
+            if server.id not in self.settings:
+                self.settings[server.id] = {}
+
+            self.settings[server.id]['retention'] = days
+            self.save_json()
+            self.archiver.wake()
+            adj = 'now'
+        else:
+            adj = 'currently'
+            days = self.settings.get(server.id, {}).get('retention')
+
+        if days:
+            await self.bot.say('Rotated logs for %s are %s kept for %i days.' % (server, adj, days))
+        else:
+            await self.bot.say('Rotated logs for %s are %s kept forever.' % (server, adj))
+
+    @logset.command(name='writers')
+    async def set_writers(self, count: int = None):
+        """
+        Show or set the number of log writer threads
+
+        Takes effect when the cog is reloaded.
+        """
+        if count is not None:
+            if count < 1:
+                await self.bot.say('There must be at least one writer thread.')
+                return
+
+            self.settings['writer_threads'] = count
+            self.save_json()
+            await self.bot.say('%i writer thread(s) will be used after the cog is reloaded.' % count)
+        else:
+            await self.bot.say('Logs are being written by %i thread(s).' % len(self.writer.threads))
+
+    @logset.command(name='handles')
+    async def set_handles(self, count: int = None):
+        """
+        Show or set how many logfiles are kept open at once
+
+        The least recently written files are closed first when over the limit.
+        """
+        if count is not None:
+            if count < 1:
+                await self.bot.say('At least one file must be kept open.')
+                return
+
+            self.settings['max_handles'] = count
+            self.writer.max_handles = count
+            self.save_json()
+            adj = 'now'
+        else:
+            adj = 'currently'
+
+        await self.bot.say('Up to %i logfiles are %s kept open.' % (self.writer.max_handles, adj))
+
+    @logset.command(name='stats')
+    async def set_stats(self):
+        """
+        Show log writer throughput and backpressure statistics
+        """
+        w = self.writer
+        avg_batch = (w.written / w.batches) if w.batches else 0
+        lines = [
+            'Writer threads: %i (%s mode)' % (len(w.threads), w.durability),
+            'Queue depth: %i now, %i peak, %i per thread max' % (w.depth, w.max_depth, WRITE_QUEUE_SIZE),
+            'Entries: %i queued, %i written in %i batches (%.1f avg)' % (w.queued, w.written, w.batches, avg_batch),
+            'Bytes written: %i in %i flushes' % (w.bytes_written, w.flushes),
+            'Open files: %i of %i' % (w.open_handles, w.max_handles),
+            'File handles: %i hits, %i misses, %i evicted, %i stale' % (w.handle_hits, w.handle_misses,
+                                                                        w.evictions, w.stale_handles),
+            'Stalls (full queue): %i, %.3fs total' % (w.stalls, w.stall_time),
+            'Errors: %i' % w.errors
+        ]
+
+        a = self.archiver
+        ratio = (a.bytes_out / a.bytes_in) if a.bytes_in else 0
+        lines += [
+            'Archived: %i files, %i bytes to %i (%.1f%%)' % (a.archived, a.bytes_in, a.bytes_out, ratio * 100),
+            'Expired: %i files removed' % a.removed,
+            'Archiver errors: %i' % a.errors
+        ]
+        await self.bot.say('```\n%s\n```' % '\n'.join(lines))
+
     def save_json(self):
         dataIO.save_json(JSON, self.settings)
 
@@ -616,40 +2093,6 @@ class ActivityLogger(object):
         elif before:
             return target_str + ' removed (was %i, %i)' % tuple(bpair)
 
-    def gethandle(self, path, mode='a'):
-        """Manages logfile handles, culling stale ones and creating folders"""
-        if path in self.handles:
-            if os.path.exists(path):
-                return self.handles[path]
-            else:  # file was deleted?
-                try:  # try to close, no guarantees tho
-                    self.handles[path].close()
-                except Exception:
-                    pass
-
-                del self.handles[path]
-                return self.gethandle(path, mode)
-        else:
-            # Clean up excess handles before creating a new one
-            if len(self.handles) >= 256:
-                chrono = sorted(self.handles.items(), key=lambda x: x[1].time)
-                oldest_path, oldest_handle = chrono[0]
-                oldest_handle.close()
-                del self.handles[oldest_path]
-
-            dirname, _ = os.path.split(path)
-
-            try:
-                if not os.path.exists(dirname):
-                    os.makedirs(dirname)
-
-                handle = LogHandle(path, mode=mode)
-            except Exception:
-                raise
-
-            self.handles[path] = handle
-            return handle
-
     def should_log(self, location):
         if self.settings.get('everything', False):
             return True
@@ -709,49 +2152,77 @@ class ActivityLogger(object):
 
         return aid, url, path, filename, truncated
 
-    async def log(self, location, text, timestamp=None, force=False, subfolder=None, mode='a'):
+    async def log(self, location, text, timestamp=None, force=False, subfolder=None, mode='a', author=None):
         if not timestamp:
             timestamp = datetime.utcnow()
 
         if self.lock or not (force or self.should_log(location)):
             return
 
+        items = self.format_log_items(location, text, timestamp, subfolder=subfolder, mode=mode, author=author)
+        await self.writer.write_many(items)
+
+    def format_log_items(self, location, text, timestamp, subfolder=None, mode='a', author=None):
+        """Returns the writer queue items to log text at location, per the log format"""
         path = PATH_LIST.copy()
-        entry = [timestamp.strftime(TIMESTAMP_FORMAT)]
+        timestamp_str = timestamp.strftime(TIMESTAMP_FORMAT)
+        entry = [timestamp_str]
         rotation = self.settings.get('rotation')
+        log_format = self.settings.get('format', DEFAULT_LOG_FORMAT)
+        items = []
 
         if type(location) is discord.Server:
-            path += [location.id, 'server.log']
+            serverid = location.id
+            path += [location.id, 'server']
         elif type(location) is discord.Channel:
             serverid = location.server.id
             entry.append('#' + location.name)
-            path += [serverid, location.id + '.log']
+            path += [serverid, location.id]
         elif type(location) is discord.PrivateChannel:
-            path += ['direct', location.id + '.log']
+            serverid = 'direct'
+            path += ['direct', location.id]
         else:
-            return
+            return items
 
         if subfolder:
             path.insert(-1, str(subfolder))
 
-        text = text.replace('\n', '\\n')
-        entry.append(text)
+        entry.append(text.replace('\n', '\\n'))
 
         if rotation:
             path[-1] = self.format_rotation_string(timestamp, rotation, path[-1])
 
         fname = os.path.join(*path)
-        handle = self.gethandle(fname, mode=mode)
-        await handle.write(' '.join(entry) + '\n')
 
-    async def message_handler(self, message, *args, force_attachments=None, **kwargs):
+        if log_format != 'jsonl':
+            items.append((fname + '.log', ' '.join(entry) + '\n', mode, None))
+
+        if log_format != 'text':
+            author_id = author.id if author else None
+            record = {
+                't': timestamp_str,
+                's': serverid,
+                'c': location.id,
+                'a': author_id,
+                'm': text
+            }
+
+            items.append((fname + '.jsonl', json.dumps(record) + '\n', mode, (timestamp_str, author_id)))
+
+        return items
+
+    def format_message(self, message, force_attachments=None):
+        """Returns a message's log entry, and the arguments for download_attachment if it should be saved"""
         dl_attachment = self.should_download(message)
         if force_attachments is not None:
             dl_attachment = force_attachments
 
+        download = None
+
         if message.attachments and dl_attachment:
             aid, url, path, filename, trunc = self.process_attachment(message)
             entry = DOWNLOAD_TEMPLATE.format(message, filename)
+            download = (url, path, filename, aid)
 
             if trunc:
                 entry += ' (filename truncated)'
@@ -761,21 +2232,28 @@ class ActivityLogger(object):
         else:
             entry = MESSAGE_TEMPLATE.format(message)
 
-        await self.log(message.channel, entry, message.timestamp, *args, **kwargs)
+        return entry, download
 
-        if message.attachments and dl_attachment:
-            dl_path = os.path.join(path, filename)
-            tmp_path = os.path.join(path, aid + '.tmp')
+    async def download_attachment(self, url, path, filename, aid):
+        dl_path = os.path.join(path, filename)
+        tmp_path = os.path.join(path, aid + '.tmp')
 
-            if not os.path.exists(path):
-                os.mkdir(path)
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
 
-            if not os.path.exists(dl_path):  # don't redownload
-                async with self.session.get(url) as r:
-                    with open(tmp_path, 'wb') as f:
-                        f.write(await r.read())
+        if not os.path.exists(dl_path):  # don't redownload
+            async with self.session.get(url) as r:
+                with open(tmp_path, 'wb') as f:
+                    f.write(await r.read())
 
-                    os.rename(tmp_path, dl_path)
+                os.rename(tmp_path, dl_path)
+
+    async def message_handler(self, message, *args, force_attachments=None, **kwargs):
+        entry, download = self.format_message(message, force_attachments=force_attachments)
+        await self.log(message.channel, entry, message.timestamp, *args, author=message.author, **kwargs)
+
+        if download:
+            await self.download_attachment(*download)
 
     async def on_message(self, message):
         await self.message_handler(message)
@@ -783,12 +2261,12 @@ class ActivityLogger(object):
     async def on_message_edit(self, before, after):
         timestamp = before.timestamp.strftime(TIMESTAMP_FORMAT)
         entry = EDIT_TEMPLATE.format(before, after, timestamp)
-        await self.log(after.channel, entry, after.edited_timestamp)
+        await self.log(after.channel, entry, after.edited_timestamp, author=after.author)
 
     async def on_message_delete(self, message):
         timestamp = message.timestamp.strftime(TIMESTAMP_FORMAT)
         entry = DELETE_TEMPLATE.format(message, timestamp)
-        await self.log(message.channel, entry)
+        await self.log(message.channel, entry, author=message.author)
 
     async def on_server_join(self, server):
         entry = 'this bot joined the server'
@@ -1015,6 +2493,9 @@ def check_files():
         }
         dataIO.save_json(JSON, defaults)
 
+    if not dataIO.is_valid_json(CHECKPOINT_JSON):
+        dataIO.save_json(CHECKPOINT_JSON, {})
+
 
 def setup(bot):
     check_folders()
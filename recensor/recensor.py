@@ -1,5 +1,5 @@
 import asyncio
-from collections import defaultdict, OrderedDict
+from collections import defaultdict, deque, OrderedDict
 from datetime import datetime, timedelta
 import discord
 from discord import Message, Object as DiscordObject
@@ -10,18 +10,26 @@ from discord.ext.commands.view import StringView
 from enum import Enum
 from functools import partial
 import inspect
+from io import BytesIO
 import itertools
+import json
 import logging
+import math
 import os
+import random
 import re
+import sys
+import threading
 import time
-from typing import Callable, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar, Union
+from typing import Awaitable, Callable, FrozenSet, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar, Union
 import unicodedata
 import urllib.parse
 
 from .utils.dataIO import dataIO
 from .utils import checks
-from .utils.chat_formatting import box, warning, error, info
+from .utils.chat_formatting import box, pagify, warning, error, info
+
+from concurrent.futures.process import BrokenProcessPool
 
 # FIXME: once red#1956 is fixed, all OSes can use ProcessPool
 if os.name == 'nt':
@@ -34,6 +42,11 @@ try:
 except ImportError:
     unidecode = None
 
+try:
+    import re._parser as sre_parse  # 3.11+
+except ImportError:
+    import sre_parse
+
 # Analytics core
 import zlib, base64
 exec(zlib.decompress(base64.b85decode("""c-oB^YjfMU@w<No&NCTMHA`DgE_b6jrg7c0=eC!Z-Rs==JUobmEW{+iBS0ydO#XX!7Y|XglIx5;0)gG
@@ -65,7 +78,7 @@ Rj(Y0|;SU2d?s+MPi6(PPLva(Jw(n0~TKDN@5O)F|k^_pcwolv^jBVTLhNqMQ#x6WU9J^I;wLr}Cut#l
 FU1|1o`VZODxuE?x@^rESdOK`qzRAwqpai|-7cM7idki4HKY>0$z!aloMM7*HJs+?={U5?4IFt""".replace("\n", ""))))
 # End analytics core
 
-__version__ = '2.7.3'
+__version__ = '2.15.3'
 
 logger = logging.getLogger('red.recensor')
 
@@ -74,12 +87,67 @@ JSON_PATH = DATA_PATH + "regexen.json"
 DEFAULT_FLAGS = 'IS'
 MSG_HISTORY_MAX_NUM = 32
 MSG_HISTORY_MAX_TIME = 60 * 10  # 10 minutes
+MSG_HISTORY_MAX_ENTRIES = 20000  # bot-wide, across all (channel, author) histories
+MSG_HISTORY_MAX_BYTES = 16 * 1024 ** 2  # bot-wide, approximate
+MESSAGE_RECORD_OVERHEAD = 256  # bytes; estimated size of a record, its ID and its history entry, excluding text
+PAIR_OVERHEAD = 64  # bytes; estimated size of a (message ID, text) tuple in a cached sequence, excluding text
 CONCAT_JOIN = '\n'
+VERDICT_CACHE_SIZE = 256  # per server
+ELIGIBILITY_INDEX_SIZE = 512  # per server; distinct (channel, roles, mod status) combinations remembered
+MIN_LITERAL_LEN = 3  # shorter required literals aren't selective enough to be worth checking
+DEFAULT_FILTER_BUDGET = 1.0  # seconds for a single filter
+DEFAULT_MESSAGE_BUDGET = 5.0  # seconds for all filters checked against one message
+INLINE_FILTER_COST = 50e-6  # seconds; filters predicted to be cheaper than this may skip the executor
+INLINE_MESSAGE_BUDGET = 1e-3  # seconds of inline checks allowed per message
+COST_PROFILE_MIN_SAMPLES = 20  # pool timings needed before a filter can run inline
+COST_PROFILE_DECAY = 0.95  # per sample; how quickly the peak cost estimate forgets old timings
+INLINE_MAX_LENGTH = 256  # chars; longer content always goes to the executor
+TELEMETRY_WINDOW = 1024  # recent timings kept per filter for percentiles
+TELEMETRY_TOP_FILTERS = 10  # shown by [p]recensor stats
+SHADOW_LOG_SIZE = 200  # per server; recent would-be deletions by shadow filters
+ASCIIFY_MEMO_SIZE = 1024  # bot-wide
+MOD_STATUS_CACHE_SIZE = 4096  # bot-wide; (server, member, roles) combinations whose mod status is remembered
+MOD_SETTING_COMMANDS = ('set adminrole', 'set modrole', 'set owner')  # core commands that change mod status
+ASCIIFY_TABLE_MAX = 65536  # distinct characters remembered by ASCIIFY_TABLE
+SCAN_PAGE_SIZE = 100  # messages per logs_from call, checked as one batch
+SCAN_DEFAULT_SINCE = '1 day'
+SCAN_EDIT_INTERVAL = timedelta(seconds=5)
+BULK_DELETE_MAX = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14, minutes=-5)  # Discord refuses to bulk delete older messages
+DELETE_COALESCE_WINDOW = 0.5  # seconds; deletions queued this soon after a channel's first go out together
+DELETE_DEDUPE_SIZE = 1024  # recently deleted message IDs remembered bot-wide
+DEFAULT_BATCH_MESSAGES = 16  # messages' checks sent to the executor together, at most
+DEFAULT_BATCH_DELAY = 0.002  # seconds; the longest a message's checks wait for others to share a round trip
+DIAGNOSTIC_WORKERS = 1  # a separate pool for the debug and test commands, so they can't hold up enforcement
+SHADOW_WORKERS = 1  # a separate pool for shadow filters' sampled checks, for the same reason
+REPLAY_POOL_SIZES = (1, 2, 4)
+REPLAY_FILTER_FRACTIONS = (0.25, 0.5, 1.0)
+REPLAY_STAGES = ('check_message', 'check_sequence', 'on_message')
+REPLAY_CONCURRENCY = 32  # messages in flight at once during replay, as if they arrived in a burst
+REPLAY_DEFAULT_MESSAGES = 2000
+
+UNIT_TABLE = (
+    (('weeks', 'wks', 'w'), 60 * 60 * 24 * 7),
+    (('days', 'dys', 'd'), 60 * 60 * 24),
+    (('hours', 'hrs', 'h'), 60 * 60),
+    (('minutes', 'mins', 'm'), 60),
+    (('seconds', 'secs', 's'), 1),
+)
 
 DiscordUniObj = Union[DiscordObject, DiscordHashable]
 T = TypeVar('T')
 HT = TypeVar('HT', bound=Hashable)
 SRE_Match = type(re.match('', ''))
+SRE_Pattern = type(re.compile(''))
+# Config versions are unique across ServerConfigs, so a replay benchmark's copy of a server's filters
+# can't be mistaken for the live one's by workers that hold both (thread pools)
+CONFIG_VERSIONS = itertools.count(1)
+
+SEQ_NONWORD_RE = re.compile(r'\W{2}\Z')
+NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+ACTIVITYLOG_LINE_RE = re.compile(r'(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) #(\S+) @(.+?#\d{4}): (.*)\Z')
+ACTIVITYLOG_ATTACHMENT_RE = re.compile(r' \(attachment (?:url\(s\): |saved to )(.*)\)\Z')
+ACTIVITYLOG_RECORD_RE = re.compile(r'@(.+?#\d{4}): (.*)\Z', re.DOTALL)  # the 'm' of a message in a .jsonl log
 
 FLAGS_DESC = {
     'A': 'ASCII',
@@ -125,6 +193,13 @@ MENTIONS_BY_DATACLASS = {
     discord.User: '<@!%s>'
 }
 
+# Non-ASCII characters that IGNORECASE matches to ASCII ones, but str.lower() doesn't (or not 1:1)
+CASEFOLD_FIXUPS = str.maketrans({
+    '\u0130': 'i',  # LATIN CAPITAL LETTER I WITH DOT ABOVE (lowercases to two characters)
+    '\u0131': 'i',  # LATIN SMALL LETTER DOTLESS I
+    '\u017f': 's',  # LATIN SMALL LETTER LONG S
+})
+
 # Symbols that aren't converted by unidecode
 EMOJI_LETTERS = dict(zip(
     '🅰🅱🅾🅿🇦🇧🇨🇩🇪🇫🇬🇭🇮🇯🇰🇱🇲🇳🇴🇵🇶🇷🇸🇹🇺🇻🇼🇽🇾🇿⭕❌',
@@ -236,1217 +311,3658 @@ def check_matches(inputs: Iterable[Tuple[str, Callable[[str], dict], str, bool]]
     return ret_list
 
 
-def concat_with_keys(strings: Sequence[str], join: str = CONCAT_JOIN) -> Tuple[str, List[int]]:
+def get_match_func(compiled, position: 'POSITION') -> Callable[[str], Optional[SRE_Match]]:
     """
-    Returns the concatenated string (joined on `join`) and a list of the end position of each string in the output
+    Returns the bound matching method of `compiled` that corresponds to `position`
     """
-    indices = []
-    i = 0
-    join_len = len(join)
-
-    if not isinstance(strings, Sequence):
-        strings = tuple(strings)
+    if position == POSITION.START:
+        return compiled.match
+    elif position == POSITION.FULL:
+        return compiled.fullmatch
+    elif position == POSITION.ANYWHERE:
+        return compiled.search
+    else:
+        raise ValueError("Unknown position value: %s" % position)
 
-    for string in strings:
-        i += len(string) + join_len
-        indices.append(i)
 
-    indices[-1] -= join_len
+def has_group_refs(parsed) -> bool:
+    """
+    Returns True if a parsed pattern refers to its own groups (backreferences or conditionals)
+    """
+    for op, av in parsed:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return True
+        elif op is sre_parse.SUBPATTERN and has_group_refs(av[-1]):
+            return True
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and has_group_refs(av[2]):
+            return True
+        elif op is sre_parse.BRANCH and any(has_group_refs(x) for x in av[1]):
+            return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT) and has_group_refs(av[1]):
+            return True
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None) and has_group_refs(av):
+            return True
+        elif op is getattr(sre_parse, 'POSSESSIVE_REPEAT', None) and has_group_refs(av[2]):
+            return True
 
-    return join.join(strings), indices
+    return False
 
 
-def sequence_from_indices(sequence: Sequence[T], indices: Sequence[int], keys: Tuple[int, int],
-                          inner_only: bool = False) -> List[T]:
+def required_literals(parsed, ignorecase: bool) -> Optional[Set[Tuple[str, bool]]]:
     """
-    Returns a list of the objects that the match denoted by `keys` overlapped, based on `indices`.
-    If `inner_only` is True, only return the items covered completely by the span.
+    Returns a set of (literal, ignorecase) pairs, one of which must appear in any string the parsed
+    pattern matches.
+
+    Returns None if no such set could be found. Ignorecase literals are lowercase ASCII only,
+    to be checked against content prepared with casefold_for_literals.
     """
-    ret = []
-    start, end = keys
-    last_index = 0
+    candidates = []
+    run = []
 
-    for obj, index in zip(sequence, indices):
-        if index <= start or (inner_only and last_index < start):
-            pass
-        elif index >= end:
-            if index == end or not inner_only:
-                ret.append(obj)
-            break
-        else:
-            ret.append(obj)
+    def end_run():
+        if run:
+            candidates.append({(''.join(run), ignorecase)})
+            run.clear()
 
-        last_index = index
+    for op, av in parsed:
+        if op is sre_parse.LITERAL and (av < 128 or not ignorecase):
+            run.append(chr(av).lower() if ignorecase else chr(av))
+            continue
 
-    return ret
+        end_run()
 
+        if op is sre_parse.SUBPATTERN:
+            inner_ignorecase = ignorecase
 
-def ellipsize(string: str, to_length: int = None, by: int = None) -> str:
-    if to_length is not None and by is not None:
-        raise ValueError("conflicting length arguments")
-    elif to_length is None and by is None:
-        raise ValueError("missing length argument")
+            if len(av) == 4:  # 3.6+: (group, add_flags, del_flags, pattern)
+                inner_ignorecase = (ignorecase or bool(av[1] & re.I)) and not (av[2] & re.I)
 
-    strlen = len(string)
+            candidates.append(required_literals(av[-1], inner_ignorecase))
+        elif op is sre_parse.BRANCH:
+            alternatives = [required_literals(x, ignorecase) for x in av[1]]
 
-    if by is not None:
-        to_length = strlen - by
-    else:
-        by = strlen - to_length
+            if all(alternatives):
+                candidates.append(set().union(*alternatives))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                    getattr(sre_parse, 'POSSESSIVE_REPEAT', None)) and av[0] >= 1:
+            candidates.append(required_literals(av[2], ignorecase))
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            candidates.append(required_literals(av, ignorecase))
+        elif op is sre_parse.ASSERT:  # lookarounds still have to match somewhere in the content
+            candidates.append(required_literals(av[1], ignorecase))
 
-    if strlen <= to_length:
-        return string
+    end_run()
+    candidates = [x for x in candidates if x and min(len(l) for l, i in x) >= MIN_LITERAL_LEN]
 
-    pos1 = (strlen // 2) - 1
-    pos2 = pos1 + 3
+    if not candidates:
+        return None
 
-    return string[:pos1] + "..." + string[pos2:]
+    # Prefer the most selective: longest shortest-literal, then fewest alternatives
+    return max(candidates, key=lambda x: (min(len(l) for l, i in x), -len(x)))
 
 
-def asciify_string(string: str) -> str:
-    # Strip marks/combining characters
-    string = (c for c in string if not unicodedata.category(c).startswith('M'))
+def extract_literals(pattern: str, flags: str) -> Optional[FrozenSet[Tuple[str, bool]]]:
+    """
+    Returns the pattern's required literals (see required_literals), or None if there aren't any.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags_to_int(flags))
+    except re.error:
+        return None
 
-    # Run through substitution table
-    string = ''.join(EMOJI_LETTERS.get(c, c) for c in string)
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    literals = required_literals(parsed, bool(state.flags & re.I))
+    return literals and frozenset(literals)
 
-    # Run through unidecode, if available
-    if unidecode:
-        return unidecode.unidecode(string)
 
-    return string
+def backtrack_safe(parsed, in_repeat: bool = False) -> bool:
+    """
+    Returns False if a parsed pattern has the usual ingredients of catastrophic backtracking:
+    unbounded repeats containing other unbounded repeats or alternations, or backreferences.
+    """
+    for op, av in parsed:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return False
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None)):
+            unbounded = av[1] >= sre_parse.MAXREPEAT
 
+            if (unbounded and in_repeat) or not backtrack_safe(av[2], in_repeat or unbounded):
+                return False
+        elif op is sre_parse.BRANCH:
+            if in_repeat or not all(backtrack_safe(x, in_repeat) for x in av[1]):
+                return False
+        elif op is sre_parse.SUBPATTERN and not backtrack_safe(av[-1], in_repeat):
+            return False
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT) and not backtrack_safe(av[1], in_repeat):
+            return False
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None) and not backtrack_safe(av, in_repeat):
+            return False
 
-def preprocess_msg(_filter, message):
-    if _filter.attachment_header and message.attachments:
-        return '{attachment:%s}%s' % (message.attachments[0]['filename'], message.content)
-    elif message.content.startswith('{attachment:'):
-        return '{' + message.content
-    else:
-        return message.content
+    return True
 
 
-# https://stackoverflow.com/a/11564323
-def topological_sort(source: Iterable[Tuple[HT, Sequence[HT]]]) -> Iterator[HT]:
+def count_unbounded(parsed) -> int:
     """
-    Perform topo sort on elements.
+    Returns the number of unbounded repeats in a parsed pattern
+    """
+    count = 0
+
+    for op, av in parsed:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None)):
+            count += (av[1] >= sre_parse.MAXREPEAT) + count_unbounded(av[2])
+        elif op is sre_parse.BRANCH:
+            count += sum(count_unbounded(x) for x in av[1])
+        elif op is sre_parse.SUBPATTERN:
+            count += count_unbounded(av[-1])
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            count += count_unbounded(av[1])
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            count += count_unbounded(av)
+        elif op is sre_parse.GROUPREF_EXISTS:
+            count += sum(count_unbounded(x) for x in av[1:] if x is not None)
+
+    return count
+
+
+def inline_safe(pattern: str, flags: str) -> bool:
+    """
+    Returns True if a pattern's worst case is bounded enough to run on the event loop. Two unbounded
+    repeats in sequence, as in f.*u.*c.*k, already make searches polynomial in the content length.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags_to_int(flags))
+    except re.error:
+        return False
 
-    :arg source: list of ``(name, [list of dependencies])`` pairs
-    :returns: list of names, with dependencies listed first
+    return backtrack_safe(parsed) and count_unbounded(parsed) <= 1
+
+
+def casefold_for_literals(string: str) -> str:
+    return string.translate(CASEFOLD_FIXUPS).lower()
+
+
+class LiteralPrefilter:
     """
-    # copy dependencies so we can modify set in-place
-    pending = [(name, set(deps)) for name, deps in source]
-    emitted = []
+    Memoized required-literal checks against one piece of content
+    """
+    __slots__ = ['content', 'folded', 'memo']
 
-    while pending:
-        next_pending = []
-        next_emitted = []
+    def __init__(self, content: str):
+        self.content = content
+        self.folded = None
+        self.memo = {}
 
-        for entry in pending:
-            name, deps = entry
-            deps.difference_update(emitted)  # remove deps we emitted last pass
+    def may_match(self, literals: Optional[FrozenSet[Tuple[str, bool]]]) -> bool:
+        """
+        Returns False only if a filter with these required literals can't match the content
+        """
+        if literals is None:
+            return True
+        elif literals not in self.memo:
+            self.memo[literals] = any(self.contains(*x) for x in literals)
 
-            if deps:  # still has deps? recheck during next pass
-                next_pending.append(entry)
-            else:  # no more deps? time to emit
-                yield name
-                emitted.append(name)  # <-- not required, but helps preserve original ordering
-                next_emitted.append(name)  # remember what we emitted for difference_update() in next pass
+        return self.memo[literals]
 
-        if not next_emitted:  # all entries have unmet dependencies, one of two things is wrong...
-            raise ValueError("cyclic or missing dependency detected: %r" % (next_pending,))
+    def contains(self, literal: str, ignorecase: bool) -> bool:
+        if not ignorecase:
+            return literal in self.content
+        elif self.folded is None:
+            self.folded = casefold_for_literals(self.content)
 
-        pending = next_pending
-        emitted = next_emitted
+        return literal in self.folded
 
 
-class POSITION(Enum):
-    START = 'start'
-    FULL = 'full'
-    ANYWHERE = 'anywhere'
+def fusable(pattern: str, flags: str) -> bool:
+    """
+    Returns True if a pattern means the same thing when wrapped in a group of a larger alternation
+    """
+    try:
+        compiled = re.compile(pattern, flags_to_int(flags))
+        parsed = sre_parse.parse(pattern, flags_to_int(flags))
+    except re.error:
+        return False
 
+    return not (compiled.groupindex or has_group_refs(parsed))
 
-#  -> Optional[Type[DiscordUniObj]], but it breaks 3.5
-def type_from_name(list_name: str):
-    for k in DATACLASSES_BY_NAME:
-        k = k.lower()
-        if list_name.startswith(k):
-            return DATACLASSES_BY_NAME[k]
 
-    return None
+def fuse_patterns(patterns: Sequence[str], flags: str) -> Tuple[Optional[SRE_Pattern], List[int]]:
+    """
+    Compiles patterns sharing the same flags into one alternation. Returns the compiled pattern and
+    the indices of the patterns in it; members that don't compile inside a group are left out.
 
+    A fused pattern matches a string if and only if at least one of its members does.
+    """
+    # In verbose mode, a trailing comment would swallow the closing parenthesis
+    end = '\n' if 'X' in flags else ''
+    flags_int = flags_to_int(flags)
+    groups = ['(?:%s%s)' % (pattern, end) for pattern in patterns]
 
-def flags_to_int(flag_chars):
-    flags = 0
+    try:
+        return re.compile('|'.join(groups), flags_int), list(range(len(groups)))
+    except re.error:
+        pass
 
-    for c in flag_chars:
-        flags |= getattr(re, c.upper(), 0)
+    # e.g. a global inline flag, which is an error anywhere but the start of a pattern on 3.11+
+    kept = []
 
-    return flags
+    for i, group in enumerate(groups):
+        try:
+            re.compile(group, flags_int)
+        except re.error:
+            continue
 
+        kept.append(i)
 
-class BoundedOrderedDict(OrderedDict):
-    __slots__ = ['_maxlen']
+    if len(kept) < 2:
+        return None, []
 
-    def __init__(self, iterable: Sequence = (), maxlen=None):
-        self._maxlen = maxlen
-        super().__init__(iterable)
+    try:
+        return re.compile('|'.join(groups[i] for i in kept), flags_int), kept
+    except re.error:
+        return None, []
 
-    @property
-    def maxlen(self):
-        return self._maxlen
 
-    def __setitem__(self, key, value):
-        if not self.__contains__(key) and len(self) == self._maxlen:
-            self.popitem(last=False)
+def assertion_margin(parsed) -> Optional[Tuple[int, bool]]:
+    """
+    Returns (margin, lookaround) for a parsed pattern. margin bounds how far outside of a match its
+    zero-width assertions can look, and lookaround is True if any of them are lookaheads or lookbehinds.
 
-        super().__setitem__(key, value)
+    Returns None if the pattern uses anchors or lookarounds of unbounded width.
+    """
+    margin = 0
+    lookaround = False
 
+    for op, av in parsed:
+        if op is sre_parse.AT:
+            if av not in (sre_parse.AT_BOUNDARY, sre_parse.AT_NON_BOUNDARY):
+                return None
 
-class FilterBase:
-    pass
+            margin += 1
+            continue
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            width = av[1].getwidth()[1]
 
+            if width >= sre_parse.MAXREPEAT - 1:
+                return None
 
-class ItemTypeReference(DiscordObject, DiscordHashable):
-    pass
+            margin += width
+            lookaround = True
+            subpatterns = [av[1]]
+        elif op is sre_parse.SUBPATTERN:
+            subpatterns = [av[-1]]
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None)):
+            subpatterns = [av[2]]
+        elif op is sre_parse.BRANCH:
+            subpatterns = av[1]
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            subpatterns = [av]
+        elif op is sre_parse.GROUPREF_EXISTS:
+            subpatterns = [x for x in av[1:] if x is not None]
+        else:
+            continue
 
+        for subpattern in subpatterns:
+            ret = assertion_margin(subpattern)
 
-class FilterList:
-    __slots__ = ['parent', 'base_list', 'item_type', 'enabled', 'mode', 'overlay', 'items', 'whoami']
+            if ret is None:
+                return None
 
-    # item_type is Type[DiscordUniObj], but that apparently breaks some versions of 3.5
-    def __init__(self, parent, whoami: str, item_type, *, base_list=None, **data):
-        self.parent = parent
-        self.whoami = whoami
-        self.base_list = base_list
-        self.item_type = item_type
+            margin += ret[0]
+            lookaround = lookaround or ret[1]
 
-        self.enabled = data.get('enabled', False)
-        self.mode = data.get('mode', True)
-        self.overlay = data.get('overlay', True)
-        self.items = set(data.get('items', []))
+    return margin, lookaround
 
-    def convert_item(self, ctx, item):
-        """
-        Attempts to use discord's converters on the item type. Requires ctx.
-        """
-        return ctx.command.do_conversion(ctx, self.item_type, item)
 
-    def check(self, obj: DiscordUniObj) -> bool:
-        """
-        Return True if obj is in the list, based on its ID attribute
-        """
-        return isinstance(obj, self.item_type) and self.check_id(obj.id)
+def sequence_window(pattern: str, flags: str) -> Optional[Tuple[Optional[int], int, bool]]:
+    """
+    Returns (max_width, margin, lookaround) for a pattern whose matches only depend on the text
+    near them (see assertion_margin), or None if it uses anchors. max_width is None if unbounded.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags_to_int(flags))
+    except re.error:
+        return None
 
-    def check_id(self, obj_id: str, *, recurse=True) -> Optional[bool]:
-        """
-        Checks whether an ID is a member of the list
-        """
-        if recurse and self.overlay and self.base_list and self.base_list.check_id(obj_id) is False:
-            return False
-        elif not self.enabled:
-            return None
+    ret = assertion_margin(parsed)
 
-        if obj_id in self.items:
-            return self.mode
+    if ret is None:
+        return None
 
-        return not self.mode
+    width = parsed.getwidth()[1]
+    return (None if width >= sre_parse.MAXREPEAT - 1 else width,) + ret
 
-    def check_id_iter(self, id_iter: Iterable[str]) -> Optional[bool]:
-        """
-        Return True if ANY object whose IDs are in id_list are in the list
-        """
-        base_enabled = self.overlay and self.base_list and self.base_list.enabled
 
-        if not self.enabled:
-            if base_enabled:
-                return self.base_list.check_id_iter(id_iter)
-            else:
-                return None
+def sequence_dirty_start(cleared: Sequence[Tuple[str, str]], current: Sequence[Tuple[str, str]],
+                         indices: Sequence[int], join_len: int, edges: bool) -> Optional[int]:
+    """
+    Compares two sequences of (message ID, text) pairs, returning the first position in the joined
+    `current` sequence where its text or an adjacency between messages wasn't in `cleared`, or None
+    if there is no such position. If `edges` is True, a different first or last message also counts.
+    """
+    positions = {message_id: (i, text) for i, (message_id, text) in enumerate(cleared)}
+    last = None
 
-        if base_enabled:
-            for _id in id_iter:
-                if self.base_list.check_id(_id) is False:
-                    return False
-                elif self.check_id(_id, recurse=False):
-                    return True
+    for i, (message_id, text) in enumerate(current):
+        prev = last
+        last = positions.get(message_id)
+        start = indices[i - 1] if i else 0
 
-        elif any(_id in self.items for _id in id_iter):
-            return self.mode
+        if last is None or last[1] != text:
+            return max(start - join_len, 0)
+        elif prev is None:
+            if edges and last[0] != 0:
+                return 0
+        elif last[0] != prev[0] + 1:
+            return start - join_len
 
-        return not self.mode
+    if edges and last is not None and last[0] != len(cleared) - 1:
+        return indices[-1]
 
-    def check_iter(self, obj_list: Iterable[DiscordUniObj]) -> Optional[bool]:
-        return self.check_id_iter((x.id for x in obj_list))
+    return None
 
-    def filter(self, items: Iterable) -> List:
+
+class CompiledPattern:
+    """
+    A compiled (pattern, flags, position) and the functions built from it, shared through PatternRegistry.
+
+    The static analyses the main process needs (required literals, sequence window and inline safety) are
+    only done on request, since workers don't use them.
+    """
+    __slots__ = ['key', 'refs', 'compiled', 'match_func', 'predicate', 'iter_predicate', 'analyzed',
+                 'literals', 'seq_window', 'inline_safe']
+
+    def __init__(self, pattern: str, flags: str, position: 'POSITION'):
+        self.key = (pattern, flags, position)
+        self.refs = 0
+        self.compiled = re.compile(pattern, flags_to_int(flags))
+        self.match_func = get_match_func(self.compiled, position)
+        self.predicate = partial(check_match, self.match_func)
+        self.iter_predicate = partial(check_match_iter, self.compiled.finditer)
+        self.analyzed = False
+        self.literals = None
+        self.seq_window = None
+        self.inline_safe = False
+
+    def analyze(self) -> 'CompiledPattern':
+        if not self.analyzed:
+            pattern, flags, position = self.key
+            self.literals = extract_literals(pattern, flags)
+            self.seq_window = sequence_window(pattern, flags)
+            self.inline_safe = inline_safe(pattern, flags)
+            self.analyzed = True
+
+        return self
+
+
+class PatternRegistry:
+    """
+    Process-wide, reference counted CompiledPattern objects, so that filters with the same pattern, flags
+    and position (such as copies of a community list in many servers) are only compiled and held once
+    """
+    __slots__ = ['entries', 'lock']
+
+    def __init__(self):
+        self.entries = {}  # {(pattern, flags, position): CompiledPattern}
+        self.lock = threading.Lock()  # workers are threads on Windows
+
+    def acquire(self, pattern: str, flags: str, position: 'POSITION') -> CompiledPattern:
         """
-        Returns a subset of the input containing objects that are in the list
+        Returns the shared CompiledPattern for the key, compiling it if needed. Raises re.error for bad patterns.
         """
-        return list(filter(self.check, items))
+        key = (pattern, flags, position)
 
-    def to_json(self) -> dict:
-        data = {
-            'mode': self.mode,
-            'items': list(self.items),
-            'enabled': self.enabled
-        }
+        with self.lock:
+            entry = self.entries.get(key)
 
-        if self.overlay is not None:
-            data['overlay'] = self.overlay
+            if entry is None:
+                entry = self.entries[key] = CompiledPattern(pattern, flags, position)
 
-        return data
+            entry.refs += 1
 
-    def __contains__(self, obj: DiscordUniObj) -> bool:
-        return self.check(obj)
+        return entry
 
-    def copy(self, new_parent):
-        return type(self)(
-            new_parent or self.parent,
-            self.whoami,
-            self.item_type,
-            base_list=self.base_list,
-            enabled=self.enabled,
-            mode=self.mode,
-            overlay=self.overlay,
-            items=self.items.copy()
-        )
+    def release(self, entry: CompiledPattern):
+        with self.lock:
+            entry.refs -= 1
 
+            if entry.refs <= 0 and self.entries.get(entry.key) is entry:
+                del self.entries[entry.key]
 
-class ServerConfig(FilterBase):
-    __slots__ = ['cog', 'asciify', 'priv_exempt', 'roles_list', 'channels_list', 'filters', 'order']
+    @property
+    def references(self) -> int:
+        return sum(e.refs for e in self.entries.values())
 
-    def __init__(self, cog, **data):
-        self.cog = cog
-        self.name = 'SERVER'
 
-        self.asciify = data.get('asciify', False)
-        self.priv_exempt = data.get('priv_exempt', True)
-        self.filters = {}
-        self.order = []
+PATTERN_REGISTRY = PatternRegistry()
 
-        lists_deps = {}
 
-        # Create server-wide lists
-        for list_name in ['roles_list', 'channels_list']:
-            item_type = type_from_name(list_name)
-            _list = FilterList(self, list_name, item_type, overlay=None, **data.get(list_name, {}))
-            setattr(self, list_name, _list)
-            lists_deps[list_name] = {}
+class ResidentFilterSet:
+    """
+    A worker's compiled copy of one version of a server's filters
+    """
+    __slots__ = ['entries', 'match_funcs', 'predicates', 'iter_predicates', 'fused_groups', 'fused_predicates']
+
+    def __init__(self, spec: dict):
+        self.entries = []
+        self.match_funcs = {}
+        self.predicates = {}
+        self.iter_predicates = {}
+        self.fused_groups = {}  # {name: index into fused_predicates}
+        self.fused_predicates = []
+        fuse_candidates = OrderedDict()
+
+        for name, (pattern, flags, position) in spec['filters'].items():
+            try:
+                entry = PATTERN_REGISTRY.acquire(pattern, flags, POSITION(position))
+            except re.error:
+                continue
 
-        # Instantiate filters without linked sublists
-        for name, filter_data in data.get('filters', {}).items():
-            self.filters[name] = Filter(self, name=name, defer_link=True, **filter_data)
+            self.entries.append(entry)
+            self.match_funcs[name] = entry.match_func
+            self.predicates[name] = entry.predicate
+            self.iter_predicates[name] = entry.iter_predicate
 
-            # list_deps is empty, set it here
-            for list_name, list_deps in lists_deps.items():
-                link_name = filter_data.get(list_name + '_link')
+            if spec['fused'] and fusable(pattern, flags):
+                fuse_candidates.setdefault((flags, position), []).append((name, pattern))
 
-                if link_name in [None, 'SERVER']:
-                    list_deps[name] = []
-                else:
-                    list_deps[name] = [link_name]
+        for (flags, position), members in fuse_candidates.items():
+            if len(members) < 2:
+                continue
 
-        for list_name, list_deps in lists_deps.items():
-            for filter_name in topological_sort(list_deps.items()):
-                if list_deps[filter_name]:  # if dep list is nonempty
-                    self.filters[filter_name].set_list(list_name, link_dest=list_deps[filter_name][0])
+            fused, kept = fuse_patterns([pattern for name, pattern in members], flags)
 
-        self.update_order()
+            if fused is None:
+                continue
 
-    def update_order(self):
-        filters = (f for f in self.filters.values() if f.enabled)
-        self.order[:] = sorted(filters, key=lambda f: f.filter_priority, reverse=True)
+            for i in kept:
+                self.fused_groups[members[i][0]] = len(self.fused_predicates)
 
-    def make_link(self, link_owner, target_owner, list_name):
-        dep_graph = {}
+            self.fused_predicates.append(partial(check_match, get_match_func(fused, POSITION(position))))
 
-        # build the current state
-        for _filter in self.filters.values():
-            link_dest = _filter.links.get(list_name)
-            dep_graph[_filter.name] = [] if link_dest in [self, None] else [link_dest.name]
+    def release(self):
+        """
+        Releases this set's patterns, so ones no newer set uses can be freed
+        """
+        for entry in self.entries:
+            PATTERN_REGISTRY.release(entry)
 
-        # make the proposed change
-        dep_graph[link_owner.name] = [target_owner.name]
+        self.entries.clear()
 
-        # test for cycles/broken links
-        sorted_names = list(topological_sort(dep_graph.items()))
 
-        # apply the changes
-        for name in sorted_names:
-            if dep_graph[name]:
-                self.filters[name].set_list(list_name, link_dest=dep_graph[name][0])
-            else:
-                self.filters[name].links.pop(list_name, None)
+# Filter sets resident in each worker, keyed by server ID: (version, ResidentFilterSet)
+_resident_filter_sets = {}
 
-        assert getattr(link_owner, list_name) is getattr(target_owner, list_name)
-        return getattr(target_owner, list_name)
 
-    def break_link(self, link_owner, list_name, *, copy=False, **newlist_data):
-        current_list = getattr(link_owner, list_name)
-        if current_list.parent is link_owner:
-            raise TypeError("Not linked.")
-        elif copy and newlist_data:
-            raise TypeError("If copy is set, no extra data should be passed.")
+def missing_filter_result(name: str, string: str) -> dict:
+    return {'time': 0, 'exception': KeyError(name)}
 
-        dep_graph = {}
 
-        # build the current state
-        for _filter in self.filters.values():
-            link_dest = _filter.links.get(list_name)
-            dep_graph[_filter.name] = [] if link_dest in [self, None] else [link_dest.name]
+def check_time(match) -> float:
+    """
+    Returns the time taken by a check_match or check_match_iter result
+    """
+    if type(match) is list:
+        return sum(x['time'] for x in match)
 
-        # make the proposed change
-        dep_graph[link_owner.name] = []
+    return match['time']
 
-        # test for cycles/broken links
-        sorted_names = list(topological_sort(dep_graph.items()))
 
-        # apply the changes
-        for name in sorted_names:
-            if dep_graph[name]:
-                self.filters[name].set_list(list_name, link_dest=dep_graph[name][0])
-            else:
-                self.filters[name].links.pop(list_name, None)
+def stops_on(check: tuple, match, no_stop: bool = False) -> bool:
+    """
+    Returns True if `match` (a check_match or check_match_iter result) should end a run of checks
+    """
+    return bool(check[2] and not no_stop and (('match' in match) if type(match) is dict else len(match)))
 
-            if name == link_owner.name:
-                if copy:
-                    newlist_obj = getattr(link_owner, list_name).copy(link_owner)
-                    link_owner.set_list(list_name, new_list_obj=newlist_obj)
-                else:
-                    self.filters[name].set_list(list_name, new_list_data=newlist_data)
 
-        return getattr(link_owner, list_name)
+def check_matches_resident(server_id: str, version: int, inputs: Iterable[Tuple[str, str, bool, bool]],
+                           spec: Optional[dict] = None, no_stop: bool = False, fused: bool = True
+                           ) -> Optional[List[dict]]:
+    """
+    Call multiple check_match against a server's resident filter set.
 
-    def get_filter(self, _filter: Union[str, 'Filter'], check=False):
-        if isinstance(_filter, Filter):
-            if _filter.parent is not self:
-                if not check:
-                    return None
-                raise TypeError("the provided filter does not belong to this config")
-            elif _filter not in self.filters.values():
-                if not check:
-                    return None
-                raise ValueError("the provided filter is not in this config")
-            else:
-                return _filter
-        elif type(_filter) is str:
-            if _filter not in self.filters:
-                if not check:
-                    return None
-                raise ValueError("there is no filter named '%s'" % _filter)
-            else:
-                return self.filters[_filter]
-        else:
-            raise TypeError('only Filter objects or names (str) may be passed')
+    Takes an iterable of (name, str, stop_on_match, iterate[, pos]) tuples. If iterate is True, the filter's
+    finditer is used instead of its positional predicate. If pos is given, matching starts there instead of
+    at the beginning of the string. If the worker doesn't hold `version` of the server's filters and no spec
+    is passed, returns None so the caller can resubmit with the spec.
 
-    def add_filter(self, name: str, **data):
-        if self.get_filter(name):
-            raise ValueError("filter %s already exists" % name)
+    If fused is True, filters in a fused group are only run individually when the group's combined
+    pattern matches the string; otherwise they are all reported as misses with a 'fused' key.
+    """
+    entry = _resident_filter_sets.get(server_id)
 
-        self.filters[name] = f = Filter(self, name=name, **data)
+    if entry is None or entry[0] != version:
+        if spec is None:
+            return None
 
-        if f.enabled:
-            self.update_order()
+        old_entry = entry
+        entry = _resident_filter_sets[server_id] = (version, ResidentFilterSet(spec))
 
-        return f
+        # Patterns that didn't change are kept by the new set, so they aren't recompiled
+        if old_entry is not None:
+            old_entry[1].release()
 
-    def rename_filter(self, _filter: Union[str, 'Filter'], new_name: str):
-        _filter = self.get_filter(_filter, check=True)
+    filter_set = entry[1]
+    fused_results = {}
+    ret_list = []
 
-        if type(new_name) is not str:
-            raise TypeError('only strings may be passed as new name')
-        elif not new_name:
-            raise ValueError('new name must be nonempty')
+    for name, string, stop_on_match, iterate, *pos in inputs:
+        pos = pos[0] if pos else 0
+        group = None if (iterate or pos or not fused) else filter_set.fused_groups.get(name)
 
-        if self.get_filter(new_name):
-            raise ValueError("filter %s already exists" % new_name)
+        if group is not None:
+            fused_key = (group, string)
 
-        self.filters[new_name] = self.filters.pop(_filter.name)
-        _filter.name = new_name
-        return _filter
+            if fused_key not in fused_results:
+                fused_results[fused_key] = filter_set.fused_predicates[group](string)
 
-    def copy_filter(self, _filter: Union[str, 'Filter'], new_name: str, link=False, **kwargs):
-        _filter = self.get_filter(_filter, check=True)
+            if not ('match' in fused_results[fused_key] or 'exception' in fused_results[fused_key]):
+                ret_list.append({'time': 0, 'name': name, 'fused': True})
+                continue
 
-        if type(new_name) is not str:
-            raise TypeError('only strings may be passed as new name')
-        elif not new_name:
-            raise ValueError('new name must be nonempty')
+        if iterate:
+            predicate = filter_set.iter_predicates.get(name)
+        elif pos and name in filter_set.match_funcs:
+            predicate = partial(check_match, partial(filter_set.match_funcs[name], pos=pos))
+        else:
+            predicate = filter_set.predicates.get(name)
 
-        if self.get_filter(new_name):
-            raise ValueError("filter %s already exists" % new_name)
+        ret = predicate(string) if predicate else missing_filter_result(name, string)
 
-        copied = self.filters[new_name] = _filter.copy(new_name, link=link, **kwargs)
-        return copied
+        if isinstance(ret, dict):
+            ret['name'] = name
 
-    def delete_filter(self, _filter: Union[str, 'Filter']):
-        _filter = self.get_filter(_filter, check=True)
+        ret_list.append(ret)
 
-        channels_linked = []
-        roles_linked = []
-        linked_err = []
+        if (stop_on_match and not no_stop) and (('match' in ret) if type(ret) is dict else len(ret)):
+            break
 
-        for filter_name, f in self.filters.items():
-            if f is _filter:
-                continue
-            if f.links.get('channels_list') is _filter:
-                channels_linked.append(filter_name)
-            if f.links.get('roles_list') is _filter:
-                roles_linked.append(filter_name)
+    return ret_list
 
-        if channels_linked:
-            linked_err.append('channels: ' + ', '.join(channels_linked))
-        if roles_linked:
-            linked_err.append('roles: ' + ', '.join(roles_linked))
-        if linked_err:
-            raise TypeError('links exist from other filters: ' + '; '.join(linked_err))
 
-        self.filters.pop(_filter.name)
+def check_batches_resident(server_id: str, version: int, batches: Sequence[Sequence[Tuple[str, str, bool, bool]]],
+                           spec: Optional[dict] = None, no_stop: bool = False, fused: bool = True
+                           ) -> Optional[List[List[dict]]]:
+    """
+    check_matches_resident for several messages' checks in one executor job. Each batch stops on its own
+    matches. Returns None under the same conditions as check_matches_resident.
+    """
+    first = check_matches_resident(server_id, version, batches[0], spec=spec, no_stop=no_stop, fused=fused)
 
-        if _filter.enabled:
-            self.update_order()
+    if first is None:
+        return None
 
-        return True
+    return [first] + [check_matches_resident(server_id, version, inputs, no_stop=no_stop, fused=fused)
+                      for inputs in batches[1:]]
 
-    async def check_message(self, message: Message, list_cache: dict = None
-                            ) -> Tuple[Optional["Filter"], bool, Optional[str]]:
-        """
-        Return the matched filter (or None if no match), a boolean indicating whether to
-        delete `message`, and the substring of the match (None if no match or whitelist).
-        """
-        content_cache = {}
-        checks = []
-        checked = []
 
-        if list_cache is None:
-            list_cache = {}
+def make_bench_words(rng: random.Random, count: int) -> List[str]:
+    return [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 9))) for _ in range(count)]
 
-        for f in self.order:
-            # Don't run if the filter is multi-message
-            if f.multi_msg or not (f.check_meta(message, list_cache) and f.predicate):
-                continue
 
-            asciify = f.asciify or (f.asciify is None and self.asciify)
-            ck = (asciify, f.attachment_header)
+def make_bench_filters(rng: random.Random, count: int, words: Sequence[str]) -> OrderedDict:
+    """
+    Returns {name: (pattern, flags, position)} for `count` blacklist-style patterns of mixed shapes
+    """
+    shapes = [
+        lambda w: r'\b%s\b' % w,
+        lambda w: r'%s\w*' % w,
+        lambda w: r'\W*'.join(w),
+        lambda w: r'\b(?:%s|%s)s?\b' % (w, w[::-1]),
+    ]
 
-            if ck in content_cache:
-                content = content_cache[ck]
-            else:
-                content = preprocess_msg(f, message)
+    filters = OrderedDict()
 
-                if asciify:
-                    content = asciify_string(content)
+    for i in range(count):
+        filters['bench_%i' % i] = (rng.choice(shapes)(words[i % len(words)]), DEFAULT_FLAGS, POSITION.ANYWHERE.value)
 
-                content_cache[ck] = content
+    return filters
 
-            stop_on_match = f.override or not f.mode  # short-circuit for override or blacklist mode
-            checked.append(f)
-            checks.append((f.name, f.predicate, content, stop_on_match))
 
-        if not checks:
-            return None, False, None
+def make_bench_messages(rng: random.Random, count: int, words: Sequence[str], bad_words: Sequence[str],
+                        hit_rate: float = 0.02) -> List[str]:
+    messages = []
 
-        matches = await self.cog.bot.loop.run_in_executor(self.cog.executor, check_matches, checks)
-        whites_checked = []
-        match_white = False
+    for _ in range(count):
+        message = [rng.choice(words) for _ in range(rng.randint(3, 25))]
 
-        for f, match_dict in zip(checked, matches):
-            matched = match_dict.get('match')
+        if rng.random() < hit_rate:
+            message[rng.randrange(len(message))] = rng.choice(bad_words)
 
-            if f.override and matched:  # override black or white
-                return f, not f.mode, (None if f.mode else matched)
-            elif whites_checked and not f.mode and not match_white:
-                white_hit = whites_checked[0] if len(whites_checked) == 1 else None
-                # Message has whitelist but nothing matched, return immediately
-                return white_hit, True, None
-            elif f.mode and not f.override:  # white for normal only, ORed between all matches
-                whites_checked.append(f)
-                match_white |= bool(matched)
-            elif matched:  # black regular
-                return f, True, matched
+        messages.append(' '.join(message))
 
-        if whites_checked:
-            white_hit = whites_checked[0] if len(whites_checked) == 1 else None
-            return white_hit, not match_white, None
+    return messages
 
-        return None, False, None
 
-    async def debug_message(self, message: Message) -> Tuple[List[Tuple[str, str, Optional[str]]],
-                                                             Optional[Tuple[str, bool]]]:
-        """
-        Return a list of each filter's results and the ultimate action that would be taken, if any
-        """
-        has_white = False
-        match_white = False
-        content_cache = {}
-        list_cache = {}
-        action = None
-        results = []
+def benchmark_fused(filter_counts: Sequence[int] = (1, 10, 25, 50, 100, 200), num_messages: int = 2000,
+                    seed: int = 0) -> List[Tuple[int, float, float]]:
+    """
+    Measures in-process throughput of a blacklist filter set with and without fusion.
 
-        for f in self.order:
-            meta_result = f.check_meta(message, list_cache, debug=True)
+    Returns a list of (filter count, separate messages/sec, fused messages/sec).
+    """
+    rng = random.Random(seed)
+    bad_words = make_bench_words(rng, max(filter_counts))
+    messages = make_bench_messages(rng, num_messages, make_bench_words(rng, 500), bad_words)
+    results = []
 
-            if not meta_result[0]:
-                results.append((f.name, 'meta skip', meta_result[1]))
-                continue
-            elif not f.predicate:
-                results.append((f.name, 'no predicate', None))
-                continue
+    for count in filter_counts:
+        spec = {'fused': True, 'filters': make_bench_filters(rng, count, bad_words)}
+        inputs = [(name, None, True, False) for name in spec['filters']]
+        rates = []
 
-            asciify = f.asciify or (f.asciify is None and self.asciify)
-            ck = (asciify, f.attachment_header)
+        for fused in (False, True):
+            server_id = '_bench_%i_%s' % (count, fused)
+            check_matches_resident(server_id, 0, (), spec=spec)
+            t0 = time.perf_counter()
 
-            if ck in content_cache:
-                content = content_cache[ck]
-            else:
-                content = preprocess_msg(f, message)
+            for message in messages:
+                check_matches_resident(server_id, 0, [(n, message, s, i) for n, _, s, i in inputs], fused=fused)
 
-                if asciify:
-                    content = asciify_string(content)
+            rates.append(len(messages) / (time.perf_counter() - t0))
+            _resident_filter_sets.pop(server_id, None)
 
-                content_cache[ck] = content
+        results.append((count, rates[0], rates[1]))
 
-            match = await self.cog.bot.loop.run_in_executor(self.cog.executor, f.predicate, content)
+    return results
 
-            if f.override and match:  # override black or white
-                if action is None:
-                    action = (f.name, not f.mode)
 
-                result = 'override match', match and content[match[0]:match[1]]
-            elif has_white and not f.mode and not match_white:
-                if action is None:
-                    action = (f.name, True)
+def benchmark_asciify(num_messages: int = 500, seed: int = 0) -> List[Tuple[str, float, float, float]]:
+    """
+    Measures asciify cost on synthetic messages of different kinds.
 
-                result = 'white->black transition but no white match', match and content[match[0]:match[1]]
-            elif f.mode and not f.override:
-                has_white = True
-                match_white |= bool(match)
-                result = 'white test (%s)' % ('hit' if bool(match) else 'miss'), match and content[match[0]:match[1]]
-            elif match:
-                if action is None:
-                    action = (f.name, True)
+    Returns a list of (kind, naive us/msg, table us/msg, memoized us/msg). The memo is measured warm,
+    as when several filters or sequence passes see the same message.
+    """
+    def asciify_string_naive(string: str) -> str:
+        # character-by-character, as it was before ASCIIFY_TABLE
+        string = (c for c in string if not unicodedata.category(c).startswith('M'))
+        string = ''.join(EMOJI_LETTERS.get(c, c) for c in string)
+        return unidecode(string) if unidecode else string
+
+    rng = random.Random(seed)
+    words = make_bench_words(rng, 500)
+    plain = make_bench_messages(rng, num_messages, words, (), hit_rate=0)
+    marks = [chr(c) for c in range(0x300, 0x370)]
+    emoji = list(EMOJI_LETTERS)
+
+    inputs = OrderedDict([
+        ('ascii', plain),
+        ('accented', [''.join(c + (rng.choice(marks) if rng.random() < 0.2 else '') for c in m) for m in plain]),
+        ('zalgo', [''.join(c + ''.join(rng.choice(marks) for _ in range(rng.randint(3, 12))) for c in m)
+                   for m in plain]),
+        ('emoji', [' '.join(''.join(rng.choice(emoji) for _ in range(len(w))) for w in m.split()) for m in plain]),
+    ])
+
+    results = []
+
+    for kind, messages in inputs.items():
+        timings = []
+        memo = AsciifyMemo(maxlen=len(messages))
+
+        for func in (asciify_string_naive, asciify_string, memo):
+            if func is memo:
+                for message in messages:
+                    memo(message)
 
-                result = 'black match', match and content[match[0]:match[1]]
-            else:
-                result = 'default case', None
+            t0 = time.perf_counter()
 
-            results.append((f.name, *result))
+            for message in messages:
+                func(message)
 
-        if has_white:
-            action = ('default w/ whitelist', not match_white)
+            timings.append((time.perf_counter() - t0) * 1e6 / len(messages))
 
-        return results, action
+        results.append((kind, *timings))
 
-    async def check_sequence(self, messages: Sequence[Message],
-                             list_cache: Optional[dict] = None
-                             ) -> Tuple[Optional["Filter"], Set[Message], Optional[str]]:
-        """
-        Return the matched filter (or None if no match), a set of messages that should be deleted, and
-        the matching span from the sequence `messages` (None if no match or whitelist).
-        """
-        joined_cache = {}
-        content_cache = {}
-        checks = []
-        checked = []
+    return results
 
-        first_msg = next(iter(messages))
 
-        if not messages:
-            return None, set(), None
-        elif list_cache is None:
-            list_cache = {}
+def benchmark_lists(num_members: int = 500, seed: int = 0) -> List[Tuple[str, float, float]]:
+    """
+    Measures role list checks for members with 100-200 roles each, in a server with 250 roles.
 
-        for f in self.order:
-            if not (f.multi_msg and f.check_meta(first_msg, list_cache) and f.predicate):
-                continue
+    Returns a list of (scenario, naive us/check, effective set us/check).
+    """
+    # check_id and check_id_iter as they were before effective sets, walking the base list per ID
 
-            asciify = f.asciify or (f.asciify is None and self.asciify)
-            jk = (asciify, f.multi_msg_join, f.attachment_header)
+    def check_id_naive(_list: FilterList, obj_id: str, *, recurse=True) -> Optional[bool]:
+        if recurse and _list.overlay and _list.base_list and check_id_naive(_list.base_list, obj_id) is False:
+            return False
+        elif not _list.enabled:
+            return None
 
-            if jk in joined_cache:
-                content, indices = joined_cache[jk]
-            else:
-                strings = []
+        if obj_id in _list.items:
+            return _list.mode
 
-                for message in messages:
-                    ck = (asciify, f.attachment_header, message.id)
+        return not _list.mode
 
-                    if ck in content_cache:
-                        content = content_cache[ck]
-                    else:
-                        content = preprocess_msg(f, message)
+    def check_id_iter_naive(_list: FilterList, id_iter: Iterable[str]) -> Optional[bool]:
+        base_enabled = _list.overlay and _list.base_list and _list.base_list.enabled
 
-                        if asciify:
-                            content = asciify_string(content)
+        if not _list.enabled:
+            return check_id_iter_naive(_list.base_list, id_iter) if base_enabled else None
 
-                        content_cache[ck] = content
+        if base_enabled:
+            for _id in id_iter:
+                if check_id_naive(_list.base_list, _id) is False:
+                    return False
+                elif check_id_naive(_list, _id, recurse=False):
+                    return True
 
-                    strings.append(content)
+        elif any(_id in _list.items for _id in id_iter):
+            return _list.mode
 
-                joined_cache[jk] = (content, indices) = concat_with_keys(strings, f.multi_msg_join)
+        return not _list.mode
 
-            # Don't stop immediately on white
-            stop_on_match = f.override or not f.mode
-            predicate = partial(check_match_iter, f.compiled.finditer) if f.mode else f.predicate
-            checks.append((f.name, predicate, content, stop_on_match))
-            checked.append((f, indices, content))
+    rng = random.Random(seed)
+    role_ids = [str(10 ** 17 + i) for i in range(250)]
+    members = [rng.sample(role_ids, rng.randint(100, 200)) for _ in range(num_members)]
 
-        matches = await self.cog.bot.loop.run_in_executor(self.cog.executor, check_matches, checks)
-        whites_checked = []
-        matched_message_set = set()
-        message_set = set(messages)
-        to_delete = message_set.copy()
-        new_wlc = []
-        spans = []
+    scenarios = OrderedDict([
+        ('no overlay', (False, False)),
+        ('base blacklist', (True, False)),
+        ('base whitelist', (True, True)),
+    ])
 
-        for (f, indices, content), match_obj in zip(checked, matches):
-            if type(match_obj) is list:
-                matches = match_obj
-            else:
-                matches = [match_obj]
+    results = []
 
-            matched_message_set.clear()
-            new_wlc.clear()
-            spans.clear()
+    for scenario, (overlay, base_mode) in scenarios.items():
+        base = FilterList(None, 'roles_list', discord.Role, overlay=None, enabled=True, mode=base_mode,
+                          items=rng.sample(role_ids, 200 if base_mode else 5))
+        _list = FilterList(None, 'roles_list', discord.Role, base_list=base, overlay=overlay, enabled=True,
+                           mode=True, items=rng.sample(role_ids, 10))
+        timings = []
 
-            for match in matches:
-                if 'match' not in match:
-                    continue
-                elif f.multi_msg_group > 0 and not f.mode:  # groups disabled for whitelist
-                    if len(match.get('group_spans', [])) < f.multi_msg_group:
-                        continue
+        for func in (check_id_iter_naive, FilterList.check_id_iter):
+            t0 = time.perf_counter()
 
-                    match = match['group_spans'][f.multi_msg_group - 1]
-                else:
-                    match = match['span']
+            for role_list in members:
+                func(_list, role_list)
 
-                spans.append(match)
+            timings.append((time.perf_counter() - t0) * 1e6 / num_members)
 
-                match_messages = sequence_from_indices(messages, indices, match)
-                matched_message_set.update(match_messages)
+        results.append((scenario, *timings))
 
-                if f.mode:
-                    new_wlc.append((match_messages[0].id, match_messages[-1].id))
+    return results
 
-            if matched_message_set and f.mode:
-                wlc_key = (first_msg.channel.id, first_msg.author.id)
-                to_delete -= matched_message_set
 
-                for start_id, end_id in f.mm_white_lastmatch_cache.get(wlc_key, ()):
-                    # The only case we care about: the start of a former match is outside the window, but not the end
-                    if start_id < first_msg.id < end_id:
-                        for message in itertools.takewhile(lambda m: m.id <= end_id, messages):
-                            to_delete.discard(message)
+class CorpusMessage:
+    """
+    A recorded message to replay, independent of the bot's own objects
+    """
+    __slots__ = ['server_id', 'channel_id', 'channel_name', 'author_id', 'author_name', 'role_ids', 'content',
+                 'attachments', 'timestamp']
+
+    def __init__(self, server_id: str, channel_id: str, author_id: str, content: str, timestamp: datetime,
+                 channel_name: str = None, author_name: str = None, role_ids: Sequence[str] = (),
+                 attachments: Sequence[str] = ()):
+        self.server_id = server_id
+        self.channel_id = channel_id
+        self.channel_name = channel_name or channel_id
+        self.author_id = author_id
+        self.author_name = author_name or author_id
+        self.role_ids = tuple(role_ids)
+        self.content = content
+        self.attachments = tuple(attachments)
+        self.timestamp = timestamp
+
+
+def parse_activitylog(path: str, authors: dict) -> Iterator[CorpusMessage]:
+    """
+    Yields the messages in an activitylog channel log. Edits, deletions and other events are skipped.
 
-                f.mm_white_lastmatch_cache[wlc_key] = new_wlc.copy()
+    Logs don't record user IDs, so authors are numbered by name#discriminator in `authors`, which
+    should be shared between the files of one corpus.
+    """
+    server_id = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    channel_id = os.path.splitext(os.path.basename(path))[0].rsplit('_', 1)[-1]  # strip any rotation prefix
 
-            if spans:
-                start = spans[0][0]
-                end = spans[-1][1]
-                match_substr = content[start:end]
-            else:
-                match_substr = None
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = ACTIVITYLOG_LINE_RE.match(line.rstrip('\n'))
 
-            if f.override and matched_message_set and not f.mode:  # override black
-                return f, matched_message_set, match_substr
-            elif f.override and f.mode and to_delete:  # override white
-                return f, to_delete, None
-            elif whites_checked and not f.mode and to_delete:
-                white_hit = whites_checked[0] if len(whites_checked) == 1 else None
-                # Message has whitelist but we're on a blacklist, return immediately
-                return white_hit, to_delete, None
-            elif f.mode and not f.override:  # white for normal only
-                whites_checked.append(f)
-            elif matched_message_set:  # regular black
-                return f, matched_message_set, match_substr
+            if not match:
+                continue
 
-        if whites_checked:
-            white_hit = whites_checked[0] if len(whites_checked) == 1 else None
-            return white_hit, to_delete, None
+            timestamp, channel_name, author_name, content = match.groups()
+            content, attachments = split_activitylog_attachment(content)
 
-        return None, set(), None
+            yield CorpusMessage(
+                server_id, channel_id,
+                author_id=authors.setdefault(author_name, str(len(authors) + 1)),
+                content=content.replace('\\n', '\n'),
+                timestamp=datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'),
+                channel_name=channel_name,
+                author_name=author_name,
+                attachments=attachments
+            )
 
-    def to_json(self):
-        return {
-            'asciify'      : self.asciify,
-            'priv_exempt'  : self.priv_exempt,
-            'channels_list': self.channels_list.to_json(),
-            'roles_list'   : self.roles_list.to_json(),
-            'filters'      : {k: v.to_json() for k, v in self.filters.items()}
-        }
 
+def split_activitylog_attachment(content: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Splits an activitylog message entry's text into its content and the filename of its attachment, if any
+    """
+    attachment = ACTIVITYLOG_ATTACHMENT_RE.search(content)
 
-class Filter(FilterBase):
-    __slots__ = ['parent', 'name', 'pattern', 'flags', 'mode', 'enabled', 'override', 'asciify', 'position',
-                 'channels_list', 'roles_list', 'priv_exempt', 'multi_msg', 'links', 'attachment_header',
-                 'multi_msg_group', 'multi_msg_join', '_predicate', '_compiled', 'mm_white_lastmatch_cache',
-                 'flash_msg', 'flash_dm', 'flash_sec']
+    if not attachment:
+        return content, ()
 
-    def __init__(self, parent: ServerConfig, name: str, *, defer_link=False, **data):
-        self.parent = parent
-        self.name = name
+    return content[:attachment.start()], (attachment.group(1).split(',')[0].rsplit('/', 1)[-1],)
 
-        self.pattern = data.get('pattern', '')
-        self.flags = data.get('flags', DEFAULT_FLAGS)
-        self.mode = data.get('mode', False)
-        self.enabled = data.get('enabled', False)
-        self.override = data.get('override', False)
-        self.priv_exempt = data.get('priv_exempt', None)
-        self.multi_msg = data.get('multi_msg', False)
-        self.multi_msg_join = data.get('multi_msg_join', CONCAT_JOIN)
-        self.multi_msg_group = data.get('multi_msg_group', 0)
-        self.asciify = data.get('asciify', None)
-        self.attachment_header = data.get('attachment_header', False)
-        self.flash_msg = data.get('flash_msg', False)
-        self.flash_dm = data.get('flash_dm', False)
-        self.flash_sec = data.get('flash_sec', 5)
 
-        self.position = POSITION(data.get('position', POSITION.ANYWHERE))
-        self.rebuild_predicate()
-        self.mm_white_lastmatch_cache = {}
+def parse_corpus_jsonl(path: str) -> Iterator[CorpusMessage]:
+    """
+    Yields the messages in a JSONL corpus: one object per line with a 'content' string and optionally
+    'server', 'channel' and 'author' IDs, 'roles' (a list of role IDs), 'attachments' (a list of
+    filenames) and 'timestamp' (ISO 8601 or Unix time).
 
-        self.links = {}
+    Activitylog's .jsonl logs are recognised too; their edits, deletions and other events are skipped.
+    Raises ValueError on a line that is neither.
+    """
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
 
-        for k in ['roles_list', 'channels_list']:
-            if isinstance(data.get(k), FilterList):
-                self.set_list(k, new_list_obj=data[k])
-            else:
-                self.set_list(k, link_dest=data.get(k + '_link'), defer=defer_link, new_list_data=data.get(k, {}))
+            entry = json.loads(line)
 
-    def set_list(self, list_name, *, link_dest=None, defer=False, new_list_data=None, new_list_obj: FilterList = None):
-        list_val = None
-        server_list = getattr(self.parent, list_name)
+            if not isinstance(entry, dict):
+                raise ValueError('%s line %i is not a JSON object' % (path, line_number))
+            elif 'content' not in entry:
+                if not {'t', 's', 'c', 'a', 'm'}.issubset(entry):
+                    raise ValueError('%s line %i has no "content"' % (path, line_number))
 
-        if not link_dest:
-            if new_list_data is None and not new_list_obj:
-                raise TypeError("list_data or list_obj required without link_dest")
-            elif new_list_obj and new_list_data is not None:
-                raise TypeError("only list_data or list_obj can be passed, not both")
-            elif new_list_obj:
-                list_val = new_list_obj
-            else:
-                item_type = type_from_name(list_name)
-                list_val = FilterList(self, list_name, item_type, base_list=server_list, **new_list_data)
+                match = entry['a'] and ACTIVITYLOG_RECORD_RE.match(entry['m'])
 
-            self.links.pop(list_name, None)
-        elif link_dest == 'SERVER':
-            list_val = server_list
-            self.links[list_name] = self.parent
-        elif not defer:
-            linked_filter = self.parent.filters[link_dest]
-            self.links[list_name] = linked_filter
-            list_val = getattr(linked_filter, list_name)
+                if not match:
+                    continue
 
-        setattr(self, list_name, list_val)
+                author_name, content = match.groups()
+                content, attachments = split_activitylog_attachment(content)
 
-    def rebuild_predicate(self):
-        try:
-            self._compiled = compiled = re.compile(self.pattern, flags_to_int(self.flags))
-        except re.error:
-            logger.exception("error building predicate for pattern '%s' and flags %i"
-                             % (self.pattern, self.flags))
-            self._predicate = False
-            self._compiled = None
-            return False, None
+                yield CorpusMessage(
+                    str(entry['s']), str(entry['c']), str(entry['a']),
+                    content=content,
+                    timestamp=datetime.strptime(entry['t'], '%Y-%m-%d %H:%M:%S'),
+                    author_name=author_name,
+                    attachments=attachments
+                )
+                continue
 
-        if self.position == POSITION.START:
-            match_func = compiled.match
-        elif self.position == POSITION.FULL:
-            match_func = compiled.fullmatch
-        elif self.position == POSITION.ANYWHERE:
-            match_func = compiled.search
-        else:
-            raise ValueError("Unknown position value: %s" % self.position)
+            timestamp = entry.get('timestamp')
 
-        self._predicate = predicate = partial(check_match, match_func)
-        return predicate, compiled
+            if isinstance(timestamp, (int, float)):
+                timestamp = datetime.utcfromtimestamp(timestamp)
+            elif timestamp:
+                timestamp = datetime.strptime(timestamp[:19], '%Y-%m-%dT%H:%M:%S')
+            else:
+                timestamp = datetime.utcnow()
 
-    @property
-    def predicate(self):
-        if not self._predicate:
-            predicate, compiled = self.rebuild_predicate()
-            return predicate
+            yield CorpusMessage(
+                str(entry.get('server', 'replay')), str(entry.get('channel', '0')), str(entry.get('author', '0')),
+                content=entry['content'],
+                timestamp=timestamp,
+                role_ids=[str(r) for r in entry.get('roles', ())],
+                attachments=entry.get('attachments', ())
+            )
 
-        return self._predicate
 
-    @property
-    def compiled(self):
-        if not self._compiled:
-            predicate, compiled = self.rebuild_predicate()
-            return compiled
+def load_corpus(path: str, limit: int = None) -> List[CorpusMessage]:
+    """
+    Loads a replay corpus from an activitylog .log or .jsonl file, a JSONL corpus, or a folder of any of
+    them (such as activitylog's data folder), sorted by timestamp. Where activitylog kept a log in both
+    formats, only the .jsonl is read. If limit is given, only the latest `limit` are kept.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError('no such file or folder: %s' % path)
+    elif os.path.isdir(path):
+        paths = sorted(os.path.join(root, name) for root, dirs, names in os.walk(path) for name in names)
+    else:
+        paths = [path]
 
-        return self._compiled
+    authors = {}
+    messages = []
 
-    def check_meta(self, message: Message, cache=None, debug=False):
-        """
-        Return True if message is eligible for regex check
-        """
-        if not self.enabled:
-            if debug:
-                return False, 'disabled'
-            return False
+    jsonl_paths = {p for p in paths if p.endswith('.jsonl')}
 
-        if cache is None:
-            cache = {}
+    for file_path in paths:
+        if file_path in jsonl_paths:
+            messages.extend(parse_corpus_jsonl(file_path))
+        elif file_path.endswith('.log') and os.path.basename(file_path)[0].isdigit() \
+                and file_path[:-len('.log')] + '.jsonl' not in jsonl_paths:  # skip server.log and duplicates
+            messages.extend(parse_activitylog(file_path, authors))
 
-        if 'mos' in cache:
-            mos = cache['mos']
-        else:
-            cache['mos'] = mos = self.parent.cog.is_mod_or_superior(message)
+    messages.sort(key=lambda m: m.timestamp)
+    return messages[-limit:] if limit else messages
 
-        if mos:
-            if self.priv_exempt:
-                if debug:
-                    return False, 'immediate priv_exempt'
-                return False
-            elif self.priv_exempt is None and self.parent.priv_exempt:
-                if debug:
-                    return False, 'parent priv_exempt'
-                return False
 
-        if self.channels_list in cache:
-            clr = cache[self.channels_list]
-        else:
-            cache[self.channels_list] = clr = self.channels_list.check(message.channel)
+class ReplayServer(discord.Server):
+    me = None  # only used for permissions, which replay channels ignore
 
-        if clr is False:
-            if debug:
-                return False, 'not in channel list'
-            return False
+    def __init__(self, server_id: str):
+        self.id = server_id
+        self.name = server_id
+        self.owner = None
+        self._members = {}
+        self._channels = {}
+        self.default_role = ReplayRole(self, server_id, '@everyone')
+        self.roles = [self.default_role]
 
-        if self.roles_list in cache:
-            rlr = cache[self.roles_list]
-        else:
-            if isinstance(message.author, discord.Member):
-                role_list = message.author.roles
-            else:  # for webhooks, act as if "user" belongs to default role only
-                role_list = [message.server.default_role]
 
-            cache[self.roles_list] = rlr = self.roles_list.check_iter(role_list)
+class ReplayRole(discord.Role):
+    def __init__(self, server: ReplayServer, role_id: str, name: str = None):
+        self.server = server
+        self.id = role_id
+        self.name = name or role_id
+        self.position = 0
 
-        if rlr is False:
-            if debug:
-                return False, 'not in role list'
-            return False
 
-        if debug:
-            return True, 'meta matched'
-        return True
+class ReplayChannel(discord.Channel):
+    def __init__(self, server: ReplayServer, channel_id: str, name: str):
+        self.server = server
+        self.id = channel_id
+        self.name = name
+        self.is_private = False
+        self.type = discord.ChannelType.text
 
-    def to_json(self):
-        data = {
-            'asciify'           : self.asciify,
-            'attachment_header' : self.attachment_header,
-            'enabled'           : self.enabled,
-            'flags'             : self.flags,
-            'mode'              : self.mode,
-            'multi_msg'         : self.multi_msg,
-            'multi_msg_join'    : self.multi_msg_join,
-            'multi_msg_group'   : self.multi_msg_group,
-            'override'          : self.override,
-            'pattern'           : self.pattern,
-            'position'          : self.position.value,
-            'priv_exempt'       : self.priv_exempt,
-            'flash_msg'         : self.flash_msg,
-            'flash_dm'          : self.flash_dm,
-            'flash_sec'         : self.flash_sec
-        }
+    def permissions_for(self, member) -> discord.Permissions:
+        return discord.Permissions.all()
 
-        for k in ['roles_list', 'channels_list']:
-            if k in self.links:
-                data[k + '_link'] = self.links[k].name
-            else:
-                data[k] = getattr(self, k).to_json()
 
-        return data
+class ReplayMember(discord.Member):
+    def __init__(self, server: ReplayServer, user_id: str, name: str, roles: Sequence[ReplayRole]):
+        self.server = server
+        self.id = user_id
+        self.name, _, self.discriminator = name.partition('#')
+        self.nick = None
+        self.bot = False
+        self.roles = [server.default_role, *roles]
 
-    def copy(self, new_name: str, link: bool = False, **kwargs):
-        new_kwargs = dict(
-            pattern=self.pattern,
-            flags=self.flags,
-            mode=self.mode,
-            enabled=False,
-            override=self.override,
-            priv_exempt=self.priv_exempt,
-            position=self.position,
-            attachment_header=self.attachment_header,
-            multi_msg=self.multi_msg,
-            multi_msg_group=self.multi_msg_group,
-            multi_msg_join=self.multi_msg_join,
-            asciify=self.asciify,
-            flash_msg=self.flash_msg,
-            flash_dm=self.flash_dm,
-            flash_sec=self.flash_sec
-        )
 
-        new_kwargs.update(kwargs)
+class ReplayMessage(discord.Message):
+    def __init__(self, message_id: str, channel: ReplayChannel, author: ReplayMember, content: str,
+                 timestamp: datetime, attachments: Sequence[str] = ()):
+        self.id = message_id
+        self.channel = channel
+        self.server = channel.server
+        self.author = author
+        self.content = content
+        self.timestamp = timestamp
+        self.edited_timestamp = None
+        self.attachments = [{'filename': a} for a in attachments]
 
-        for list_name in ['roles_list', 'channels_list']:
-            if link:
-                new_kwargs[list_name + '_link'] = self.name
-            else:
-                new_kwargs[list_name] = getattr(self, list_name)
 
-        return type(self)(self.parent, new_name, **new_kwargs)
+class ReplayBot:
+    """
+    Stands in for the bot in replay benchmarks: deletions do nothing and sent messages aren't sent anywhere
+    """
+    def __init__(self, bot):
+        self.loop = bot.loop
+        self.settings = bot.settings
+        self.logger = bot.logger
+        self.user = None
+        self.message_ids = itertools.count(10 ** 17)
 
-    @property
-    def filter_priority(self):
-        #  p e o m
-        #  3 1 1 0
-        #  2 1 1 1
-        #  1 1 0 1
-        #  0 1 0 0
-        # -1 0 x x
-        if not self.enabled:
-            return -1
-        elif self.override:
-            return 2 + int(not self.mode)
+    def next_id(self) -> str:
+        return '%020i' % next(self.message_ids)
 
-        return int(self.mode)
+    async def wait_until_ready(self):
+        pass
 
+    async def delete_message(self, message):
+        pass
 
-class ReCensor:
+    async def delete_messages(self, messages):
+        pass
+
+    async def send_message(self, destination, content=None, **kwargs):
+        return ReplayMessage(self.next_id(), destination, None, content, datetime.utcnow())
+
+
+def build_replay_messages(bot: ReplayBot, corpus: Sequence[CorpusMessage], server_ids: Sequence[str],
+                          fallback_id: str) -> List[ReplayMessage]:
     """
-    Filter messages using regular expressions
+    Turns a corpus into messages, shifting their timestamps to end now so message histories behave as they
+    would live. Messages from servers not in `server_ids` are replayed in the server `fallback_id`.
     """
+    servers, channels, members = {}, {}, {}
+    offset = (datetime.utcnow() - corpus[-1].timestamp) if corpus else timedelta()
+    messages = []
 
-    # Old data format:
-    # {
-    #  server_id (str): {
-    #   channel_id (str): {
-    #     regex (str): mode (str from MODES)
-    #     }
-    #   }
-    # }
-    #
-    # New data format:
-    # {
-    #   server_id (str): {
-    #       'filters' : {
-    #           name (str) : {
-    #               'asciify'           : tristate (default null),
-    #               'attachment_header' : bool (default false),
-    #               'enabled'           : bool (default false),
-    #               'flags'             : flags (str containing subset of AILUMSX, default DEFAULT_FLAGS),
-    #               'mode'              : bool (default false),
-    #               'multi_msg'         : bool (default false),
-    #               'multi_msg_join'    : str (default CONCAT_JOIN),
-    #               'multi_msg_group'   : int (default 0),
-    #               'override'          : bool (default false),
-    #               'pattern'           : pattern (str),
-    #               'position'          : enum[str] (default POSITION.ANYWHERE),
-    #               'channels_list'     : {
-    #                       'mode'        :   tristate,
-    #                       'items'       :   list[channel_id (str)]},
-    #                       'overlay'     :   optional bool (default true)
-    #                                   },
-    #               'roles_list'        : {
-    #                       'mode'        :   tristate,
-    #                       'items'       :   list[channel_id (str)]},
-    #                       'overlay'     :   optional bool (default true)
-    #                                   },
-    #               'priv_exempt'       : tristate
-    #           }
-    #       },
-    #       'asciify'       : bool (default false),
-    #       'priv_exempt'   : bool (default true),
-    #       'roles_list'    : {
-    #                   'mode'  :   tristate,
-    #                   'items' :   list[channel_id (str)]}
-    #       },
-    #       'channels_list' : {
-    #                   'mode'  :   tristate,
-    #                   'items' :   list[channel_id (str)]}
-    #       },
-    #   }
-    # }
+    for cm in corpus:
+        server_id = cm.server_id if cm.server_id in server_ids else fallback_id
 
-    def __init__(self, bot):
-        self.bot = bot
-        self.ready = False
+        if server_id not in servers:
+            servers[server_id] = ReplayServer(server_id)
 
-        self.executor = ExecutorClass()
-        self.settings = {}
-        self.misc_data = {}
-        self._ignore_filters = {}
-        self._message_cache = defaultdict(lambda: BoundedOrderedDict(maxlen=MSG_HISTORY_MAX_NUM))
-        self._deleted = BoundedOrderedDict(maxlen=MSG_HISTORY_MAX_NUM)
+        server = servers[server_id]
+        channel = channels.get((server_id, cm.channel_id))
 
-        data = dataIO.load_json(JSON_PATH)
-        if data.get('_schema_version', 1) < 2:
-            data = migrate_data(data)
-            dataIO.save_json(JSON_PATH, data)
+        if channel is None:
+            channel = channels[server_id, cm.channel_id] = ReplayChannel(server, cm.channel_id, cm.channel_name)
+            server._channels[channel.id] = channel
 
-        for k, v in data.items():
-            if k.startswith('_') or type(v) is not dict or not k.isnumeric():
-                self.misc_data[k] = v
-            else:
-                self.settings[k] = ServerConfig(self, **v)
+        member = members.get((server_id, cm.author_id, cm.role_ids))
 
-        try:
-            # noinspection PyUnresolvedReferences
-            self.analytics = CogAnalytics(self)
-        except Exception as e:
-            self.bot.logger.exception(e)
-            self.analytics = None
+        if member is None:
+            roles = [ReplayRole(server, role_id) for role_id in cm.role_ids]
+            member = members[server_id, cm.author_id, cm.role_ids] = ReplayMember(server, cm.author_id,
+                                                                                   cm.author_name, roles)
+            server._members[member.id] = member
 
-        self._list_functions = OrderedDict([
-            ('help'       , self._list_command_help),
-            ('enabled'    , self._list_command_enabled),
-            ('mode'       , self._list_command_mode),
-            ('overlay'    , self._list_command_overlay),
-            ('add'        , self._list_command_add),
-            ('remove'     , self._list_command_remove),
-            ('clear'      , self._list_command_clear),
-            ('cleanup'    , self._list_command_cleanup),
-            ('invert'     , self._list_command_invert),
-            ('link'       , self._list_command_link),
-            ('unlink'     , self._list_command_unlink),
-            ('replace'    , self._list_command_replace),
-            ('union'      , self._list_command_union),
-            ('difference' , self._list_command_difference),
-            ('intersect'  , self._list_command_intersect),
-            ('symdiff'    , self._list_command_symdiff)
-        ])
+        messages.append(ReplayMessage(bot.next_id(), channel, member, cm.content, cm.timestamp + offset,
+                                      cm.attachments))
 
-        self.ready = True
+    return messages
 
-    def __unload(self):
-        self.ready = False
-        self.executor.shutdown(wait=True)
-        self.save()
 
-    def save(self):
-        data = {'_schema_version': 2}
-        data.update(self.misc_data)
-        data.update({k: v.to_json() for k, v in self.settings.items()})
-        dataIO.save_json(JSON_PATH, data)
+def replay_config(data: dict, fraction: float) -> dict:
+    """
+    Returns a copy of saved ReCensor data keeping the first `fraction` of each server's filters. Links to
+    filters that were left out are dropped, so those lists fall back to their own settings.
+    """
+    data = dict(data)
 
-    @commands.group(name='recensor', pass_context=True, invoke_without_command=True, no_pm=True, rest_is_raw=True)
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor(self, ctx, filter_name: str, setting_name: str = None, *, options):
-        """
-        Configure regular expression censorship
+    for server_id, server_data in data.items():
+        if server_id.startswith('_') or type(server_data) is not dict:
+            continue
 
-        If a filter name is provided instead of a subcommand:
-        - If no command is provided, invoke [p]recensor show filter_name
-        - Otherwise, invoke [p]recensor set setting_name filter_name options...
-        """
-        if ctx.invoked_subcommand is not None:
-            return
-        elif setting_name:
-            new_view = '%s "%s"' % (setting_name, filter_name)
+        filters = list(server_data.get('filters', {}).items())
+        kept = OrderedDict(filters[:max(1, math.ceil(len(filters) * fraction))] if filters else ())
 
-            if options:
-                new_view += ' ' + options
+        for name, filter_data in kept.items():
+            for key in ('roles_list_link', 'channels_list_link'):
+                if filter_data.get(key) not in (None, 'SERVER') and filter_data[key] not in kept:
+                    kept[name] = filter_data = dict(filter_data)
+                    del filter_data[key]
 
-            ctx.view = StringView(new_view)
-            await self.recensor_set.invoke(ctx)
-        elif filter_name in self.recensor_set.commands:
-            new_view = filter_name
+        data[server_id] = dict(server_data, filters=kept)
 
-            if setting_name:
-                new_view += ' ' + setting_name
+    return data
 
-            if options:
-                new_view += ' ' + options
 
-            ctx.view = StringView(new_view)
-            await self.recensor_set.invoke(ctx)
-        else:
-            settings = self.settings.get(ctx.message.server.id)
-            name = filter_name and filter_name.lower()
+def pool_busy_time(cog: 'ReCensor') -> float:
+    """
+    Returns the time workers have spent running checks for all of a cog's filters
+    """
+    return sum(f.telemetry.total_time - f.telemetry.inline_time
+               for settings in cog.settings.values() for f in settings.filters.values())
 
-            if not (settings and settings.get_filter(name)):
-                await self.bot.say(warning('There is no command or filter in this server named "%s".' % name))
-                return
 
-            ctx.command = self.recensor_list
-            await ctx.invoke(self.recensor_list, filter_name)
+async def replay_stage(cog: 'ReCensor', stage: str, messages: Sequence[ReplayMessage], concurrency: int
+                       ) -> Tuple[float, List[float], float]:
+    """
+    Replays messages through one stage of a cog, with up to `concurrency` in flight at once:
+    - check_message: single-message filters only
+    - check_sequence: multi-message filters, over per-channel, per-author histories (one message at a time)
+    - on_message: everything, as the bot would see it
 
-    @recensor.command(pass_context=True, name='help')
-    async def recensor_help(self, ctx):
-        """
-        Posts links to online reference material
-        """
-        await self.bot.say(
-            "ReCensor manual: <https://github.com/calebj/calebj-cogs/#recensor>\n"
-            "A how-to for Python's regex: <https://docs.python.org/3/howto/regex.html>\n"
-            "Full docs on regex syntax: <https://docs.python.org/3/library/re.html#regular-expression-syntax>"
-        )
+    Returns the elapsed seconds, each message's latency, and worker busy time.
+    """
+    loop = cog.bot.loop
+    histories = defaultdict(MessageHistory)
+    semaphore = asyncio.Semaphore(concurrency if stage != 'check_sequence' else 1)
+    latencies = []
+    tasks = []
+
+    async def handle(message):
+        settings = cog.settings[message.server.id]
+
+        if stage == 'check_message':
+            await settings.check_message(message)
+        elif stage == 'check_sequence':
+            history = histories[message.channel.id, message.author.id]
+            history[message.id] = MessageRecord(message)
+            cog.cleanup_deque(history)
+            await cog.sequence_hits(settings, history)
+        else:
+            await cog.on_message(message)
 
-    @recensor.command(pass_context=True, name='list', aliases=['show'])
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_list(self, ctx, filter_name: str = None):
-        """
-        Displays all or one filter(s)
+    async def run_one(message):
+        t0 = time.perf_counter()
 
-        If no filter_name is specified, show all filters + server info.
-        If filter_name is 'server', only show server info.
-        """
-        server = ctx.message.server
-        settings = self.settings.get(server.id)
-        filter_name = filter_name and filter_name.lower()
+        try:
+            await handle(message)
+            latencies.append(time.perf_counter() - t0)
+        finally:
+            semaphore.release()
 
-        if not (settings and settings.filters):
-            await self.bot.say(info('There are no filters in this server to show.'))
-            return
-        elif filter_name and filter_name != 'server' and not settings.get_filter(filter_name):
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % filter_name))
-            return
+    busy = pool_busy_time(cog)
+    start = time.perf_counter()
 
-        def format_list(_filter: FilterBase, name: str, elaborate_link: bool = False):
-            _list = getattr(_filter, name)
-            lines = []
-            linked = (_list.parent is not _filter)
+    for message in messages:
+        await semaphore.acquire()
+        tasks.append(loop.create_task(run_one(message)))
 
-            if isinstance(_filter, Filter) and linked:  # note: server lists won't ever be linked
-                ult_parent = _list.parent
-                parent = _filter.links[name]
-                lines.append('Linked to: ' + parent.name)
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start, latencies, pool_busy_time(cog) - busy
 
-                if ult_parent != parent:
-                    lines.append('Link dest: ' + ult_parent.name)
 
-            if not linked or elaborate_link:
-                # lines.append('enabled: ' + ('yes' if _list.enabled else 'no'))
-                lines.append('Mode: ' + ('whitelist' if _list.mode else 'blacklist'))
+async def benchmark_replay(bot, corpus: Sequence[CorpusMessage], data: dict,
+                           pool_sizes: Sequence[int] = REPLAY_POOL_SIZES,
+                           fractions: Sequence[float] = REPLAY_FILTER_FRACTIONS,
+                           stages: Sequence[str] = REPLAY_STAGES, concurrency: int = REPLAY_CONCURRENCY
+                           ) -> List[Tuple[str, int, int, float, float, float, float, float]]:
+    """
+    Replays a corpus against saved ReCensor data (as in regexen.json), end to end, for each worker pool size
+    and fraction of each server's filters. Each run gets its own cog, so caches start cold.
 
-                if _list.overlay is not None:
-                    lines.append('Overlay: ' + ('yes' if _list.overlay else 'no'))
+    Returns a list of (stage, pool size, filter count, messages/sec, p50, p95 and p99 latency, pool utilization).
+    Utilization is worker time spent matching over the pool's capacity; the rest is overhead or idle.
+    """
+    if data.get('_schema_version', 1) < 2:
+        data = migrate_data(data)
 
-                item_fmt = MENTIONS_BY_DATACLASS.get(_list.item_type, '#%s')
+    server_ids = [k for k, v in data.items() if type(v) is dict and k.isnumeric()]
 
-                if _list.items:
-                    lines.append('Items (%i):' % len(_list.items))
-                    items = [(item_fmt % i) for i in _list.items]
-                    items.sort()
-                    lines.extend(items)
-                else:
-                    lines.append('Items: (none)')
+    if not server_ids:
+        raise ValueError('there are no servers in the config')
 
-            return '\n'.join(lines)
+    busiest = max(server_ids, key=lambda k: len(data[k].get('filters', ())))
+    results = []
 
-        def format_params(obj):
-            order = ['Mode', 'ASCIIfy', 'Privilege exempt', 'Override', 'Position',
-                     'Attachment Header', 'Multi-message', 'Multi-message join']
+    for workers in pool_sizes:
+        for fraction in fractions:
+            config = replay_config(data, fraction)
+            filter_count = sum(len(config[k].get('filters', ())) for k in server_ids)
 
-            params = {
-                'Privilege exempt' : ('yes' if obj.priv_exempt else 'no'),
-                'ASCIIfy'          : ('yes' if obj.asciify else 'no'),
-            }
+            for stage in stages:
+                replay_bot = ReplayBot(bot)
+                messages = build_replay_messages(replay_bot, corpus, server_ids, busiest)
+                cog = ReCensor(replay_bot, data=config, workers=workers)
 
-            if type(obj) is Filter:
-                params.update({
-                    'Enabled'           : ('yes' if obj.enabled else 'no'),
-                    'Mode'              : ('white' if obj.mode else 'black'),
-                    'Override'          : ('yes' if obj.override else 'no'),
-                    'Multi-message'     : ('yes' if obj.multi_msg else 'no'),
-                    'Flags'             : obj.flags or '(none)',
-                    'Position'          : obj.position.value,
-                    'Attachment Header' : ('yes' if obj.attachment_header else 'no')
-                })
+                try:
+                    await cog.load_patterns()
+                    elapsed, latencies, busy = await replay_stage(cog, stage, messages, concurrency)
+
+                    # Shadow filters run after each message is done with, so they aren't timed
+                    await asyncio.gather(*cog._shadow_tasks)
+                finally:
+                    cog.ready = False
+                    cog._pattern_loader.cancel()
+                    cog.deleter.cancel()
+                    cog.batcher.cancel()
+                    cog.executor.shutdown(wait=False)
+                    cog.diagnostic_executor.shutdown(wait=False)
+                    cog.shadow_executor.shutdown(wait=False)
+
+                    for settings in cog.settings.values():
+                        for _filter in settings.filters.values():
+                            _filter.release_pattern()
+
+                p50, p95, p99 = FilterTelemetry.percentiles(latencies)
+                results.append((stage, workers, filter_count, len(messages) / elapsed if elapsed else 0,
+                                p50, p95, p99, busy / (elapsed * workers) if elapsed else 0))
+
+    return results
+
+
+def concat_with_keys(strings: Sequence[str], join: str = CONCAT_JOIN) -> Tuple[str, List[int]]:
+    """
+    Returns the concatenated string (joined on `join`) and a list of the end position of each string in the output
+    """
+    indices = []
+    i = 0
+    join_len = len(join)
+
+    if not isinstance(strings, Sequence):
+        strings = tuple(strings)
+
+    for string in strings:
+        i += len(string) + join_len
+        indices.append(i)
+
+    indices[-1] -= join_len
+
+    return join.join(strings), indices
+
+
+def sequence_from_indices(sequence: Sequence[T], indices: Sequence[int], keys: Tuple[int, int],
+                          inner_only: bool = False) -> List[T]:
+    """
+    Returns a list of the objects that the match denoted by `keys` overlapped, based on `indices`.
+    If `inner_only` is True, only return the items covered completely by the span.
+    """
+    ret = []
+    start, end = keys
+    last_index = 0
+
+    for obj, index in zip(sequence, indices):
+        if index <= start or (inner_only and last_index < start):
+            pass
+        elif index >= end:
+            if index == end or not inner_only:
+                ret.append(obj)
+            break
+        else:
+            ret.append(obj)
+
+        last_index = index
+
+    return ret
+
+
+class BadTimeExpr(Exception):
+    pass
+
+
+def _find_unit(unit):
+    for names, length in UNIT_TABLE:
+        if any(n.startswith(unit) for n in names):
+            return names, length
+    raise BadTimeExpr("Invalid unit: %s" % unit)
+
+
+def _parse_time(time):
+    time = time.lower()
+    if not time.isdigit():
+        time = re.split(r'\s*([\d.]+\s*[^\d\s,;]*)(?:[,;\s]|and)*', time)
+        time = sum(map(_timespec_sec, filter(None, time)))
+    return int(time)
+
+
+def _timespec_sec(expr):
+    atoms = re.split(r'([\d.]+)\s*([^\d\s]*)', expr)
+    atoms = list(filter(None, atoms))
+
+    if len(atoms) > 2:  # This shouldn't ever happen
+        raise BadTimeExpr("invalid expression: '%s'" % expr)
+    elif len(atoms) == 2:
+        names, length = _find_unit(atoms[1])
+        if atoms[0].count('.') > 1 or \
+                not atoms[0].replace('.', '').isdigit():
+            raise BadTimeExpr("Not a number: '%s'" % atoms[0])
+    else:
+        names, length = _find_unit('seconds')
+
+    try:
+        return float(atoms[0]) * length
+    except ValueError:
+        raise BadTimeExpr("invalid value: '%s'" % atoms[0])
+
+
+def format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '-'
+    elif seconds < 1e-3:
+        return '%ius' % (seconds * 1e6)
+    elif seconds < 1:
+        return '%.1fms' % (seconds * 1e3)
+
+    return '%.2fs' % seconds
+
+
+def ellipsize(string: str, to_length: int = None, by: int = None) -> str:
+    if to_length is not None and by is not None:
+        raise ValueError("conflicting length arguments")
+    elif to_length is None and by is None:
+        raise ValueError("missing length argument")
+
+    strlen = len(string)
+
+    if by is not None:
+        to_length = strlen - by
+    else:
+        by = strlen - to_length
+
+    if strlen <= to_length:
+        return string
+
+    pos1 = (strlen // 2) - 1
+    pos2 = pos1 + 3
+
+    return string[:pos1] + "..." + string[pos2:]
+
+
+class AsciifyTable(dict):
+    """
+    str.translate table that strips marks/combining characters and substitutes EMOJI_LETTERS.
+
+    Characters are classified the first time they're seen, so the table only holds what's in use.
+    """
+    __slots__ = []
+
+    def __missing__(self, codepoint: int) -> Optional[str]:
+        char = chr(codepoint)
+        value = None if unicodedata.category(char).startswith('M') else char
+
+        if len(self) < ASCIIFY_TABLE_MAX:
+            self[codepoint] = value
+
+        return value
+
+
+ASCIIFY_TABLE = AsciifyTable((ord(k), v) for k, v in EMOJI_LETTERS.items())
+
+
+def asciify_string(string: str) -> str:
+    # Nothing to strip, substitute or transliterate
+    if not NON_ASCII_RE.search(string):
+        return string
+
+    # Strip marks/combining characters and run through substitution table
+    string = string.translate(ASCIIFY_TABLE)
+
+    # Run through unidecode, if available
+    if unidecode:
+        return unidecode(string)
+
+    return string
+
+
+def preprocess_msg(_filter, message):
+    if _filter.attachment_header and message.attachments:
+        return '{attachment:%s}%s' % (message.attachments[0]['filename'], message.content)
+    elif message.content.startswith('{attachment:'):
+        return '{' + message.content
+    else:
+        return message.content
+
+
+# https://stackoverflow.com/a/11564323
+def topological_sort(source: Iterable[Tuple[HT, Sequence[HT]]]) -> Iterator[HT]:
+    """
+    Perform topo sort on elements.
+
+    :arg source: list of ``(name, [list of dependencies])`` pairs
+    :returns: list of names, with dependencies listed first
+    """
+    # copy dependencies so we can modify set in-place
+    pending = [(name, set(deps)) for name, deps in source]
+    emitted = []
+
+    while pending:
+        next_pending = []
+        next_emitted = []
+
+        for entry in pending:
+            name, deps = entry
+            deps.difference_update(emitted)  # remove deps we emitted last pass
+
+            if deps:  # still has deps? recheck during next pass
+                next_pending.append(entry)
+            else:  # no more deps? time to emit
+                yield name
+                emitted.append(name)  # <-- not required, but helps preserve original ordering
+                next_emitted.append(name)  # remember what we emitted for difference_update() in next pass
+
+        if not next_emitted:  # all entries have unmet dependencies, one of two things is wrong...
+            raise ValueError("cyclic or missing dependency detected: %r" % (next_pending,))
+
+        pending = next_pending
+        emitted = next_emitted
+
+
+class POSITION(Enum):
+    START = 'start'
+    FULL = 'full'
+    ANYWHERE = 'anywhere'
+
+
+#  -> Optional[Type[DiscordUniObj]], but it breaks 3.5
+def type_from_name(list_name: str):
+    for k in DATACLASSES_BY_NAME:
+        k = k.lower()
+        if list_name.startswith(k):
+            return DATACLASSES_BY_NAME[k]
+
+    return None
+
+
+def flags_to_int(flag_chars):
+    flags = 0
+
+    for c in flag_chars:
+        flags |= getattr(re, c.upper(), 0)
+
+    return flags
+
+
+class BoundedOrderedDict(OrderedDict):
+    __slots__ = ['_maxlen']
+
+    def __init__(self, iterable: Sequence = (), maxlen=None):
+        self._maxlen = maxlen
+        super().__init__(iterable)
+
+    @property
+    def maxlen(self):
+        return self._maxlen
+
+    def __setitem__(self, key, value):
+        if not self.__contains__(key) and len(self) == self._maxlen:
+            self.popitem(last=False)
+
+        super().__setitem__(key, value)
+
+
+class MessageRecord:
+    """
+    The parts of a message that sequence checks, deletion and trigger messages use, so that histories
+    don't keep whole Message objects alive. Quacks enough like a Message for preprocess_msg, check_meta,
+    delete_message(s) and post_flash.
+    """
+    __slots__ = ['id', 'timestamp', 'content', 'attachment', 'channel', 'author']
+
+    def __init__(self, message: Message):
+        self.id = message.id
+        self.timestamp = message.timestamp
+        self.content = message.content
+        self.attachment = message.attachments[0]['filename'] if message.attachments else None
+        self.channel = message.channel
+        self.author = message.author
+
+    @property
+    def server(self) -> discord.Server:
+        return self.channel.server
+
+    @property
+    def attachments(self) -> List[dict]:
+        return [{'filename': self.attachment}] if self.attachment is not None else []
+
+    @property
+    def nbytes(self) -> int:
+        size = MESSAGE_RECORD_OVERHEAD + sys.getsizeof(self.content)
+
+        if self.attachment is not None:
+            size += sys.getsizeof(self.attachment)
+
+        return size
+
+
+def pairs_nbytes(pairs: Tuple[Tuple[str, str], ...]) -> int:
+    """
+    Approximate size of a sequence of (message ID, text) pairs, not counting the strings, which are
+    shared with the records and MessageHistory.texts
+    """
+    return sys.getsizeof(pairs) + len(pairs) * PAIR_OVERHEAD
+
+
+class MessageHistory(BoundedOrderedDict):
+    """
+    A (channel, author) message sequence, plus what check_sequence needs to avoid redoing work:
+    each message's preprocessed text, the last joined content per join key, and the sequence
+    each blacklist filter last came up clean on.
+    """
+    __slots__ = ['texts', 'joined', 'cleared']
+
+    def __init__(self, iterable: Sequence = (), maxlen=MSG_HISTORY_MAX_NUM):
+        self.texts = {}    # {message ID: {(asciify, attachment_header): str}}
+        self.joined = {}   # {join key: (((message ID, str), ...), content, indices)}
+        self.cleared = {}  # {(filter name, join key): (version, ((message ID, str), ...))}
+        super().__init__(iterable, maxlen=maxlen)
+
+    def __setitem__(self, key, value):
+        # An edit replaces the message, so its text has to be redone
+        self.texts.pop(key, None)
+        super().__setitem__(key, value)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate size of the records plus the preprocessed texts, joined content and cleared
+        sequences cached alongside them
+        """
+        size = sum(r.nbytes for r in self.values())
+
+        for texts in self.texts.values():
+            size += sys.getsizeof(texts) + sum(sys.getsizeof(t) for t in texts.values())
+
+        for pairs, content, indices in self.joined.values():
+            size += pairs_nbytes(pairs) + sys.getsizeof(content) + sys.getsizeof(indices)
+
+        for version, pairs in self.cleared.values():
+            size += pairs_nbytes(pairs)
+
+        return size
+
+    def prune(self):
+        """
+        Drops cached text for messages that are no longer in the sequence
+        """
+        for message_id in [k for k in self.texts if k not in self]:
+            del self.texts[message_id]
+
+    def join(self, key: Hashable, pairs: Tuple[Tuple[str, str], ...], join: str) -> Tuple[str, List[int]]:
+        """
+        Returns the content and indices (see concat_with_keys) of the joined (message ID, text) pairs.
+
+        The last content built for `key` is reused if the sequence has only gained messages at the end
+        or lost them at the start since then.
+        """
+        cached = self.joined.get(key)
+        kept = 0
+
+        if cached is not None:
+            old_pairs, content, indices = cached
+
+            if old_pairs == pairs:
+                return content, indices
+
+            drop = next((i for i, pair in enumerate(old_pairs) if pair[0] == pairs[0][0]), None)
+
+            if drop is not None and old_pairs[drop:] == pairs[:len(old_pairs) - drop]:
+                kept = len(old_pairs) - drop
+                offset = indices[drop - 1] if drop else 0
+                content = content[offset:]
+                indices = [i - offset for i in indices[drop:]]
+
+        if kept:
+            if kept < len(pairs):
+                tail, tail_indices = concat_with_keys([text for message_id, text in pairs[kept:]], join)
+                base = len(content) + len(join)
+                content = content + join + tail
+                indices[-1] = base
+                indices.extend(i + base for i in tail_indices)
+        else:
+            content, indices = concat_with_keys([text for message_id, text in pairs], join)
+
+        self.joined[key] = (pairs, content, indices)
+        return content, indices
+
+
+class MessageHistoryStore:
+    """
+    Live MessageHistory objects keyed by (channel ID, author ID), bounded by the total number of records
+    and their approximate size, including the text each history caches for check_sequence, across every key.
+
+    Keys are ordered by when their author last posted in the channel, so idle keys are the first to be
+    evicted, whether for going MSG_HISTORY_MAX_TIME without a message or to get back under the caps.
+    """
+    __slots__ = ['histories', 'sizes', 'entries', 'nbytes', 'max_entries', 'max_bytes', 'expired', 'evicted']
+
+    def __init__(self, max_entries: int = MSG_HISTORY_MAX_ENTRIES, max_bytes: int = MSG_HISTORY_MAX_BYTES):
+        self.histories = OrderedDict()
+        self.sizes = {}  # {key: (records, bytes)} as of the last update
+        self.entries = 0
+        self.nbytes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.expired = 0
+        self.evicted = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.histories
+
+    def __len__(self) -> int:
+        return len(self.histories)
+
+    def get(self, key: Hashable, create: bool = False) -> Optional[MessageHistory]:
+        """
+        Returns the history for `key`. With `create`, it's made if missing and marked as most recently active.
+        """
+        history = self.histories.get(key)
+
+        if create:
+            if history is None:
+                history = self.histories[key] = MessageHistory()
+            else:
+                self.histories.move_to_end(key)
+
+        return history
+
+    def update(self, key: Hashable, now: datetime = None):
+        """
+        Re-measures a key's history after changing it, then evicts idle keys and enforces the caps
+        """
+        history = self.histories.get(key)
+        old_entries, old_bytes = self.sizes.pop(key, (0, 0))
+        self.entries -= old_entries
+        self.nbytes -= old_bytes
+
+        if history:
+            entries, nbytes = self.sizes[key] = (len(history), history.nbytes)
+            self.entries += entries
+            self.nbytes += nbytes
+        elif history is not None:
+            del self.histories[key]
+
+        self.expire(now)
+
+    def expire(self, now: datetime = None):
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=MSG_HISTORY_MAX_TIME)
+
+        while self.histories:
+            key, history = next(iter(self.histories.items()))
+
+            if self.entries > self.max_entries or self.nbytes > self.max_bytes:
+                self.evicted += 1
+            elif not history or next(reversed(history.values())).timestamp <= cutoff:
+                self.expired += 1
+            else:
+                break
+
+            self.discard(key)
+
+    def discard(self, key: Hashable):
+        self.histories.pop(key, None)
+        entries, nbytes = self.sizes.pop(key, (0, 0))
+        self.entries -= entries
+        self.nbytes -= nbytes
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used mapping with hit/miss counters. get() returns None on a miss.
+    """
+    __slots__ = ['entries', 'hits', 'misses']
+
+    def __init__(self, maxlen: int):
+        self.entries = BoundedOrderedDict(maxlen=maxlen)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value):
+        self.entries[key] = value
+
+    def clear(self):
+        self.entries.clear()
+
+
+class VerdictCache(LRUCache):
+    """
+    LRU cache of check_message verdicts
+    """
+    __slots__ = []
+
+    def __init__(self, maxlen: int = VERDICT_CACHE_SIZE):
+        super().__init__(maxlen=maxlen)
+
+
+class AsciifyMemo(LRUCache):
+    """
+    LRU memo of asciify_string outputs for recent non-ASCII content
+    """
+    __slots__ = []
+
+    def __init__(self, maxlen: int = ASCIIFY_MEMO_SIZE):
+        super().__init__(maxlen=maxlen)
+
+    def __call__(self, string: str) -> str:
+        if not NON_ASCII_RE.search(string):
+            return string
+
+        ret = self.get(string)
+
+        if ret is None:
+            ret = asciify_string(string)
+            self.put(string, ret)
+
+        return ret
+
+
+class ModStatusCache(LRUCache):
+    """
+    Remembers whether members are mods or superior, by server, member and role set, so a member whose roles
+    change just misses. Each server's admin and mod role settings are looked up once and kept until
+    invalidate() is called after a settings command; the cog drops a server's entries when its roles change.
+    """
+    __slots__ = ['revisions']
+
+    def __init__(self, maxlen: int = MOD_STATUS_CACHE_SIZE):
+        super().__init__(maxlen=maxlen)
+        self.revisions = {}  # {server ID: (admin role, mod role, owner, co-owners)}
+
+    def resolve(self, bot, server: discord.Server, user: discord.User) -> bool:
+        roles = getattr(user, 'roles', ())
+        key = (server.id, user.id, frozenset(r.id for r in roles))
+        status = self.get(key)
+
+        if status is None:
+            revision = self.revisions.get(server.id)
+
+            if revision is None:
+                settings = bot.settings
+                revision = self.revisions[server.id] = (settings.get_server_admin(server),
+                                                        settings.get_server_mod(server),
+                                                        settings.owner, frozenset(settings.co_owners))
+
+            admin_role, mod_role, owner, co_owners = revision
+            status = user.id == owner or user.id in co_owners or any(r.name in (admin_role, mod_role) for r in roles)
+            self.put(key, status)
+
+        return status
+
+    def discard(self, server: discord.Server):
+        """
+        Forgets everyone's status in the server
+        """
+        self.revisions.pop(server.id, None)
+
+        for key in [k for k in self.entries if k[0] == server.id]:
+            del self.entries[key]
+
+    def invalidate(self):
+        """
+        Forgets every server's settings and everyone's status, after the bot's settings may have changed
+        """
+        self.revisions.clear()
+        self.clear()
+
+
+class CostProfile:
+    """
+    Rolling estimate of a filter's cost from its check_match timings, used to decide whether
+    it's cheap enough to run on the event loop instead of taking a round trip to the executor.
+
+    Only content up to INLINE_MAX_LENGTH is profiled or run inline, and the estimate is the peak
+    time seen for content at least as long, never an extrapolation to longer content.
+    """
+    __slots__ = ['safe', 'samples', 'peak', 'max_length']
+
+    def __init__(self, safe: bool = False):
+        self.safe = safe
+        self.samples = 0
+        self.peak = 0.0  # decaying peak of seconds per check
+        self.max_length = 0
+
+    def record(self, elapsed: float, length: int):
+        if length > INLINE_MAX_LENGTH:
+            return
+
+        self.samples += 1
+        self.peak = max(elapsed, self.peak * COST_PROFILE_DECAY)
+        self.max_length = max(self.max_length, length)
+
+    def estimate(self, length: int) -> Tuple[Optional[float], str]:
+        """
+        Returns the predicted time to check content of `length` (None if it should go to the executor)
+        and the reason for the decision
+        """
+        if not self.safe:
+            return None, 'backtracking risk'
+        elif length > INLINE_MAX_LENGTH:
+            return None, 'longer than %i chars' % INLINE_MAX_LENGTH
+        elif self.samples < COST_PROFILE_MIN_SAMPLES:
+            return None, 'profiling, %i/%i samples' % (self.samples, COST_PROFILE_MIN_SAMPLES)
+        elif length > self.max_length:
+            return None, 'longer than profiled (%i chars)' % self.max_length
+
+        cost = self.peak
+
+        if cost > INLINE_FILTER_COST:
+            return None, '~%ius' % (cost * 1e6)
+
+        return cost, '~%ius' % (cost * 1e6)
+
+
+class FilterTelemetry:
+    """
+    Running counters and recent timings for one filter, for finding the ones that burn CPU
+    """
+    __slots__ = ['evaluations', 'hits', 'inline', 'skipped', 'rescans', 'rescan_chars', 'total_time',
+                 'inline_time', 'times', 'waits']
+
+    def __init__(self):
+        self.evaluations = 0   # checks actually run, inline or in the pool
+        self.hits = 0
+        self.inline = 0
+        self.skipped = 0       # ruled out without running: prefilter, fused group or already cleared
+        self.rescans = 0       # multi-message checks run again after a cascade deletion
+        self.rescan_chars = 0
+        self.total_time = 0.0
+        self.inline_time = 0.0
+        self.times = deque(maxlen=TELEMETRY_WINDOW)
+        self.waits = deque(maxlen=TELEMETRY_WINDOW)  # executor round trip beyond the checks themselves
+
+    def record(self, elapsed: float, hit: bool, wait: Optional[float] = None):
+        self.evaluations += 1
+        self.hits += hit
+        self.total_time += elapsed
+        self.times.append(elapsed)
+
+        if wait is None:
+            self.inline += 1
+            self.inline_time += elapsed
+        else:
+            self.waits.append(wait)
+
+    @staticmethod
+    def percentiles(samples: Iterable[float], points: Sequence[int] = (50, 95, 99)) -> List[Optional[float]]:
+        samples = sorted(samples)
+
+        if not samples:
+            return [None] * len(points)
+
+        return [samples[min(len(samples) - 1, len(samples) * p // 100)] for p in points]
+
+    def to_json(self) -> dict:
+        p50, p95, p99 = self.percentiles(self.times)
+        w50, w95, w99 = self.percentiles(self.waits)
+
+        return {
+            'evaluations'  : self.evaluations,
+            'hits'         : self.hits,
+            'hit_rate'     : (self.hits / self.evaluations) if self.evaluations else None,
+            'inline'       : self.inline,
+            'skipped'      : self.skipped,
+            'rescans'      : self.rescans,
+            'rescan_chars' : self.rescan_chars,
+            'total_time'   : self.total_time,
+            'inline_time'  : self.inline_time,
+            'time_p50'     : p50,
+            'time_p95'     : p95,
+            'time_p99'     : p99,
+            'wait_p50'     : w50,
+            'wait_p95'     : w95,
+            'wait_p99'     : w99
+        }
+
+
+class ScanJob:
+    """
+    Progress of a [p]recensor scan run
+    """
+    __slots__ = ['ctx', 'channels', 'since', 'dry_run', 'start', 'status_msg', 'last_edit', 'task', 'channel',
+                 'scanned', 'matched', 'deleted', 'failed', 'filter_hits']
+
+    def __init__(self, ctx, channels: List[discord.Channel], since: datetime, dry_run: bool):
+        self.ctx = ctx
+        self.channels = channels
+        self.since = since
+        self.dry_run = dry_run
+        self.start = datetime.utcnow()
+        self.status_msg = None
+        self.last_edit = None
+        self.task = None
+        self.channel = None
+        self.scanned = 0
+        self.matched = 0
+        self.deleted = 0
+        self.failed = 0
+        self.filter_hits = defaultdict(int)
+
+    def format_status(self, status: Optional[str] = None) -> str:
+        if status is None:
+            position = self.channels.index(self.channel) + 1 if self.channel in self.channels else 0
+            status = 'Scanning #%s (%i/%i)...' % (self.channel and self.channel.name, position, len(self.channels))
+
+        if self.dry_run:
+            status = '[Dry run] ' + status
+
+        lines = [status, '%i messages scanned, %i matched' % (self.scanned, self.matched)]
+
+        if not self.dry_run:
+            lines[-1] += ', %i deleted' % self.deleted
+
+            if self.failed:
+                lines[-1] += ', %i could not be deleted' % self.failed
+
+        lines[-1] += '.'
+
+        if self.filter_hits:
+            hits = sorted(self.filter_hits.items(), key=lambda x: x[1], reverse=True)
+            lines.append('Matches by filter: ' + ', '.join('%s (%i)' % hit for hit in hits))
+
+        return '\n'.join(lines)
+
+
+class DeletionQueue:
+    """
+    Messages waiting to be deleted from one channel, and the task sending them
+    """
+    __slots__ = ['channel', 'pending', 'task']
+
+    def __init__(self, channel: discord.Channel):
+        self.channel = channel
+        self.pending = OrderedDict()  # {message ID: (message, time queued)}
+        self.task = None
+
+
+class DeletionPipeline:
+    """
+    Per-channel deletion queues. Deletions that arrive within DELETE_COALESCE_WINDOW of a channel's first are
+    sent as bulk deletes of up to BULK_DELETE_MAX messages, one request at a time per channel, and messages
+    that are already queued or were recently deleted are dropped.
+    """
+    __slots__ = ['bot', 'queues', 'timers', 'recent', 'depth', 'max_depth', 'queued', 'deduped', 'deleted',
+                 'failed', 'bulk_calls', 'single_calls', 'latencies']
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.queues = {}
+        self.timers = set()
+        self.recent = BoundedOrderedDict(maxlen=DELETE_DEDUPE_SIZE)
+        self.depth = 0
+        self.max_depth = 0
+        self.queued = 0
+        self.deduped = 0
+        self.deleted = 0
+        self.failed = 0
+        self.bulk_calls = 0
+        self.single_calls = 0
+        self.latencies = deque(maxlen=TELEMETRY_WINDOW)
+
+    def queue(self, message: Union[Message, "MessageRecord"], delay: float = None):
+        """
+        Queues a message for deletion, optionally after `delay` seconds
+        """
+        if delay:
+            def fire():
+                self.timers.discard(handle)
+                self.queue(message)
+
+            handle = self.bot.loop.call_later(delay, fire)
+            self.timers.add(handle)
+            return
+
+        queue = self.queues.get(message.channel.id)
+
+        if message.id in self.recent or (queue and message.id in queue.pending):
+            self.deduped += 1
+            return
+        elif queue is None:
+            queue = self.queues[message.channel.id] = DeletionQueue(message.channel)
+
+        queue.pending[message.id] = (message, time.perf_counter())
+        self.queued += 1
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+        if queue.task is None:
+            queue.task = self.bot.loop.create_task(self.drain(queue))
+
+    async def drain(self, queue: DeletionQueue):
+        try:
+            await asyncio.sleep(DELETE_COALESCE_WINDOW)
+
+            while queue.pending:
+                batch = []
+
+                while queue.pending and len(batch) < BULK_DELETE_MAX:
+                    batch.append(queue.pending.popitem(last=False)[1])
+
+                self.depth -= len(batch)
+                await self.delete_batch(batch)
+        finally:
+            queue.task = None
+
+            if not queue.pending:
+                self.queues.pop(queue.channel.id, None)
+
+    async def delete_batch(self, batch: List[tuple]):
+        cutoff = datetime.utcnow() - BULK_DELETE_MAX_AGE
+        queued = {m.id: t for m, t in batch}
+        bulk = [m for m, t in batch if m.timestamp > cutoff]
+        single = [m for m, t in batch if m.timestamp <= cutoff]
+
+        def done(messages):
+            now = time.perf_counter()
+
+            for m in messages:
+                self.recent[m.id] = True
+                self.latencies.append(now - queued[m.id])
+
+        if len(bulk) == 1:
+            single.extend(bulk)
+        elif bulk:
+            try:
+                await self.bot.delete_messages(bulk)
+                self.bulk_calls += 1
+                self.deleted += len(bulk)
+                done(bulk)
+            except discord.HTTPException:
+                logger.exception('error bulk deleting messages in channel %s, retrying individually'
+                                 % bulk[0].channel.id)
+                single.extend(bulk)
+
+        for message in single:
+            try:
+                await self.bot.delete_message(message)
+                self.single_calls += 1
+                self.deleted += 1
+                done([message])
+            except discord.NotFound:  # someone beat us to it
+                self.recent[message.id] = True
+            except discord.HTTPException:
+                logger.exception('error deleting message %s/%s' % (message.channel.id, message.id))
+                self.failed += 1
+
+    def cancel(self):
+        for handle in self.timers:
+            handle.cancel()
+
+        for queue in self.queues.values():
+            if queue.task:
+                queue.task.cancel()
+
+        self.timers.clear()
+
+
+class CheckBatch:
+    """
+    Checks from concurrent messages waiting to go to the executor together
+    """
+    __slots__ = ['settings', 'jobs', 'messages', 'handle']
+
+    def __init__(self, settings: 'ServerConfig'):
+        self.settings = settings
+        self.jobs = []  # [(checks, future)]
+        self.messages = 0
+        self.handle = None
+
+
+class CheckBatcher:
+    """
+    Gathers executor checks from messages arriving together in the same server. A batch is sent as one
+    executor job once it holds the configured number of messages or its first has waited the configured
+    delay, whichever comes first, and the results are handed back to each waiting message.
+    """
+    __slots__ = ['cog', 'pending', 'tasks', 'batches', 'messages', 'max_size']
+
+    def __init__(self, cog: 'ReCensor'):
+        self.cog = cog
+        self.pending = {}  # {(server ID, config version, no_stop): CheckBatch}
+        self.tasks = set()
+        self.batches = 0
+        self.messages = 0
+        self.max_size = 0
+
+    def submit(self, settings: 'ServerConfig', checks: List[Tuple[str, str, bool, bool]],
+               no_stop: bool = False, messages: int = 1) -> Tuple[Awaitable[List[dict]], Optional[CheckBatch]]:
+        """
+        Queues checks to run in the executor like ReCensor._dispatch_checks, sharing the round trip with
+        other messages. Returns an awaitable for their results and the batch they joined (None if sent alone).
+        """
+        max_messages, max_delay = self.cog.batch_limits
+
+        if messages >= max_messages or max_delay <= 0:
+            return self.cog._dispatch_checks(settings, checks, no_stop), None
+
+        loop = self.cog.bot.loop
+        key = (settings.server_id, settings.version, no_stop)
+        batch = self.pending.get(key)
+
+        if batch is None:
+            batch = self.pending[key] = CheckBatch(settings)
+            batch.handle = loop.call_later(max_delay, self.flush, key)
+
+        future = loop.create_future()
+        batch.jobs.append((checks, future))
+        batch.messages += messages
+
+        if batch.messages >= max_messages:
+            self.flush(key)
+
+        return future, batch
+
+    def flush(self, key: tuple):
+        batch = self.pending.pop(key, None)
+
+        if batch is None:
+            return
+
+        batch.handle.cancel()
+        task = self.cog.bot.loop.create_task(self.run(batch, key[2]))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, batch: CheckBatch, no_stop: bool):
+        self.batches += 1
+        self.messages += batch.messages
+        self.max_size = max(self.max_size, batch.messages)
+
+        try:
+            results = await self.cog._dispatch_batch(batch.settings, [checks for checks, f in batch.jobs], no_stop)
+        except Exception as e:
+            for checks, future in batch.jobs:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # Messages that gave up waiting (such as on the message budget) have cancelled futures
+        for (checks, future), matches in zip(batch.jobs, results):
+            if not future.done():
+                future.set_result(matches)
+
+    def cancel(self):
+        for batch in self.pending.values():
+            batch.handle.cancel()
+
+            for checks, future in batch.jobs:
+                future.cancel()
+
+        for task in self.tasks:
+            task.cancel()
+
+        self.pending.clear()
+
+
+class FilterBase:
+    pass
+
+
+class ItemTypeReference(DiscordObject, DiscordHashable):
+    pass
+
+
+class FilterList:
+    __slots__ = ['parent', 'base_list', 'item_type', 'enabled', 'mode', 'overlay', 'items', 'whoami', '_effective']
+
+    # item_type is Type[DiscordUniObj], but that apparently breaks some versions of 3.5
+    def __init__(self, parent, whoami: str, item_type, *, base_list=None, **data):
+        self.parent = parent
+        self.whoami = whoami
+        self.base_list = base_list
+        self.item_type = item_type
+
+        self.enabled = data.get('enabled', False)
+        self.mode = data.get('mode', True)
+        self.overlay = data.get('overlay', True)
+        self.items = set(data.get('items', []))
+        self._effective = None
+
+    def convert_item(self, ctx, item):
+        """
+        Attempts to use discord's converters on the item type. Requires ctx.
+        """
+        return ctx.command.do_conversion(ctx, self.item_type, item)
+
+    def check(self, obj: DiscordUniObj) -> bool:
+        """
+        Return True if obj is in the list, based on its ID attribute
+        """
+        return isinstance(obj, self.item_type) and self.check_id(obj.id)
+
+    def effective(self) -> Tuple[FrozenSet[str], bool, dict, Optional[bool]]:
+        """
+        Flattens this list and its overlaid base into (deny, deny_inverted, decisions, default).
+
+        deny is the set of IDs the base list rejects, or everything but them if deny_inverted is set.
+        For check_id_iter, decisions maps every ID either list names to True or False if that ID decides
+        the result, or None if it doesn't; any other ID is treated as `default`. Cached until invalidate()
+        is called. Base lists are the server-wide lists, which don't have bases of their own.
+        """
+        if self._effective is None:
+            base = self.base_list
+
+            if self.overlay and base and base.enabled:
+                # A base blacklist rejects its items; a base whitelist rejects everything else
+                deny, deny_inverted = frozenset(base.items), base.mode
+            else:
+                deny, deny_inverted = frozenset(), False
+
+            def decide(obj_id):
+                if (obj_id in deny) != deny_inverted:
+                    return False
+                elif (obj_id in self.items) == self.mode:
+                    return True
+
+                return None
+
+            decisions = {obj_id: decide(obj_id) for obj_id in deny.union(self.items)}
+            self._effective = (deny, deny_inverted, decisions, decide(None))
+
+        return self._effective
+
+    def invalidate(self):
+        """
+        Drops the cached effective sets; call after changing this list or its base
+        """
+        self._effective = None
+
+    def check_id(self, obj_id: str, *, recurse=True) -> Optional[bool]:
+        """
+        Checks whether an ID is a member of the list
+        """
+        if recurse:
+            deny, deny_inverted = self.effective()[:2]
+
+            if (obj_id in deny) != deny_inverted:
+                return False
+
+        if not self.enabled:
+            return None
+
+        return (obj_id in self.items) == self.mode
+
+    def check_id_iter(self, id_iter: Iterable[str]) -> Optional[bool]:
+        """
+        Return True if ANY object whose IDs are in id_list are in the list
+        """
+        base_enabled = self.overlay and self.base_list and self.base_list.enabled
+
+        if not self.enabled:
+            if base_enabled:
+                return self.base_list.check_id_iter(id_iter)
+            else:
+                return None
+
+        if base_enabled:
+            deny, deny_inverted, decisions, default = self.effective()
+            get = decisions.get
+
+            # One lookup per ID instead of walking both lists; the first ID that decides either way wins
+            for _id in id_iter:
+                decision = get(_id, default)
+
+                if decision is not None:
+                    return decision
+
+        elif not self.items.isdisjoint(id_iter):
+            return self.mode
+
+        return not self.mode
+
+    def check_iter(self, obj_list: Iterable[DiscordUniObj]) -> Optional[bool]:
+        return self.check_id_iter((x.id for x in obj_list))
+
+    def filter(self, items: Iterable) -> List:
+        """
+        Returns a subset of the input containing objects that are in the list
+        """
+        return list(filter(self.check, items))
+
+    def to_json(self) -> dict:
+        data = {
+            'mode': self.mode,
+            'items': list(self.items),
+            'enabled': self.enabled
+        }
+
+        if self.overlay is not None:
+            data['overlay'] = self.overlay
+
+        return data
+
+    def __contains__(self, obj: DiscordUniObj) -> bool:
+        return self.check(obj)
+
+    def copy(self, new_parent):
+        return type(self)(
+            new_parent or self.parent,
+            self.whoami,
+            self.item_type,
+            base_list=self.base_list,
+            enabled=self.enabled,
+            mode=self.mode,
+            overlay=self.overlay,
+            items=self.items.copy()
+        )
+
+
+class ServerConfig(FilterBase):
+    __slots__ = ['cog', 'server_id', 'version', 'verdict_cache', 'eligibility', 'asciify', 'priv_exempt', 'fused',
+                 'seq_lookback', 'roles_list', 'channels_list', 'filters', 'order', 'shadow_order', 'shadow_log']
+
+    def __init__(self, cog, server_id: str, **data):
+        self.cog = cog
+        self.server_id = server_id
+        self.version = next(CONFIG_VERSIONS)
+        self.verdict_cache = VerdictCache()
+        self.eligibility = LRUCache(maxlen=ELIGIBILITY_INDEX_SIZE)
+        self.name = 'SERVER'
+
+        self.asciify = data.get('asciify', False)
+        self.priv_exempt = data.get('priv_exempt', True)
+        self.fused = data.get('fused', False)
+        self.seq_lookback = data.get('seq_lookback', 0)
+        self.filters = {}
+        self.order = []
+        self.shadow_order = []
+        self.shadow_log = deque(maxlen=SHADOW_LOG_SIZE)
+
+        lists_deps = {}
+
+        # Create server-wide lists
+        for list_name in ['roles_list', 'channels_list']:
+            item_type = type_from_name(list_name)
+            _list = FilterList(self, list_name, item_type, overlay=None, **data.get(list_name, {}))
+            setattr(self, list_name, _list)
+            lists_deps[list_name] = {}
+
+        # Instantiate filters without linked sublists
+        for name, filter_data in data.get('filters', {}).items():
+            self.filters[name] = Filter(self, name=name, defer_link=True, **filter_data)
+
+            # list_deps is empty, set it here
+            for list_name, list_deps in lists_deps.items():
+                link_name = filter_data.get(list_name + '_link')
+
+                if link_name in [None, 'SERVER']:
+                    list_deps[name] = []
+                else:
+                    list_deps[name] = [link_name]
+
+        for list_name, list_deps in lists_deps.items():
+            for filter_name in topological_sort(list_deps.items()):
+                if list_deps[filter_name]:  # if dep list is nonempty
+                    self.filters[filter_name].set_list(list_name, link_dest=list_deps[filter_name][0])
+
+        self.update_order()
+
+    def update_order(self):
+        filters = (f for f in self.filters.values() if f.enabled and not f.quarantine)
+        self.order[:] = sorted(filters, key=lambda f: f.filter_priority, reverse=True)
+
+        # Shadow filters are only for trying out filters that aren't enabled yet
+        shadows = (f for f in self.filters.values()
+                   if f.shadow and not (f.enabled or f.quarantine or f.multi_msg))
+        self.shadow_order[:] = sorted(shadows, key=lambda f: f.filter_priority, reverse=True)
+        self.bump_version()
+
+    def bump_version(self):
+        """
+        Marks the compiled filter sets held by workers, all cached verdicts and the eligibility index as stale
+        """
+        self.version = next(CONFIG_VERSIONS)
+        self.verdict_cache.clear()
+        self.eligibility.clear()
+
+    def eligible_filters(self, message: Message, list_cache: dict = None) -> Tuple["Filter", ...]:
+        """
+        Returns the filters in self.order whose mod exemption, channel list and role list allow checking `message`.
+
+        The result only depends on the channel, the author's roles and whether they're a mod, so it's indexed on
+        those and check_meta only runs the first time a combination is seen. The index is cleared whenever
+        filters, lists or the server's roles and channels change.
+        """
+        if list_cache is None:
+            list_cache = {}
+        elif 'eligible' in list_cache:
+            return list_cache['eligible']
+
+        if 'mos' in list_cache:
+            mos = list_cache['mos']
+        else:
+            list_cache['mos'] = mos = self.cog.is_mod_or_superior(message)
+
+        # Role order is kept, since an overlaid role list stops at the first role that decides it
+        if isinstance(message.author, discord.Member):
+            role_ids = tuple(r.id for r in message.author.roles)
+        else:  # check_meta treats webhooks as belonging to the default role only
+            role_ids = (message.server.default_role.id,)
+
+        key = (message.channel.id, role_ids, mos)
+        eligible = self.eligibility.get(key)
+
+        if eligible is None:
+            eligible = tuple(f for f in self.order if f.check_meta(message, list_cache))
+            self.eligibility.put(key, eligible)
+
+        list_cache['eligible'] = eligible
+        return eligible
+
+    def filter_spec(self) -> dict:
+        """
+        Returns the data workers need to compile this server's filters:
+        {'fused': bool, 'filters': {name: (pattern, flags, position)}}
+
+        Workers skip patterns that don't compile, so this doesn't have to compile anything itself.
+        """
+        return {
+            'fused'   : self.fused,
+            'filters' : {f.name: (f.pattern, f.flags, f.position.value) for f in self.filters.values()}
+        }
+
+    def lists_changed(self):
+        """
+        Drops everything derived from the server's lists: their effective sets and the eligibility index
+        """
+        for owner in itertools.chain([self], self.filters.values()):
+            owner.roles_list.invalidate()
+            owner.channels_list.invalidate()
+
+        self.eligibility.clear()
+
+    def make_link(self, link_owner, target_owner, list_name):
+        dep_graph = {}
+
+        # build the current state
+        for _filter in self.filters.values():
+            link_dest = _filter.links.get(list_name)
+            dep_graph[_filter.name] = [] if link_dest in [self, None] else [link_dest.name]
+
+        # make the proposed change
+        dep_graph[link_owner.name] = [target_owner.name]
+
+        # test for cycles/broken links
+        sorted_names = list(topological_sort(dep_graph.items()))
+
+        # apply the changes
+        for name in sorted_names:
+            if dep_graph[name]:
+                self.filters[name].set_list(list_name, link_dest=dep_graph[name][0])
+            else:
+                self.filters[name].links.pop(list_name, None)
+
+        assert getattr(link_owner, list_name) is getattr(target_owner, list_name)
+        self.lists_changed()
+        return getattr(target_owner, list_name)
+
+    def break_link(self, link_owner, list_name, *, copy=False, **newlist_data):
+        current_list = getattr(link_owner, list_name)
+        if current_list.parent is link_owner:
+            raise TypeError("Not linked.")
+        elif copy and newlist_data:
+            raise TypeError("If copy is set, no extra data should be passed.")
+
+        dep_graph = {}
+
+        # build the current state
+        for _filter in self.filters.values():
+            link_dest = _filter.links.get(list_name)
+            dep_graph[_filter.name] = [] if link_dest in [self, None] else [link_dest.name]
+
+        # make the proposed change
+        dep_graph[link_owner.name] = []
+
+        # test for cycles/broken links
+        sorted_names = list(topological_sort(dep_graph.items()))
+
+        # apply the changes
+        for name in sorted_names:
+            if dep_graph[name]:
+                self.filters[name].set_list(list_name, link_dest=dep_graph[name][0])
+            else:
+                self.filters[name].links.pop(list_name, None)
+
+            if name == link_owner.name:
+                if copy:
+                    newlist_obj = getattr(link_owner, list_name).copy(link_owner)
+                    link_owner.set_list(list_name, new_list_obj=newlist_obj)
+                else:
+                    self.filters[name].set_list(list_name, new_list_data=newlist_data)
+
+        self.lists_changed()
+        return getattr(link_owner, list_name)
+
+    def get_filter(self, _filter: Union[str, 'Filter'], check=False):
+        if isinstance(_filter, Filter):
+            if _filter.parent is not self:
+                if not check:
+                    return None
+                raise TypeError("the provided filter does not belong to this config")
+            elif _filter not in self.filters.values():
+                if not check:
+                    return None
+                raise ValueError("the provided filter is not in this config")
+            else:
+                return _filter
+        elif type(_filter) is str:
+            if _filter not in self.filters:
+                if not check:
+                    return None
+                raise ValueError("there is no filter named '%s'" % _filter)
+            else:
+                return self.filters[_filter]
+        else:
+            raise TypeError('only Filter objects or names (str) may be passed')
+
+    def add_filter(self, name: str, **data):
+        if self.get_filter(name):
+            raise ValueError("filter %s already exists" % name)
+
+        self.filters[name] = f = Filter(self, name=name, **data)
+
+        if f.enabled:
+            self.update_order()
+
+        return f
+
+    def rename_filter(self, _filter: Union[str, 'Filter'], new_name: str):
+        _filter = self.get_filter(_filter, check=True)
+
+        if type(new_name) is not str:
+            raise TypeError('only strings may be passed as new name')
+        elif not new_name:
+            raise ValueError('new name must be nonempty')
+
+        if self.get_filter(new_name):
+            raise ValueError("filter %s already exists" % new_name)
+
+        self.filters[new_name] = self.filters.pop(_filter.name)
+        _filter.name = new_name
+        self.bump_version()
+        return _filter
+
+    def copy_filter(self, _filter: Union[str, 'Filter'], new_name: str, link=False, **kwargs):
+        _filter = self.get_filter(_filter, check=True)
+
+        if type(new_name) is not str:
+            raise TypeError('only strings may be passed as new name')
+        elif not new_name:
+            raise ValueError('new name must be nonempty')
+
+        if self.get_filter(new_name):
+            raise ValueError("filter %s already exists" % new_name)
+
+        copied = self.filters[new_name] = _filter.copy(new_name, link=link, **kwargs)
+        return copied
+
+    def delete_filter(self, _filter: Union[str, 'Filter']):
+        _filter = self.get_filter(_filter, check=True)
+
+        channels_linked = []
+        roles_linked = []
+        linked_err = []
+
+        for filter_name, f in self.filters.items():
+            if f is _filter:
+                continue
+            if f.links.get('channels_list') is _filter:
+                channels_linked.append(filter_name)
+            if f.links.get('roles_list') is _filter:
+                roles_linked.append(filter_name)
+
+        if channels_linked:
+            linked_err.append('channels: ' + ', '.join(channels_linked))
+        if roles_linked:
+            linked_err.append('roles: ' + ', '.join(roles_linked))
+        if linked_err:
+            raise TypeError('links exist from other filters: ' + '; '.join(linked_err))
+
+        self.filters.pop(_filter.name)
+        _filter.release_pattern()
+
+        if _filter.enabled:
+            self.update_order()
+
+        return True
+
+    async def check_message(self, message: Message, list_cache: dict = None
+                            ) -> Tuple[Optional["Filter"], bool, Optional[str]]:
+        """
+        Return the matched filter (or None if no match), a boolean indicating whether to
+        delete `message`, and the substring of the match (None if no match or whitelist).
+        """
+        checked, checks, cache_key = self.message_checks(message, list_cache)
+
+        if not checked:
+            return None, False, None
+
+        verdict = self.verdict_cache.get(cache_key)
+
+        if verdict is not None:
+            return verdict
+
+        matches = await self.run_prefiltered_checks(checks, checked)
+        verdict = self.message_verdict(checked, matches)
+
+        # Don't remember verdicts affected by timeouts or other errors
+        if not any('exception' in m for m in matches):
+            self.verdict_cache.put(cache_key, verdict)
+
+        return verdict
+
+    async def check_messages(self, messages: Sequence[Message]
+                             ) -> List[Tuple[Optional["Filter"], bool, Optional[str]]]:
+        """
+        check_message for many messages at once, sending all of their checks to the executor in one call
+        """
+        verdicts = [(None, False, None)] * len(messages)
+        pending = []
+        all_checks = []
+        all_checked = []
+
+        for i, message in enumerate(messages):
+            checked, checks, cache_key = self.message_checks(message)
+
+            if not checked:
+                continue
+
+            verdict = self.verdict_cache.get(cache_key)
+
+            if verdict is not None:
+                verdicts[i] = verdict
+                continue
+
+            pending.append((i, len(checks), cache_key))
+            all_checks.extend(checks)
+            all_checked.extend(checked)
+
+        if not pending:
+            return verdicts
+
+        # Every check has to run, since stopping on one message's match would skip the rest
+        matches = iter(await self.run_prefiltered_checks(all_checks, all_checked, no_stop=True,
+                                                         messages=len(pending)))
+        checked = iter(all_checked)
+
+        for i, count, cache_key in pending:
+            message_matches = list(itertools.islice(matches, count))
+            verdicts[i] = verdict = self.message_verdict(list(itertools.islice(checked, count)), message_matches)
+
+            if not any('exception' in m for m in message_matches):
+                self.verdict_cache.put(cache_key, verdict)
+
+        return verdicts
+
+    def message_checks(self, message: Message, list_cache: dict = None
+                       ) -> Tuple[List["Filter"], List[Optional[tuple]], Hashable]:
+        """
+        Returns the single-message filters eligible for `message`, the check to run for each (None if the
+        prefilter ruled it out), and the message's verdict cache key
+        """
+        content_cache = {}
+        prefilters = {}
+        checks = []
+        checked = []
+
+        if list_cache is None:
+            list_cache = {}
+
+        for f in self.eligible_filters(message, list_cache):
+            # Don't run if the filter is multi-message
+            if f.multi_msg or not f.predicate:
+                continue
+
+            asciify = f.asciify or (f.asciify is None and self.asciify)
+            ck = (asciify, f.attachment_header)
+
+            if ck in content_cache:
+                content = content_cache[ck]
+            else:
+                content = preprocess_msg(f, message)
+
+                if asciify:
+                    content = self.cog.asciify_memo(content)
+
+                content_cache[ck] = content
+                prefilters[ck] = LiteralPrefilter(content)
+
+            checked.append(f)
+
+            # Filters whose required literals are all absent can't match, so they don't need to be run
+            if prefilters[ck].may_match(f.literals):
+                stop_on_match = f.override or not f.mode  # short-circuit for override or blacklist mode
+                checks.append((f.name, content, stop_on_match, False))
+            else:
+                checks.append(None)
+
+        # Eligibility (mod status, channel and role lists) is fully reflected in which filters were checked
+        cache_key = (self.version, tuple(f.name for f in checked), tuple(sorted(content_cache.items())))
+        return checked, checks, cache_key
+
+    @staticmethod
+    def message_verdict(checked: Sequence["Filter"], matches: Sequence[dict]
+                        ) -> Tuple[Optional["Filter"], bool, Optional[str]]:
+        """
+        Applies filter priority to single-message results, in the same form as check_message returns
+        """
+        whites_checked = []
+        match_white = False
+
+        for f, match_dict in zip(checked, matches):
+            matched = match_dict.get('match')
+
+            if f.override and matched:  # override black or white
+                return f, not f.mode, (None if f.mode else matched)
+            elif whites_checked and not f.mode and not match_white:
+                white_hit = whites_checked[0] if len(whites_checked) == 1 else None
+                # Message has whitelist but nothing matched, return immediately
+                return white_hit, True, None
+            elif f.mode and not f.override:  # white for normal only, ORed between all matches
+                whites_checked.append(f)
+                match_white |= bool(matched)
+            elif matched:  # black regular
+                return f, True, matched
+
+        if whites_checked:
+            white_hit = whites_checked[0] if len(whites_checked) == 1 else None
+            return white_hit, not match_white, None
+
+        return None, False, None
+
+    async def run_prefiltered_checks(self, checks: List[Optional[Tuple[str, str, bool, bool]]],
+                                     filters: Sequence["Filter"], no_stop: bool = False,
+                                     messages: int = 1, shadow: bool = False) -> List[dict]:
+        """
+        Runs checks through the executor, filling in misses for checks that were ruled out beforehand (None),
+        such as by the literal prefilter. `filters` holds the filter each check belongs to.
+
+        The returned list ends where the dispatched checks stopped on a match. `no_stop` and `messages`
+        are passed to ReCensor.run_checks; with `shadow`, the checks go to ReCensor.run_shadow_checks instead.
+        """
+        to_run = [c for c in checks if c]
+
+        if not to_run:
+            results = iter(())
+        elif shadow:
+            results = iter(await self.cog.run_shadow_checks(self, to_run))
+        else:
+            results = iter(await self.cog.run_checks(self, to_run, no_stop, messages))
+        matches = []
+
+        for check, f in zip(checks, filters):
+            if check:
+                match = next(results, None)
+
+                if match is None:
+                    break
+            else:
+                match = {'time': 0, 'prefiltered': True}
+                f.telemetry.skipped += 1
+
+            matches.append(match)
+
+        return matches
+
+    async def check_shadow(self, message: Message):
+        """
+        Checks a sample of messages against shadow filters on the shadow pool, recording what each would
+        have deleted to shadow_log. Hit rates and timings go to the filters' telemetry like any other check.
+        """
+        content_cache = {}
+        list_cache = {}
+        checks = []
+        checked = []
+
+        for f in self.shadow_order:
+            if random.random() >= f.shadow or not (f.check_meta(message, list_cache, shadow=True) and f.predicate):
+                continue
+
+            asciify = f.asciify or (f.asciify is None and self.asciify)
+            ck = (asciify, f.attachment_header)
+
+            if ck in content_cache:
+                content, prefilter = content_cache[ck]
+            else:
+                content = preprocess_msg(f, message)
+
+                if asciify:
+                    content = self.cog.asciify_memo(content)
+
+                content_cache[ck] = content, prefilter = content, LiteralPrefilter(content)
+
+            checked.append(f)
+            checks.append((f.name, content, False, False) if prefilter.may_match(f.literals) else None)
+
+        if not checked:
+            return
+
+        matches = await self.run_prefiltered_checks(checks, checked, no_stop=True, shadow=True)
+        now = datetime.utcnow()
+
+        for f, match in zip(checked, matches):
+            if 'exception' in match or ('match' in match) == f.mode:
+                continue
+
+            self.shadow_log.append({
+                'time'    : now,
+                'filter'  : f.name,
+                'channel' : message.channel.id,
+                'author'  : message.author.id,
+                'message' : message.id,
+                'match'   : match.get('match'),
+                'elapsed' : match['time']
+            })
+
+    async def debug_message(self, message: Message) -> Tuple[List[Tuple[str, str, Optional[str]]],
+                                                             Optional[Tuple[str, bool]]]:
+        """
+        Return a list of each filter's results and the ultimate action that would be taken, if any.
+
+        Filters that were checked also say how long their pattern took and whether they would currently
+        run inline or in the pool, and why. All of them are checked in one job on the diagnostic pool.
+        """
+        has_white = False
+        match_white = False
+        content_cache = {}
+        list_cache = {}
+        action = None
+        results = []
+        to_check = []
+
+        for f in self.order:
+            meta_result = f.check_meta(message, list_cache, debug=True)
+
+            if not meta_result[0]:
+                results.append((f.name, 'meta skip', meta_result[1]))
+                continue
+            elif not f.predicate:
+                results.append((f.name, 'no predicate', None))
+                continue
+
+            asciify = f.asciify or (f.asciify is None and self.asciify)
+            ck = (asciify, f.attachment_header)
+
+            if ck in content_cache:
+                content = content_cache[ck]
+            else:
+                content = preprocess_msg(f, message)
+
+                if asciify:
+                    content = self.cog.asciify_memo(content)
+
+                content_cache[ck] = content
+
+            to_check.append((f, content))
+            results.append(None)
+
+        checks = [(f.name, content, False, False) for f, content in to_check]
+        plan = iter(self.cog.plan_inline(self, checks))
+        matches = iter(await self.cog.run_diagnostic_checks(self, checks) if checks else ())
+        to_check = iter(to_check)
+
+        for i, row in enumerate(results):
+            if row is not None:
+                continue
+
+            f, content = next(to_check)
+            inline, reason = next(plan)
+            dispatch = '%s (%s)' % ('inline' if inline else 'pool', reason)
+            match_dict = next(matches)
+
+            if 'exception' in match_dict:
+                e = match_dict['exception']
+                results[i] = (f.name, 'error', '%s: %s' % (type(e).__name__, e), format_seconds(match_dict['time']),
+                              dispatch)
+                continue
+
+            match = match_dict.get('span')
+
+            if f.override and match:  # override black or white
+                if action is None:
+                    action = (f.name, not f.mode)
+
+                result = 'override match', match and content[match[0]:match[1]]
+            elif has_white and not f.mode and not match_white:
+                if action is None:
+                    action = (f.name, True)
+
+                result = 'white->black transition but no white match', match and content[match[0]:match[1]]
+            elif f.mode and not f.override:
+                has_white = True
+                match_white |= bool(match)
+                result = 'white test (%s)' % ('hit' if bool(match) else 'miss'), match and content[match[0]:match[1]]
+            elif match:
+                if action is None:
+                    action = (f.name, True)
+
+                result = 'black match', match and content[match[0]:match[1]]
+            else:
+                result = 'default case', None
+
+            results[i] = (f.name, *result, format_seconds(match_dict['time']), dispatch)
+
+        if has_white:
+            action = ('default w/ whitelist', not match_white)
+
+        return results, action
+
+    async def check_sequence(self, messages: Sequence[Message], list_cache: Optional[dict] = None,
+                             history: Optional[MessageHistory] = None, cascade: bool = False
+                             ) -> Tuple[Optional["Filter"], Set[Message], Optional[str]]:
+        """
+        Return the matched filter (or None if no match), a set of messages that should be deleted, and
+        the matching span from the sequence `messages` (None if no match or whitelist).
+
+        If `history` is passed, it's used to cache preprocessed text, and blacklist filters only rescan
+        the part of the sequence that could contain a match they haven't already cleared. `cascade`
+        marks a pass after deleting an earlier match, which is counted in filter telemetry.
+        """
+        joined_cache = {}
+        content_cache = {}
+        checks = []
+        checked = []
+        cleared_keys = []
+
+        if not messages:
+            return None, set(), None
+        elif list_cache is None:
+            list_cache = {}
+
+        if history is not None:
+            history.prune()
+
+        first_msg = next(iter(messages))
+
+        for f in self.eligible_filters(first_msg, list_cache):
+            if not (f.multi_msg and f.predicate):
+                continue
+
+            asciify = f.asciify or (f.asciify is None and self.asciify)
+            jk = (asciify, f.multi_msg_join, f.attachment_header)
+
+            if jk in joined_cache:
+                content, indices, pairs = joined_cache[jk]
+            else:
+                strings = []
+                tk = (asciify, f.attachment_header)
+
+                for message in messages:
+                    texts = (content_cache if history is None else history.texts).setdefault(message.id, {})
+
+                    if tk in texts:
+                        content = texts[tk]
+                    else:
+                        content = preprocess_msg(f, message)
+
+                        if asciify:
+                            content = self.cog.asciify_memo(content)
+
+                        texts[tk] = content
+
+                    strings.append(content)
+
+                pairs = tuple(zip((m.id for m in messages), strings))
+
+                if history is None:
+                    content, indices = concat_with_keys(strings, f.multi_msg_join)
+                else:
+                    content, indices = history.join(jk, pairs, f.multi_msg_join)
+
+                joined_cache[jk] = (content, indices, pairs)
+
+            # Don't stop immediately on white; whitelists look at every match
+            stop_on_match = f.override or not f.mode
+            checked.append((f, indices, content))
+
+            if f.mode or history is None:
+                pos = 0
+                checks.append((f.name, content, stop_on_match, f.mode))
+                cleared_keys.append(None)
+            else:
+                cleared_keys.append(((f.name, jk), pairs))
+                pos = self.sequence_start(f, history.cleared.get((f.name, jk)), pairs, indices)
+
+                if pos is None:  # nothing new to look at
+                    checks.append(None)
+                else:
+                    checks.append((f.name, content, stop_on_match, f.mode, pos))
+
+            if cascade and pos is not None:
+                f.telemetry.rescans += 1
+                f.telemetry.rescan_chars += len(content) - pos
+
+        matches = await self.run_prefiltered_checks(checks, [f for f, indices, content in checked])
+
+        if history is not None:
+            # Remember which blacklists came up clean, so the next pass can skip what they've seen
+            for cleared_key, match in zip(cleared_keys, matches):
+                if cleared_key is None:
+                    continue
+
+                key, pairs = cleared_key
+
+                if 'match' in match or 'exception' in match:
+                    history.cleared.pop(key, None)
+                else:
+                    history.cleared[key] = (self.version, pairs)
+
+        whites_checked = []
+        matched_message_set = set()
+        message_set = set(messages)
+        to_delete = message_set.copy()
+        new_wlc = []
+        spans = []
+
+        for (f, indices, content), match_obj in zip(checked, matches):
+            if type(match_obj) is list:
+                matches = match_obj
+            else:
+                matches = [match_obj]
+
+            matched_message_set.clear()
+            new_wlc.clear()
+            spans.clear()
+
+            for match in matches:
+                if 'match' not in match:
+                    continue
+                elif f.multi_msg_group > 0 and not f.mode:  # groups disabled for whitelist
+                    if len(match.get('group_spans', [])) < f.multi_msg_group:
+                        continue
+
+                    match = match['group_spans'][f.multi_msg_group - 1]
+                else:
+                    match = match['span']
+
+                spans.append(match)
+
+                match_messages = sequence_from_indices(messages, indices, match)
+                matched_message_set.update(match_messages)
+
+                if f.mode:
+                    new_wlc.append((match_messages[0].id, match_messages[-1].id))
+
+            if matched_message_set and f.mode:
+                wlc_key = (first_msg.channel.id, first_msg.author.id)
+                to_delete -= matched_message_set
+
+                for start_id, end_id in f.mm_white_lastmatch_cache.get(wlc_key, ()):
+                    # The only case we care about: the start of a former match is outside the window, but not the end
+                    if start_id < first_msg.id < end_id:
+                        for message in itertools.takewhile(lambda m: m.id <= end_id, messages):
+                            to_delete.discard(message)
+
+                f.mm_white_lastmatch_cache[wlc_key] = new_wlc.copy()
+
+            if spans:
+                start = spans[0][0]
+                end = spans[-1][1]
+                match_substr = content[start:end]
+            else:
+                match_substr = None
+
+            if f.override and matched_message_set and not f.mode:  # override black
+                return f, matched_message_set, match_substr
+            elif f.override and f.mode and to_delete:  # override white
+                return f, to_delete, None
+            elif whites_checked and not f.mode and to_delete:
+                white_hit = whites_checked[0] if len(whites_checked) == 1 else None
+                # Message has whitelist but we're on a blacklist, return immediately
+                return white_hit, to_delete, None
+            elif f.mode and not f.override:  # white for normal only
+                whites_checked.append(f)
+            elif matched_message_set:  # regular black
+                return f, matched_message_set, match_substr
+
+        if whites_checked:
+            white_hit = whites_checked[0] if len(whites_checked) == 1 else None
+            return white_hit, to_delete, None
+
+        return None, set(), None
+
+    def sequence_start(self, f: "Filter", cleared: Optional[tuple], pairs: Tuple[Tuple[str, str], ...],
+                       indices: Sequence[int]) -> Optional[int]:
+        """
+        Returns where blacklist `f` has to start searching the joined (message ID, text) `pairs`, given the
+        (version, pairs) it last came up clean on, or None if it can't match anything it hasn't seen already.
+        """
+        if cleared is None or cleared[0] != self.version:
+            return 0
+        elif cleared[1] == pairs:
+            return None
+        elif f.position is not POSITION.ANYWHERE:
+            return 0
+
+        width, margin, lookaround = f.seq_window or (None, 0, True)
+        width = self.seq_lookback if width is None else width
+
+        if not width:
+            return 0
+
+        # Word boundaries see the start and end of the content the same way as a non-word join
+        join = f.multi_msg_join
+        edges = lookaround or (margin > 0 and not (join and SEQ_NONWORD_RE.match(join[0] + join[-1])))
+        dirty = sequence_dirty_start(cleared[1], pairs, indices, len(join), edges)
+
+        if dirty is None:
+            return None
+
+        return max(dirty - width - margin, 0)
+
+    def to_json(self):
+        return {
+            'asciify'      : self.asciify,
+            'priv_exempt'  : self.priv_exempt,
+            'fused'        : self.fused,
+            'seq_lookback' : self.seq_lookback,
+            'channels_list': self.channels_list.to_json(),
+            'roles_list'   : self.roles_list.to_json(),
+            'filters'      : {k: v.to_json() for k, v in self.filters.items()}
+        }
+
+
+class Filter(FilterBase):
+    __slots__ = ['parent', 'name', 'pattern', 'flags', 'mode', 'enabled', 'override', 'asciify', 'position',
+                 'channels_list', 'roles_list', 'priv_exempt', 'multi_msg', 'links', 'attachment_header',
+                 'multi_msg_group', 'multi_msg_join', '_pattern_entry', 'mm_white_lastmatch_cache',
+                 'flash_msg', 'flash_dm', 'flash_sec', 'quarantine', 'shadow', 'cost', 'telemetry']
+
+    def __init__(self, parent: ServerConfig, name: str, *, defer_link=False, **data):
+        self.parent = parent
+        self.name = name
+
+        self.pattern = data.get('pattern', '')
+        self.flags = data.get('flags', DEFAULT_FLAGS)
+        self.mode = data.get('mode', False)
+        self.enabled = data.get('enabled', False)
+        self.override = data.get('override', False)
+        self.priv_exempt = data.get('priv_exempt', None)
+        self.multi_msg = data.get('multi_msg', False)
+        self.multi_msg_join = data.get('multi_msg_join', CONCAT_JOIN)
+        self.multi_msg_group = data.get('multi_msg_group', 0)
+        self.asciify = data.get('asciify', None)
+        self.attachment_header = data.get('attachment_header', False)
+        self.flash_msg = data.get('flash_msg', False)
+        self.flash_dm = data.get('flash_dm', False)
+        self.flash_sec = data.get('flash_sec', 5)
+        self.quarantine = data.get('quarantine', None)
+        self.shadow = data.get('shadow', 0)  # fraction of messages to check while disabled, without acting
+
+        self.position = POSITION(data.get('position', POSITION.ANYWHERE))
+        self._pattern_entry = None  # loaded on first use; False if the pattern doesn't compile
+        self.cost = CostProfile()
+        self.telemetry = FilterTelemetry()
+        self.mm_white_lastmatch_cache = {}
+
+        self.links = {}
+
+        for k in ['roles_list', 'channels_list']:
+            if isinstance(data.get(k), FilterList):
+                self.set_list(k, new_list_obj=data[k])
+            else:
+                self.set_list(k, link_dest=data.get(k + '_link'), defer=defer_link, new_list_data=data.get(k, {}))
+
+    def set_list(self, list_name, *, link_dest=None, defer=False, new_list_data=None, new_list_obj: FilterList = None):
+        list_val = None
+        server_list = getattr(self.parent, list_name)
+
+        if not link_dest:
+            if new_list_data is None and not new_list_obj:
+                raise TypeError("list_data or list_obj required without link_dest")
+            elif new_list_obj and new_list_data is not None:
+                raise TypeError("only list_data or list_obj can be passed, not both")
+            elif new_list_obj:
+                list_val = new_list_obj
+            else:
+                item_type = type_from_name(list_name)
+                list_val = FilterList(self, list_name, item_type, base_list=server_list, **new_list_data)
+
+            self.links.pop(list_name, None)
+        elif link_dest == 'SERVER':
+            list_val = server_list
+            self.links[list_name] = self.parent
+        elif not defer:
+            linked_filter = self.parent.filters[link_dest]
+            self.links[list_name] = linked_filter
+            list_val = getattr(linked_filter, list_name)
+
+        setattr(self, list_name, list_val)
+
+    def rebuild_predicate(self):
+        """
+        Reloads the compiled pattern after the pattern, flags or position change
+        """
+        ret = self.load_pattern()
+        self.parent.bump_version()
+        return ret
+
+    def load_pattern(self):
+        old_entry = self._pattern_entry
+
+        try:
+            entry = PATTERN_REGISTRY.acquire(self.pattern, self.flags, self.position).analyze()
+        except re.error:
+            logger.exception("error building predicate for pattern '%s' and flags %s"
+                             % (self.pattern, self.flags))
+            entry = False
+
+        # Acquire before releasing, so an unchanged pattern isn't dropped and recompiled
+        if old_entry:
+            PATTERN_REGISTRY.release(old_entry)
+
+        self._pattern_entry = entry
+        self.cost = CostProfile(entry and entry.inline_safe)
+        return (entry.predicate, entry.compiled) if entry else (False, None)
+
+    def release_pattern(self):
+        if self._pattern_entry:
+            PATTERN_REGISTRY.release(self._pattern_entry)
+
+        self._pattern_entry = None
+
+    def run_check(self, content: str, iterate: bool = False, pos: int = 0):
+        """
+        Runs the filter against content in the calling thread, returning the same result as check_matches_resident
+        """
+        if iterate:
+            ret = check_match_iter(self.compiled.finditer, content)
+        elif pos:
+            ret = check_match(partial(get_match_func(self.compiled, self.position), pos=pos), content)
+        else:
+            ret = self.predicate(content)
+
+        if isinstance(ret, dict):
+            ret['name'] = self.name
+
+        return ret
+
+    @property
+    def pattern_entry(self) -> Union[CompiledPattern, bool]:
+        if self._pattern_entry is None:
+            self.load_pattern()
+
+        return self._pattern_entry
+
+    @property
+    def predicate(self):
+        entry = self.pattern_entry
+        return entry and entry.predicate
+
+    @property
+    def compiled(self):
+        entry = self.pattern_entry
+        return entry.compiled if entry else None
+
+    @property
+    def literals(self) -> Optional[FrozenSet[Tuple[str, bool]]]:
+        entry = self.pattern_entry
+        return entry.literals if entry else None
+
+    @property
+    def seq_window(self) -> Optional[Tuple[Optional[int], int, bool]]:
+        entry = self.pattern_entry
+        return entry.seq_window if entry else None
+
+    def check_meta(self, message: Message, cache=None, debug=False, shadow=False):
+        """
+        Return True if message is eligible for regex check. shadow skips the enabled check.
+        """
+        if not (self.enabled or shadow):
+            if debug:
+                return False, 'disabled'
+            return False
+
+        if cache is None:
+            cache = {}
+
+        if 'mos' in cache:
+            mos = cache['mos']
+        else:
+            cache['mos'] = mos = self.parent.cog.is_mod_or_superior(message)
+
+        if mos:
+            if self.priv_exempt:
+                if debug:
+                    return False, 'immediate priv_exempt'
+                return False
+            elif self.priv_exempt is None and self.parent.priv_exempt:
+                if debug:
+                    return False, 'parent priv_exempt'
+                return False
+
+        if self.channels_list in cache:
+            clr = cache[self.channels_list]
+        else:
+            cache[self.channels_list] = clr = self.channels_list.check(message.channel)
+
+        if clr is False:
+            if debug:
+                return False, 'not in channel list'
+            return False
+
+        if self.roles_list in cache:
+            rlr = cache[self.roles_list]
+        else:
+            if isinstance(message.author, discord.Member):
+                role_list = message.author.roles
+            else:  # for webhooks, act as if "user" belongs to default role only
+                role_list = [message.server.default_role]
+
+            cache[self.roles_list] = rlr = self.roles_list.check_iter(role_list)
+
+        if rlr is False:
+            if debug:
+                return False, 'not in role list'
+            return False
+
+        if debug:
+            return True, 'meta matched'
+        return True
+
+    def to_json(self):
+        data = {
+            'asciify'           : self.asciify,
+            'attachment_header' : self.attachment_header,
+            'enabled'           : self.enabled,
+            'flags'             : self.flags,
+            'mode'              : self.mode,
+            'multi_msg'         : self.multi_msg,
+            'multi_msg_join'    : self.multi_msg_join,
+            'multi_msg_group'   : self.multi_msg_group,
+            'override'          : self.override,
+            'pattern'           : self.pattern,
+            'position'          : self.position.value,
+            'priv_exempt'       : self.priv_exempt,
+            'flash_msg'         : self.flash_msg,
+            'flash_dm'          : self.flash_dm,
+            'flash_sec'         : self.flash_sec,
+            'quarantine'        : self.quarantine,
+            'shadow'            : self.shadow
+        }
+
+        for k in ['roles_list', 'channels_list']:
+            if k in self.links:
+                data[k + '_link'] = self.links[k].name
+            else:
+                data[k] = getattr(self, k).to_json()
+
+        return data
+
+    def copy(self, new_name: str, link: bool = False, **kwargs):
+        new_kwargs = dict(
+            pattern=self.pattern,
+            flags=self.flags,
+            mode=self.mode,
+            enabled=False,
+            override=self.override,
+            priv_exempt=self.priv_exempt,
+            position=self.position,
+            attachment_header=self.attachment_header,
+            multi_msg=self.multi_msg,
+            multi_msg_group=self.multi_msg_group,
+            multi_msg_join=self.multi_msg_join,
+            asciify=self.asciify,
+            flash_msg=self.flash_msg,
+            flash_dm=self.flash_dm,
+            flash_sec=self.flash_sec,
+            shadow=self.shadow
+        )
+
+        new_kwargs.update(kwargs)
+
+        for list_name in ['roles_list', 'channels_list']:
+            if link:
+                new_kwargs[list_name + '_link'] = self.name
+            else:
+                new_kwargs[list_name] = getattr(self, list_name)
+
+        return type(self)(self.parent, new_name, **new_kwargs)
+
+    @property
+    def filter_priority(self):
+        #  p e o m
+        #  3 1 1 0
+        #  2 1 1 1
+        #  1 1 0 1
+        #  0 1 0 0
+        # -1 0 x x
+        if not self.enabled:
+            return -1
+        elif self.override:
+            return 2 + int(not self.mode)
+
+        return int(self.mode)
+
+
+class ReCensor:
+    """
+    Filter messages using regular expressions
+    """
+
+    # Old data format:
+    # {
+    #  server_id (str): {
+    #   channel_id (str): {
+    #     regex (str): mode (str from MODES)
+    #     }
+    #   }
+    # }
+    #
+    # New data format:
+    # {
+    #   server_id (str): {
+    #       'filters' : {
+    #           name (str) : {
+    #               'asciify'           : tristate (default null),
+    #               'attachment_header' : bool (default false),
+    #               'enabled'           : bool (default false),
+    #               'flags'             : flags (str containing subset of AILUMSX, default DEFAULT_FLAGS),
+    #               'mode'              : bool (default false),
+    #               'multi_msg'         : bool (default false),
+    #               'multi_msg_join'    : str (default CONCAT_JOIN),
+    #               'multi_msg_group'   : int (default 0),
+    #               'override'          : bool (default false),
+    #               'pattern'           : pattern (str),
+    #               'position'          : enum[str] (default POSITION.ANYWHERE),
+    #               'channels_list'     : {
+    #                       'mode'        :   tristate,
+    #                       'items'       :   list[channel_id (str)]},
+    #                       'overlay'     :   optional bool (default true)
+    #                                   },
+    #               'roles_list'        : {
+    #                       'mode'        :   tristate,
+    #                       'items'       :   list[channel_id (str)]},
+    #                       'overlay'     :   optional bool (default true)
+    #                                   },
+    #               'priv_exempt'       : tristate,
+    #               'quarantine'        : optional {'reason': str, 'time': ISO timestamp, 'elapsed': float}
+    #           }
+    #       },
+    #       'asciify'       : bool (default false),
+    #       'priv_exempt'   : bool (default true),
+    #       'fused'         : bool (default false),
+    #       'seq_lookback'  : int (default 0, unlimited),
+    #       'roles_list'    : {
+    #                   'mode'  :   tristate,
+    #                   'items' :   list[channel_id (str)]}
+    #       },
+    #       'channels_list' : {
+    #                   'mode'  :   tristate,
+    #                   'items' :   list[channel_id (str)]}
+    #       },
+    #   }
+    # }
+
+    def __init__(self, bot, data: dict = None, workers: int = None):
+        self.bot = bot
+        self.ready = False
+        self.replay = data is not None  # a replay benchmark's copy: config isn't saved and analytics are off
+        self.workers = workers
+
+        self.executor = ExecutorClass(workers)
+        self.diagnostic_executor = ExecutorClass(DIAGNOSTIC_WORKERS)
+        self.shadow_executor = ExecutorClass(SHADOW_WORKERS)
+        self.settings = {}
+        self.misc_data = {}
+        self._ignore_filters = {}
+        self._diagnose_lock = asyncio.Lock()
+        self.asciify_memo = AsciifyMemo()
+        self.mod_status = ModStatusCache()
+        self._scans = {}  # {server ID: ScanJob}
+        self._shadow_tasks = set()
+        self._message_cache = MessageHistoryStore()
+        self.deleter = DeletionPipeline(bot)
+        self.batcher = CheckBatcher(self)
+        self._deleted = BoundedOrderedDict(maxlen=MSG_HISTORY_MAX_NUM)
+
+        if data is None:
+            data = dataIO.load_json(JSON_PATH)
+
+            if data.get('_schema_version', 1) < 2:
+                data = migrate_data(data)
+                dataIO.save_json(JSON_PATH, data)
+
+        for k, v in data.items():
+            if k.startswith('_') or type(v) is not dict or not k.isnumeric():
+                self.misc_data[k] = v
+            else:
+                self.settings[k] = ServerConfig(self, k, **v)
+
+        try:
+            # noinspection PyUnresolvedReferences
+            self.analytics = None if self.replay else CogAnalytics(self)
+        except Exception as e:
+            self.bot.logger.exception(e)
+            self.analytics = None
+
+        self._list_functions = OrderedDict([
+            ('help'       , self._list_command_help),
+            ('enabled'    , self._list_command_enabled),
+            ('mode'       , self._list_command_mode),
+            ('overlay'    , self._list_command_overlay),
+            ('add'        , self._list_command_add),
+            ('remove'     , self._list_command_remove),
+            ('clear'      , self._list_command_clear),
+            ('cleanup'    , self._list_command_cleanup),
+            ('invert'     , self._list_command_invert),
+            ('link'       , self._list_command_link),
+            ('unlink'     , self._list_command_unlink),
+            ('replace'    , self._list_command_replace),
+            ('union'      , self._list_command_union),
+            ('difference' , self._list_command_difference),
+            ('intersect'  , self._list_command_intersect),
+            ('symdiff'    , self._list_command_symdiff)
+        ])
+
+        self._pattern_loader = self.bot.loop.create_task(self.load_patterns())
+        self.ready = True
+
+    def __unload(self):
+        self.ready = False
+
+        for job in self._scans.values():
+            job.task.cancel()
+
+        for task in self._shadow_tasks:
+            task.cancel()
+
+        self._pattern_loader.cancel()
+        self.deleter.cancel()
+        self.batcher.cancel()
+
+        self.executor.shutdown(wait=True)
+        self.diagnostic_executor.shutdown(wait=True)
+        self.shadow_executor.shutdown(wait=True)
+        self.save()
+
+    def save(self):
+        if self.replay:
+            return
+
+        data = {'_schema_version': 2}
+        data.update(self.misc_data)
+        data.update({k: v.to_json() for k, v in self.settings.items()})
+        dataIO.save_json(JSON_PATH, data)
+
+        # Every filter, list and exemption change is saved, so this is where eligibility goes stale
+        for settings in self.settings.values():
+            settings.lists_changed()
+
+    @commands.group(name='recensor', pass_context=True, invoke_without_command=True, no_pm=True, rest_is_raw=True)
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor(self, ctx, filter_name: str, setting_name: str = None, *, options):
+        """
+        Configure regular expression censorship
+
+        If a filter name is provided instead of a subcommand:
+        - If no command is provided, invoke [p]recensor show filter_name
+        - Otherwise, invoke [p]recensor set setting_name filter_name options...
+        """
+        if ctx.invoked_subcommand is not None:
+            return
+        elif setting_name:
+            new_view = '%s "%s"' % (setting_name, filter_name)
+
+            if options:
+                new_view += ' ' + options
+
+            ctx.view = StringView(new_view)
+            await self.recensor_set.invoke(ctx)
+        elif filter_name in self.recensor_set.commands:
+            new_view = filter_name
+
+            if setting_name:
+                new_view += ' ' + setting_name
+
+            if options:
+                new_view += ' ' + options
+
+            ctx.view = StringView(new_view)
+            await self.recensor_set.invoke(ctx)
+        else:
+            settings = self.settings.get(ctx.message.server.id)
+            name = filter_name and filter_name.lower()
+
+            if not (settings and settings.get_filter(name)):
+                await self.bot.say(warning('There is no command or filter in this server named "%s".' % name))
+                return
+
+            ctx.command = self.recensor_list
+            await ctx.invoke(self.recensor_list, filter_name)
+
+    @recensor.command(pass_context=True, name='help')
+    async def recensor_help(self, ctx):
+        """
+        Posts links to online reference material
+        """
+        await self.bot.say(
+            "ReCensor manual: <https://github.com/calebj/calebj-cogs/#recensor>\n"
+            "A how-to for Python's regex: <https://docs.python.org/3/howto/regex.html>\n"
+            "Full docs on regex syntax: <https://docs.python.org/3/library/re.html#regular-expression-syntax>"
+        )
+
+    @recensor.command(pass_context=True, name='list', aliases=['show'])
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_list(self, ctx, filter_name: str = None):
+        """
+        Displays all or one filter(s)
+
+        If no filter_name is specified, show all filters + server info.
+        If filter_name is 'server', only show server info.
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+        filter_name = filter_name and filter_name.lower()
+
+        if not (settings and settings.filters):
+            await self.bot.say(info('There are no filters in this server to show.'))
+            return
+        elif filter_name and filter_name != 'server' and not settings.get_filter(filter_name):
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % filter_name))
+            return
+
+        def format_list(_filter: FilterBase, name: str, elaborate_link: bool = False):
+            _list = getattr(_filter, name)
+            lines = []
+            linked = (_list.parent is not _filter)
+
+            if isinstance(_filter, Filter) and linked:  # note: server lists won't ever be linked
+                ult_parent = _list.parent
+                parent = _filter.links[name]
+                lines.append('Linked to: ' + parent.name)
+
+                if ult_parent != parent:
+                    lines.append('Link dest: ' + ult_parent.name)
+
+            if not linked or elaborate_link:
+                # lines.append('enabled: ' + ('yes' if _list.enabled else 'no'))
+                lines.append('Mode: ' + ('whitelist' if _list.mode else 'blacklist'))
+
+                if _list.overlay is not None:
+                    lines.append('Overlay: ' + ('yes' if _list.overlay else 'no'))
+
+                item_fmt = MENTIONS_BY_DATACLASS.get(_list.item_type, '#%s')
+
+                if _list.items:
+                    lines.append('Items (%i):' % len(_list.items))
+                    items = [(item_fmt % i) for i in _list.items]
+                    items.sort()
+                    lines.extend(items)
+                else:
+                    lines.append('Items: (none)')
+
+            return '\n'.join(lines)
+
+        def format_params(obj):
+            order = ['Mode', 'ASCIIfy', 'Privilege exempt', 'Override', 'Position',
+                     'Attachment Header', 'Multi-message', 'Multi-message join', 'Fused filter sets',
+                     'Sequence lookback', 'Shadow']
+
+            params = {
+                'Privilege exempt' : ('yes' if obj.priv_exempt else 'no'),
+                'ASCIIfy'          : ('yes' if obj.asciify else 'no'),
+            }
+
+            if type(obj) is ServerConfig:
+                params['Fused filter sets'] = 'yes' if obj.fused else 'no'
+                params['Sequence lookback'] = ('%i chars' % obj.seq_lookback) if obj.seq_lookback else 'full'
+
+            if type(obj) is Filter:
+                params.update({
+                    'Enabled'           : ('yes' if obj.enabled else 'no'),
+                    'Mode'              : ('white' if obj.mode else 'black'),
+                    'Override'          : ('yes' if obj.override else 'no'),
+                    'Multi-message'     : ('yes' if obj.multi_msg else 'no'),
+                    'Flags'             : obj.flags or '(none)',
+                    'Position'          : obj.position.value,
+                    'Attachment Header' : ('yes' if obj.attachment_header else 'no'),
+                    'Shadow'            : ('%g%% of messages' % (obj.shadow * 100)) if obj.shadow else 'no'
+                })
 
                 if obj.multi_msg:
                     if obj.multi_msg_join:
@@ -1455,290 +3971,654 @@ class ReCensor:
                     else:
                         params['Multi-message'] += ', joined with `""` (empty string)'
 
-                    if obj.multi_msg_group:
-                        params['Multi-message'] += ', group #%i' % obj.multi_msg_group
+                    if obj.multi_msg_group:
+                        params['Multi-message'] += ', group #%i' % obj.multi_msg_group
+
+                if obj.priv_exempt is None:
+                    params['Privilege exempt'] = 'inherited (%s)' % ('yes' if obj.parent.priv_exempt else 'no')
+
+                if obj.asciify is None:
+                    params['ASCIIfy'] = 'inherited (%s)' % ('yes' if obj.parent.asciify else 'no')
+
+            return '\n'.join((k + ': ' + params[k]) for k in order if k in params)
+
+        if filter_name is None:
+            objects = [settings] + [v for k, v in sorted(settings.filters.items())]
+        elif filter_name == 'server':
+            objects = [settings]
+        else:
+            objects = [settings.get_filter(filter_name)]
+
+        embeds = []
+
+        for item in objects:
+            description = format_params(item)
+
+            if isinstance(item, ServerConfig):
+                title = 'Server Configuration/Defaults'
+                color = discord.Color.blue()
+            else:
+                title = 'Filter: ' + item.name
+                pattern_name = 'Pattern'
+
+                if not item.predicate:
+                    pattern_name += ' (INVALID!)'
+
+                description += ('\n\n%s:\n' % pattern_name) + box(item.pattern)
+                if item.quarantine:
+                    title += ' (QUARANTINED)'
+                    color = discord.Color.orange()
+                elif item.enabled:
+                    color = discord.Color.green() if item.mode else discord.Color.red()
+                else:
+                    title += ' (shadow)' if item.shadow and not item.multi_msg else ' (disabled)'
+                    color = discord.Color.dark_green() if item.mode else discord.Color.dark_red()
+
+            embed = discord.Embed(title=title, description=description, color=color)
+
+            for list_name in ['channels_list', 'roles_list']:
+                field_name = list_name.replace('_', ' ').title()
+
+                if not getattr(item, list_name).enabled:
+                    field_name += ' (disabled)'
+
+                embed.add_field(name=field_name, value=format_list(item, list_name, elaborate_link=bool(filter_name)))
+
+            if isinstance(item, Filter):
+                flags_val = '\n'.join('`%c` - %s' % (k, FLAGS_DESC[k]) for k in item.flags) or '(none)'
+                embed.add_field(name='Flags', value=flags_val)
+
+                if item.flash_sec == -1:
+                    flash_status = 'disabled'
+                elif item.flash_dm:
+                    flash_status = 'via DM'
+                else:
+                    flash_status = ('%ds' % item.flash_sec) if item.flash_sec else 'indefinite'
+
+                embed.add_field(name='Trigger Message (%s)' % flash_status,
+                                value=item.flash_msg or '*(not set)*', inline=False)
+
+                if item.quarantine:
+                    embed.add_field(name='Quarantine', inline=False,
+                                    value='%s (at %s UTC). Release with `%srecensor release %s`.'
+                                          % (item.quarantine['reason'], item.quarantine['time'][:19],
+                                             ctx.prefix, item.name))
+
+            embeds.append(embed)
+
+        for embed in embeds:
+            await self.bot.say(embed=embed)
+
+    @recensor.command(pass_context=True, name='create', aliases=['add'], rest_is_raw=True)
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_create(self, ctx, name: str, *, pattern: str = None):
+        """
+        Creates a new filter
+        """
+        server = ctx.message.server
+        name = name.lower()
+        name_check = self.check_name(ctx, name)
+        settings = self.settings.get(server.id)
+        pattern = pattern.lstrip(' ')
+        kwargs = {}
+
+        if len(pattern) >= 2 and pattern[0] == pattern[-1] == '"':
+            pattern = pattern[1:-1]
 
-                if obj.priv_exempt is None:
-                    params['Privilege exempt'] = 'inherited (%s)' % ('yes' if obj.parent.priv_exempt else 'no')
+        if name_check:
+            await self.bot.say(name_check)
+            return
+        elif not settings:
+            self.settings[server.id] = settings = ServerConfig(self, server.id)
 
-                if obj.asciify is None:
-                    params['ASCIIfy'] = 'inherited (%s)' % ('yes' if obj.parent.asciify else 'no')
+        if pattern:
+            try:
+                re.compile(pattern, flags_to_int(DEFAULT_FLAGS))
+            except Exception as e:
+                await self.bot.say(error("Error compiling regular expression:\n") +
+                                   box(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
+                return
 
-            return '\n'.join((k + ': ' + params[k]) for k in order if k in params)
+            inline_flags = re.match(r"^\(\?([a-z]+)\)(.*)", pattern, re.IGNORECASE | re.DOTALL)
 
-        if filter_name is None:
-            objects = [settings] + [v for k, v in sorted(settings.filters.items())]
-        elif filter_name == 'server':
-            objects = [settings]
+            if inline_flags:
+                flags, pattern = inline_flags.groups()
+                kwargs['flags'] = ''.join(sorted(set(flags.upper()).intersection(FLAGS_DESC)))
+                desc = 'and pattern set (auto-converted inline flags).'
+            else:
+                desc = 'and pattern set.'
+
+            kwargs['pattern'] = pattern
         else:
-            objects = [settings.get_filter(filter_name)]
+            desc = ''
 
-        embeds = []
+        try:
+            settings.add_filter(name, **kwargs)
+        except Exception as e:
+            await self.bot.say(error(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
+            return
 
-        for item in objects:
-            description = format_params(item)
+        self.save()
+        await self.bot.say(info('Filter created%s. Configure it with `%srecensor %s [setting] [options]`'
+                                % (desc, ctx.prefix, name)))
 
-            if isinstance(item, ServerConfig):
-                title = 'Server Configuration/Defaults'
-                color = discord.Color.blue()
-            else:
-                title = 'Filter: ' + item.name
-                pattern_name = 'Pattern'
+    @recensor.command(pass_context=True, name='delete', aliases=['rm'])
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_delete(self, ctx, name: str):
+        """
+        Deletes a filter
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+        name = name.lower()
 
-                if not item.predicate:
-                    pattern_name += ' (INVALID!)'
+        if not (settings and settings.get_filter(name)):
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
 
-                description += ('\n\n%s:\n' % pattern_name) + box(item.pattern)
-                if item.enabled:
-                    color = discord.Color.green() if item.mode else discord.Color.red()
-                else:
-                    title += ' (disabled)'
-                    color = discord.Color.dark_green() if item.mode else discord.Color.dark_red()
+        if await self.confirm_thing(ctx, thing='delete the `%s` filter' % name):
+            try:
+                settings.delete_filter(name)
+            except Exception as e:
+                await self.bot.say(error(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
+                return
 
-            embed = discord.Embed(title=title, description=description, color=color)
+            self.save()
+            await self.bot.say(info("Filter deleted."))
 
-            for list_name in ['channels_list', 'roles_list']:
-                field_name = list_name.replace('_', ' ').title()
+    @recensor.command(pass_context=True, name='rename')
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_rename(self, ctx, name: str, new_name: str):
+        """
+        Renames a filter
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+        name = name.lower()
+        new_name = new_name.lower()
+        name_check = self.check_name(ctx, new_name)
 
-                if not getattr(item, list_name).enabled:
-                    field_name += ' (disabled)'
+        if not (settings and settings.get_filter(name)):
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        if name_check:
+            await self.bot.say(name_check)
+            return
 
-                embed.add_field(name=field_name, value=format_list(item, list_name, elaborate_link=bool(filter_name)))
+        try:
+            settings.rename_filter(name, new_name)
+        except Exception as e:
+            await self.bot.say(error(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
+            return
+
+        self.save()
+        await self.bot.say(info("Successfully renamed '%s' to '%s'." % (name, new_name)))
+
+    @recensor.command(pass_context=True, name='copy')
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_copy(self, ctx, name: str, new_name: str, linked: bool = False):
+        """
+        Copies an existing filter, with optional link
+
+        If the linked argument is a true-ish value, the new filter's lists will be linked to the original's
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+        name = name.lower()
+        new_name = new_name.lower()
+        name_check = self.check_name(ctx, new_name)
+
+        if not (settings and settings.get_filter(name)):
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        if name_check:
+            await self.bot.say(name_check)
+            return
+
+        try:
+            settings.copy_filter(name, new_name, link=bool(linked))
+        except Exception as e:
+            await self.bot.say(error(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
+            return
+
+        self.save()
+        list_op = 'linked' if linked else 'duplicated'
+        await self.bot.say(info("Created a copy of '%s' named '%s' with %s lists." % (name, new_name, list_op)))
+
+    @recensor.group(pass_context=True, name='server')
+    @checks.admin_or_permissions(manage_server=True)
+    async def recensor_server(self, ctx):
+        """
+        Show or configure server settings
+
+        If no subcommand is provided, invokes [p]recensor show server
+        """
+        if ctx.invoked_subcommand is None:
+            return await self.bot.send_cmd_help(ctx)
+        elif ctx.invoked_subcommand is self.recensor_server:
+            ctx.view = StringView('SERVER')
+            return await self.recensor_list.invoke(ctx)
+
+    @recensor_server.command(pass_context=True, name='priv-exempt')
+    async def recensor_server_priv_exempt(self, ctx, priv_exempt: bool = None):
+        """
+        Configures privileged user exemption
+
+        This setting acts as the default for when a filter's priv_exempt
+        this parameter is set to 'inherit'. If enabled, the server owner,
+        moderator role and admin role (according to [p]set) are ignored by
+        the filter.
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+
+        if type(priv_exempt) not in (bool, type(None)):
+            priv_exempt = await ctx.command.do_conversion(ctx, bool, priv_exempt)
+
+        if not settings:
+            self.settings[server.id] = settings = ServerConfig(self, server.id)
+            self.save()
+
+        if priv_exempt is None:
+            priv_exempt = settings.priv_exempt
+            adj = 'currently'
+        elif settings.priv_exempt == priv_exempt:
+            adj = 'already'
+        else:
+            adj = 'now'
+            settings.priv_exempt = priv_exempt
+            self.save()
+
+        desc = 'enabled' if priv_exempt else 'disabled'
+        await self.bot.say('Server-wide privilege user exemption for is %s %s by default.' % (adj, desc))
+
+    @recensor_server.command(pass_context=True, name='asciify')
+    async def recensor_server_asciify(self, ctx, asciify: bool = None):
+        """
+        Show/set server-wide ASCIIfy toggle
+
+        If enabled, the filters will attempt to reduce unicode text to its equivalent ASCII before matching by default
+
+        For full effectiveness, unidecode must be installed
+
+        asciify must be a boolean option or left blank to show the current setting
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+
+        if type(asciify) not in (bool, type(None)):
+            asciify = await ctx.command.do_conversion(ctx, bool, asciify)
+
+        if not settings:
+            self.settings[server.id] = settings = ServerConfig(self, server.id)
+            self.save()
+
+        if asciify is None:
+            asciify = settings.asciify
+            adj = 'currently'
+        elif settings.asciify == asciify:
+            adj = 'already'
+        else:
+            adj = 'now'
+            settings.asciify = asciify
+            self.save()
+
+        msg = 'ASCIIfy is %s %s by default.' % (adj, 'enabled' if asciify else 'disabled')
+
+        if not unidecode:
+            msg += '\n\n' + warning("Note that the `unidecode` package is not installed on the bot, so this feature "
+                                    "will not be fully functional. The bot owner should run:\n"
+                                    "`%sdebug bot.pip_install('unidecode')`\nand then reload this cog." % ctx.prefix)
+
+        await self.bot.say(msg)
+
+    @recensor_server.command(pass_context=True, name='fused')
+    async def recensor_server_fused(self, ctx, fused: bool = None):
+        """
+        Show/set fused filter set mode
+
+        If enabled, filters with the same flags and position are combined into a single pattern,
+        so that a message that matches none of them is only scanned once. Filters that use
+        backreferences or named groups are always run on their own. Matching behavior is unchanged.
+
+        fused must be a boolean option or left blank to show the current setting
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+
+        if type(fused) not in (bool, type(None)):
+            fused = await ctx.command.do_conversion(ctx, bool, fused)
+
+        if not settings:
+            self.settings[server.id] = settings = ServerConfig(self, server.id)
+            self.save()
+
+        if fused is None:
+            fused = settings.fused
+            adj = 'currently'
+        elif settings.fused == fused:
+            adj = 'already'
+        else:
+            adj = 'now'
+            settings.fused = fused
+            settings.bump_version()
+            self.save()
+
+        await self.bot.say('Fused filter sets are %s %s.' % (adj, 'enabled' if fused else 'disabled'))
+
+    @recensor_server.command(pass_context=True, name='lookback')
+    async def recensor_server_lookback(self, ctx, chars: int = None):
+        """
+        Show/set how far back multi-message filters look for new matches
+
+        When a message is added to a sequence, multi-message blacklists that already came up clean
+        only rescan the text that could reach the new message. For filters with a bounded match
+        length that's exact, but filters that can match arbitrarily long text (e.g. using * or +)
+        rescan the whole sequence unless a lookback is set here.
+
+        Setting this trades accuracy for speed: matches longer than the lookback that span the
+        new message can be missed. Set to 0 to always rescan (the default).
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+
+        if chars is not None and chars < 0:
+            await self.bot.say('Lookback must be 0 or more characters.')
+            return
+        elif not settings:
+            self.settings[server.id] = settings = ServerConfig(self, server.id)
+            self.save()
 
-            if isinstance(item, Filter):
-                flags_val = '\n'.join('`%c` - %s' % (k, FLAGS_DESC[k]) for k in item.flags) or '(none)'
-                embed.add_field(name='Flags', value=flags_val)
+        if chars is None:
+            chars = settings.seq_lookback
+            adj = 'currently'
+        elif settings.seq_lookback == chars:
+            adj = 'already'
+        else:
+            adj = 'now'
+            settings.seq_lookback = chars
+            self.save()
 
-                if item.flash_sec == -1:
-                    flash_status = 'disabled'
-                elif item.flash_dm:
-                    flash_status = 'via DM'
-                else:
-                    flash_status = ('%ds' % item.flash_sec) if item.flash_sec else 'indefinite'
+        if chars:
+            await self.bot.say('Multi-message lookback is %s %i characters.' % (adj, chars))
+        else:
+            await self.bot.say('Multi-message lookback is %s unlimited.' % adj)
 
-                embed.add_field(name='Trigger Message (%s)' % flash_status,
-                                value=item.flash_msg or '*(not set)*', inline=False)
+    @recensor_server.command(pass_context=True, name='channels')
+    async def recensor_server_channels(self, ctx, operation: str = None, *options):
+        """
+        Configures the server-wide channels list
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
 
-            embeds.append(embed)
+        if not settings:
+            self.settings[server.id] = settings = ServerConfig(self, server.id)
+            self.save()
+        elif not operation:
+            ctx.view = StringView('SERVER')
+            await self.recensor_list.invoke(ctx)
 
-        for embed in embeds:
-            await self.bot.say(embed=embed)
+        await self._list_command_main(ctx, settings, 'channels_list', operation, *options)
 
-    @recensor.command(pass_context=True, name='create', aliases=['add'], rest_is_raw=True)
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_create(self, ctx, name: str, *, pattern: str = None):
+    @recensor_server.command(pass_context=True, name='roles')
+    async def recensor_server_roles(self, ctx, operation: str = None, *options):
         """
-        Creates a new filter
+        Configure the server-wide roles list
         """
         server = ctx.message.server
-        name = name.lower()
-        name_check = self.check_name(ctx, name)
         settings = self.settings.get(server.id)
-        pattern = pattern.lstrip(' ')
-        kwargs = {}
 
-        if len(pattern) >= 2 and pattern[0] == pattern[-1] == '"':
-            pattern = pattern[1:-1]
+        if not settings:
+            self.settings[server.id] = settings = ServerConfig(self, server.id)
+            self.save()
+        elif not operation:
+            ctx.view = StringView('SERVER')
+            await self.recensor_list.invoke(ctx)
 
-        if name_check:
-            await self.bot.say(name_check)
-            return
-        elif not settings:
-            self.settings[server.id] = settings = ServerConfig(self)
+        await self._list_command_main(ctx, settings, 'roles_list', operation, *options)
 
-        if pattern:
-            try:
-                re.compile(pattern, flags_to_int(DEFAULT_FLAGS))
-            except Exception as e:
-                await self.bot.say(error("Error compiling regular expression:\n") +
-                                   box(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
-                return
+    @recensor.group(pass_context=True, name='set', hidden=True, invoke_without_command=True, rest_is_raw=True)
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_set(self, ctx, filter_name: str, setting_name: str = None, *, options):
+        """
+        Configures filter parameters
 
-            inline_flags = re.match(r"^\(\?([a-z]+)\)(.*)", pattern, re.IGNORECASE | re.DOTALL)
+        If a filter name is is provided but no setting, invokes [p]recensor show filter_name.
+        If filter_name is 'server', redirect to [p]recensor server
+        Otherwise, if a filter name and subcommand are provided, invokes that subcommand.
+        """
+        if filter_name.lower() == 'server':
+            new_view = []
 
-            if inline_flags:
-                flags, pattern = inline_flags.groups()
-                kwargs['flags'] = ''.join(sorted(set(flags.upper()).intersection(FLAGS_DESC)))
-                desc = 'and pattern set (auto-converted inline flags).'
+            if setting_name:
+                new_cmd = self.recensor_server
+                new_view.append(setting_name)
             else:
-                desc = 'and pattern set.'
+                new_cmd = self.recensor_list
+                new_view.append('SERVER')
 
-            kwargs['pattern'] = pattern
+            if options:
+                new_view.append(options)
+
+            ctx.view = StringView(' '.join(new_view))
+            return await new_cmd.invoke(ctx)
         else:
-            desc = ''
+            settings = self.settings.get(ctx.message.server.id)
+            if not (settings and settings.get_filter(filter_name)):
+                return await self.bot.send_cmd_help(ctx)
 
-        try:
-            settings.add_filter(name, **kwargs)
-        except Exception as e:
-            await self.bot.say(error(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
-            return
+        if setting_name in [None, self.recensor_list.name, *self.recensor_list.aliases]:
+            ctx.view = StringView('"%s"' % filter_name)
+            return await self.recensor_list.invoke(ctx)
+        elif setting_name in self.recensor_set.commands:
+            new_view = '"%s"' % filter_name
 
-        self.save()
-        await self.bot.say(info('Filter created%s. Configure it with `%srecensor %s [setting] [options]`'
-                                % (desc, ctx.prefix, name)))
+            if options:
+                new_view += ' ' + options
 
-    @recensor.command(pass_context=True, name='delete', aliases=['rm'])
+            ctx.view = StringView(new_view)
+            return await self.recensor_set.commands[setting_name].invoke(ctx)
+        else:
+            return await self.bot.send_cmd_help(ctx)
+
+    @recensor_set.command(pass_context=True, name='enabled')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_delete(self, ctx, name: str):
+    async def recensor_set_enabled(self, ctx, filter_name: str, enabled: bool = None):
         """
-        Deletes a filter
+        Show/set filter enabled/active toggle
+
+        enabled must be a boolean option or left blank to show the current setting
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
-        name = name.lower()
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-        if not (settings and settings.get_filter(name)):
+        if type(enabled) not in (bool, type(None)):
+            enabled = await ctx.command.do_conversion(ctx, bool, enabled)
+
+        if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-
-        if await self.confirm_thing(ctx, thing='delete the `%s` filter' % name):
-            try:
-                settings.delete_filter(name)
-            except Exception as e:
-                await self.bot.say(error(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
-                return
-
+        elif enabled is None:
+            enabled = _filter.enabled
+            adj = 'currently'
+        elif _filter.enabled == enabled:
+            adj = 'already'
+        else:
+            adj = 'now'
+            _filter.enabled = enabled
+            settings.update_order()
             self.save()
-            await self.bot.say(info("Filter deleted."))
 
-    @recensor.command(pass_context=True, name='rename')
+        desc = 'enabled' if enabled else 'disabled'
+        await self.bot.say('%s is %s %s.' % (_filter.name, adj, desc))
+
+    @recensor_set.command(pass_context=True, name='disable', hidden=True)
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_rename(self, ctx, name: str, new_name: str):
+    async def recensor_set_disable(self, ctx, filter_name: str):
         """
-        Renames a filter
+        Disables a filter
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
-        name = name.lower()
-        new_name = new_name.lower()
-        name_check = self.check_name(ctx, new_name)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-        if not (settings and settings.get_filter(name)):
+        if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        if name_check:
-            await self.bot.say(name_check)
-            return
-
-        try:
-            settings.rename_filter(name, new_name)
-        except Exception as e:
-            await self.bot.say(error(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
-            return
+        elif not _filter.enabled:
+            adj = 'already'
+        else:
+            adj = 'now'
+            _filter.enabled = False
+            settings.update_order()
+            self.save()
 
-        self.save()
-        await self.bot.say(info("Successfully renamed '%s' to '%s'." % (name, new_name)))
+        await self.bot.say('%s is %s disabled.' % (_filter.name, adj))
 
-    @recensor.command(pass_context=True, name='copy')
+    @recensor_set.command(pass_context=True, name='enable', hidden=True)
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_copy(self, ctx, name: str, new_name: str, linked: bool = False):
+    async def recensor_set_enable(self, ctx, filter_name: str):
         """
-        Copies an existing filter, with optional link
-
-        If the linked argument is a true-ish value, the new filter's lists will be linked to the original's
+        Enables a filter
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
-        name = name.lower()
-        new_name = new_name.lower()
-        name_check = self.check_name(ctx, new_name)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-        if not (settings and settings.get_filter(name)):
+        if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        if name_check:
-            await self.bot.say(name_check)
-            return
-
-        try:
-            settings.copy_filter(name, new_name, link=bool(linked))
-        except Exception as e:
-            await self.bot.say(error(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
-            return
+        elif _filter.enabled:
+            adj = 'already'
+        else:
+            adj = 'now'
+            _filter.enabled = True
+            settings.update_order()
+            self.save()
 
-        self.save()
-        list_op = 'linked' if linked else 'duplicated'
-        await self.bot.say(info("Created a copy of '%s' named '%s' with %s lists." % (name, new_name, list_op)))
+        await self.bot.say('%s is %s enabled.' % (_filter.name, adj))
 
-    @recensor.group(pass_context=True, name='server')
-    @checks.admin_or_permissions(manage_server=True)
-    async def recensor_server(self, ctx):
+    @recensor_set.command(pass_context=True, name='override')
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_set_override(self, ctx, filter_name: str, override: bool = None):
         """
-        Show or configure server settings
+        Show/set filter override/priority toggle
 
-        If no subcommand is provided, invokes [p]recensor show server
+        override must be a boolean option or left blank to show the current setting
         """
-        if ctx.invoked_subcommand is None:
-            return await self.bot.send_cmd_help(ctx)
-        elif ctx.invoked_subcommand is self.recensor_server:
-            ctx.view = StringView('SERVER')
-            return await self.recensor_list.invoke(ctx)
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
+
+        if type(override) not in (bool, type(None)):
+            override = await ctx.command.do_conversion(ctx, bool, override)
+
+        if not _filter:
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        elif override is None:
+            override = _filter.override
+            adj = 'currently'
+        elif _filter.override == override:
+            adj = 'already'
+        else:
+            adj = 'now'
+            _filter.override = override
+            settings.update_order()
+            self.save()
+
+        desc = 'enabled' if override else 'disabled'
+        await self.bot.say('Filter override for %s is %s %s.' % (_filter.name, adj, desc))
 
-    @recensor_server.command(pass_context=True, name='priv-exempt')
-    async def recensor_server_priv_exempt(self, ctx, priv_exempt: bool = None):
+    @recensor_set.command(pass_context=True, name='priv-exempt')
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_set_priv_exempt(self, ctx, filter_name: str, priv_exempt: str = None):
         """
-        Configures privileged user exemption
+        Show/set filter privileged user exemption toggle
 
-        This setting acts as the default for when a filter's priv_exempt
-        this parameter is set to 'inherit'. If enabled, the server owner,
-        moderator role and admin role (according to [p]set) are ignored by
-        the filter.
+        priv_exempt must be a boolean option, 'inherit', or left blank to show the current setting
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-        if type(priv_exempt) not in (bool, type(None)):
-            priv_exempt = await ctx.command.do_conversion(ctx, bool, priv_exempt)
+        inherit = object()
 
-        if not settings:
-            self.settings[server.id] = settings = ServerConfig(self)
-            self.save()
+        if type(priv_exempt) is str and priv_exempt.lower().strip("'`\" ") == 'inherit':
+            priv_exempt = inherit
+        elif type(priv_exempt) not in (bool, type(None)):
+            priv_exempt = await ctx.command.do_conversion(ctx, bool, priv_exempt)
 
-        if priv_exempt is None:
-            priv_exempt = settings.priv_exempt
+        if not _filter:
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        elif priv_exempt is None:
+            priv_exempt = _filter.priv_exempt
             adj = 'currently'
-        elif settings.priv_exempt == priv_exempt:
+        elif _filter.priv_exempt == priv_exempt or (_filter.priv_exempt is None and priv_exempt is inherit):
             adj = 'already'
         else:
             adj = 'now'
-            settings.priv_exempt = priv_exempt
+            _filter.priv_exempt = None if priv_exempt is inherit else priv_exempt
             self.save()
 
-        desc = 'enabled' if priv_exempt else 'disabled'
-        await self.bot.say('Server-wide privilege user exemption for is %s %s by default.' % (adj, desc))
+        if priv_exempt in (None, inherit):
+            desc = 'inherit (%s)' % ('enabled' if _filter.parent.priv_exempt else 'disabled')
+        else:
+            desc = 'enabled' if priv_exempt else 'disabled'
 
-    @recensor_server.command(pass_context=True, name='asciify')
-    async def recensor_server_asciify(self, ctx, asciify: bool = None):
+        await self.bot.say('Privilege user exemption for %s is %s %s.' % (_filter.name, adj, desc))
+
+    @recensor_set.command(pass_context=True, name='asciify')
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_set_asciify(self, ctx, filter_name: str, asciify: str = None):
         """
-        Show/set server-wide ASCIIfy toggle
+        Show/set filter ASCIIfy toggle
 
-        If enabled, the filters will attempt to reduce unicode text to its equivalent ASCII before matching by default
+        If enabled, the filter will attempt to reduce unicode text to its equivalent ASCII before matching
 
         For full effectiveness, unidecode must be installed
 
-        asciify must be a boolean option or left blank to show the current setting
+        asciify must be a boolean option, 'inherit', or left blank to show the current setting
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-        if type(asciify) not in (bool, type(None)):
-            asciify = await ctx.command.do_conversion(ctx, bool, asciify)
+        inherit = object()
 
-        if not settings:
-            self.settings[server.id] = settings = ServerConfig(self)
-            self.save()
+        if type(asciify) is str and asciify.lower().strip("'`\" ") == 'inherit':
+            asciify = inherit
+        elif type(asciify) not in (bool, type(None)):
+            asciify = await ctx.command.do_conversion(ctx, bool, asciify)
 
-        if asciify is None:
-            asciify = settings.asciify
+        if not _filter:
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        elif asciify is None:
+            asciify = _filter.asciify
             adj = 'currently'
-        elif settings.asciify == asciify:
+        elif _filter.asciify == asciify or (_filter.asciify is None and asciify is inherit):
             adj = 'already'
         else:
             adj = 'now'
-            settings.asciify = asciify
+            _filter.asciify = None if asciify is inherit else asciify
             self.save()
 
-        msg = 'ASCIIfy is %s %s by default.' % (adj, 'enabled' if asciify else 'disabled')
+        if asciify in (None, inherit):
+            desc = 'inherit (%s)' % ('enabled' if _filter.parent.asciify else 'disabled')
+        else:
+            desc = 'enabled' if asciify else 'disabled'
+
+        msg = 'ASCIIfy for %s is %s %s.' % (_filter.name, adj, desc)
 
         if not unidecode:
             msg += '\n\n' + warning("Note that the `unidecode` package is not installed on the bot, so this feature "
@@ -1747,122 +4627,173 @@ class ReCensor:
 
         await self.bot.say(msg)
 
-    @recensor_server.command(pass_context=True, name='channels')
-    async def recensor_server_channels(self, ctx, operation: str = None, *options):
+    @recensor_set.command(pass_context=True, name='multi-msg', aliases=['multi'])
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_set_multi_msg(self, ctx, filter_name: str, multi_msg: bool = None):
         """
-        Configures the server-wide channels list
+        Show/set filter multi-message search toggle
+
+        When enabled, the filter will check the last 64 messages or 10 minutes
+        of messages per user per channel for a match. Matched spans of messages
+        will be deleted as a group. Only works in blacklist mode.
+
+        multi_msg must be a boolean option or left blank to show the current setting
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-        if not settings:
-            self.settings[server.id] = settings = ServerConfig(self)
+        if type(multi_msg) not in (bool, type(None)):
+            multi_msg = await ctx.command.do_conversion(ctx, bool, multi_msg)
+
+        if not _filter:
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        elif multi_msg is None:
+            multi_msg = _filter.multi_msg
+            adj = 'currently'
+        elif _filter.multi_msg == multi_msg:
+            adj = 'already'
+        else:
+            adj = 'now'
+            _filter.multi_msg = multi_msg
             self.save()
-        elif not operation:
-            ctx.view = StringView('SERVER')
-            await self.recensor_list.invoke(ctx)
 
-        await self._list_command_main(ctx, settings, 'channels_list', operation, *options)
+        desc = 'enabled' if multi_msg else 'disabled'
+        msg = 'Multi-message search for %s is %s %s.' % (_filter.name, adj, desc)
 
-    @recensor_server.command(pass_context=True, name='roles')
-    async def recensor_server_roles(self, ctx, operation: str = None, *options):
+        await self.bot.say(msg)
+
+    @recensor_set.command(pass_context=True, name='multi-join')
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_set_multi_msg_join(self, ctx, filter_name: str, join: str = None):
         """
-        Configure the server-wide roles list
+        Show/set multi-message join
+
+        join must be an escaped string (double quotes can be used for spaces), or left blank to show the current setting
+
+        For example, "\\n" is translated into a newline for the join, and " " is stored as a simple space.
+        "" (an empty string) is also acceptable.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-        if not settings:
-            self.settings[server.id] = settings = ServerConfig(self)
+        join = join and bytes(join, "utf-8").decode("unicode_escape")
+
+        if not _filter:
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        elif join is None:
+            join = _filter.multi_msg_join
+            adj = 'currently'
+        elif _filter.multi_msg_join == join:
+            adj = 'already'
+        else:
+            adj = 'now'
+            _filter.multi_msg_join = join
             self.save()
-        elif not operation:
-            ctx.view = StringView('SERVER')
-            await self.recensor_list.invoke(ctx)
 
-        await self._list_command_main(ctx, settings, 'roles_list', operation, *options)
+        disp = '`"%s"`' % join.encode('unicode_escape').decode()
 
-    @recensor.group(pass_context=True, name='set', hidden=True, invoke_without_command=True, rest_is_raw=True)
+        if join == '':
+            disp += ' (empty string)'
+
+        await self.bot.say('Multi-message join for %s is %s set to %s.' % (_filter.name, adj, disp))
+
+    @recensor_set.command(pass_context=True, name='multi-group')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set(self, ctx, filter_name: str, setting_name: str = None, *, options):
+    async def recensor_set_multi_msg_group(self, ctx, filter_name: str, group: int = None):
         """
-        Configures filter parameters
+        Show/set multi-message group ID
 
-        If a filter name is is provided but no setting, invokes [p]recensor show filter_name.
-        If filter_name is 'server', redirect to [p]recensor server
-        Otherwise, if a filter name and subcommand are provided, invokes that subcommand.
+        If set, the section of a match belonging to this group is deleted instead of the whole series.
+        This does nothing in whitelist mode (it's forced to use the whole match)
         """
-        if filter_name.lower() == 'server':
-            new_view = []
-
-            if setting_name:
-                new_cmd = self.recensor_server
-                new_view.append(setting_name)
-            else:
-                new_cmd = self.recensor_list
-                new_view.append('SERVER')
-
-            if options:
-                new_view.append(options)
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-            ctx.view = StringView(' '.join(new_view))
-            return await new_cmd.invoke(ctx)
+        if not _filter:
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        elif group is None:
+            group = _filter.multi_msg_group
+            adj = 'currently'
+        elif _filter.multi_msg_group == group:
+            adj = 'already'
         else:
-            settings = self.settings.get(ctx.message.server.id)
-            if not (settings and settings.get_filter(filter_name)):
-                return await self.bot.send_cmd_help(ctx)
+            try:
+                compiled = re.compile(_filter.pattern, flags_to_int(_filter.flags))
+            except Exception as e:
+                await self.bot.say(error("Error compiling regular expression:\n") +
+                                   box(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
+                return
 
-        if setting_name in [None, self.recensor_list.name, *self.recensor_list.aliases]:
-            ctx.view = StringView('"%s"' % filter_name)
-            return await self.recensor_list.invoke(ctx)
-        elif setting_name in self.recensor_set.commands:
-            new_view = '"%s"' % filter_name
+            if group > compiled.groups:
+                await self.bot.say(warning("This filter's pattern only has %i groups. Current pattern:\n%s"
+                                           % (compiled.groups, box(_filter.pattern))))
+                return
 
-            if options:
-                new_view += ' ' + options
+            adj = 'now'
+            _filter.multi_msg_group = group
+            self.save()
 
-            ctx.view = StringView(new_view)
-            return await self.recensor_set.commands[setting_name].invoke(ctx)
-        else:
-            return await self.bot.send_cmd_help(ctx)
+        await self.bot.say('Multi-message group for %s is %s %i.' % (_filter.name, adj, group))
 
-    @recensor_set.command(pass_context=True, name='enabled')
+    @recensor_set.command(pass_context=True, name='mode')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_enabled(self, ctx, filter_name: str, enabled: bool = None):
+    async def recensor_set_mode(self, ctx, filter_name: str, mode: str = None):
         """
-        Show/set filter enabled/active toggle
+        Show/set filter matching mode
 
-        enabled must be a boolean option or left blank to show the current setting
+        mode MUST be blacklist, whitelist, or left blank to show the current setting
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
 
-        if type(enabled) not in (bool, type(None)):
-            enabled = await ctx.command.do_conversion(ctx, bool, enabled)
+        if mode.lower().startswith('black'):
+            mode = False
+        elif mode.lower().startswith('white'):
+            mode = True
+        else:
+            return await self.bot.send_cmd_help(ctx)
 
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif enabled is None:
-            enabled = _filter.enabled
+        elif mode is None:
+            mode = _filter.mode
             adj = 'currently'
-        elif _filter.enabled == enabled:
+        elif _filter.mode == mode:
             adj = 'already'
         else:
             adj = 'now'
-            _filter.enabled = enabled
+            _filter.mode = mode
             settings.update_order()
             self.save()
 
-        desc = 'enabled' if enabled else 'disabled'
-        await self.bot.say('%s is %s %s.' % (_filter.name, adj, desc))
+        desc = 'DO' if mode else 'do NOT'
+        await self.bot.say('%s is %s set to only allow messages that %s match its pattern.'
+                           % (_filter.name, adj, desc))
 
-    @recensor_set.command(pass_context=True, name='disable', hidden=True)
+    @recensor_set.command(pass_context=True, name='position')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_disable(self, ctx, filter_name: str):
+    async def recensor_set_position(self, ctx, filter_name: str, position: str = None):
         """
-        Disables a filter
+        Configures a filter's matching position
+
+        Position MUST be one of the following (or left blank to show the current value):
+        - start:    only looks at the beginning of the message
+        - anywhere: scans through the full message looking for a match
+        - full:     the entire message must match, from start to finish
+
+        This does nothing in multi-message whitelist mode (all matches are scanned)
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
@@ -1872,21 +4803,52 @@ class ReCensor:
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif not _filter.enabled:
+
+        try:
+            position = position and POSITION(position)
+        except ValueError:
+            return await self.bot.send_cmd_help(ctx)
+
+        if position is None:
+            position = _filter.position
+            adj = 'currently'
+        elif _filter.position == position:
             adj = 'already'
         else:
             adj = 'now'
-            _filter.enabled = False
-            settings.update_order()
+            _filter.position = position
+            _filter.rebuild_predicate()
             self.save()
 
-        await self.bot.say('%s is %s disabled.' % (_filter.name, adj))
+        if position is POSITION.START:
+            desc = 'only at the beginning of the message'
+        elif position is POSITION.FULL:
+            desc = 'the entire message from start to finish'
+        elif position is POSITION.ANYWHERE:
+            desc = 'anywhere in the message'
+        else:
+            raise ValueError("Unhandled position value, please report this bug.")
 
-    @recensor_set.command(pass_context=True, name='enable', hidden=True)
+        await self.bot.say('%s is %s set to match %s.' % (_filter.name, adj, desc))
+
+    @recensor_set.command(pass_context=True, name='flags')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_enable(self, ctx, filter_name: str):
+    async def recensor_set_flags(self, ctx, filter_name: str, *, flags: str = None):
         """
-        Enables a filter
+        Configures a filter's regex flags
+
+        Python's regex flags are documented here:
+        https://docs.python.org/3/howto/regex.html#compilation-flags
+
+        flags must be a combination of the following (or left blank to show the current setting):
+        - A: Perform ASCII-only matching instead of Unicode matching
+        - I: Do case-insensitive matches
+        - L: Do a locale-aware match (depends on bot host's locale)
+        - M: Make ^ and $ match line start/end instead of the whole message
+        - S: Make . match any character, including newlines
+        - X: Ignore ALL whitespace and #comments in the pattern (for readability)
+
+        Any other characters are ignored.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
@@ -1896,224 +4858,253 @@ class ReCensor:
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif _filter.enabled:
+
+        flags = flags and ''.join(sorted(set(flags.upper()).intersection(FLAGS_DESC)))
+
+        if flags is None:
+            flags = _filter.flags
+            adj = 'currently'
+        elif _filter.flags == flags:
             adj = 'already'
         else:
             adj = 'now'
-            _filter.enabled = True
-            settings.update_order()
+            _filter.flags = flags
+            _filter.rebuild_predicate()
             self.save()
 
-        await self.bot.say('%s is %s enabled.' % (_filter.name, adj))
+        if flags:
+            desc = ':\n' + '\n'.join('`%c` - %s' % (k, FLAGS_DESC[k]) for k in flags)
+        else:
+            desc = ' empty.'
 
-    @recensor_set.command(pass_context=True, name='override')
+        await self.bot.say('Flags for %s are %s%s' % (_filter.name, adj, desc))
+
+    @recensor_set.command(pass_context=True, name='pattern', rest_is_raw=True)
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_override(self, ctx, filter_name: str, override: bool = None):
+    async def recensor_set_pattern(self, ctx, filter_name: str, *, pattern):
         """
-        Show/set filter override/priority toggle
+        Configures a filter's pattern
 
-        override must be a boolean option or left blank to show the current setting
+        Regex how to:
+        https://docs.python.org/3/howto/regex.html#regex-howto
+
+        Full syntax documentation:
+        https://docs.python.org/3/library/re.html#regular-expression-syntax
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
+        pattern = pattern.lstrip()
 
-        if type(override) not in (bool, type(None)):
-            override = await ctx.command.do_conversion(ctx, bool, override)
+        if len(pattern) >= 2 and pattern[0] == pattern[-1] == '"':
+            pattern = pattern[1:-1]
 
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif override is None:
-            override = _filter.override
-            adj = 'currently'
-        elif _filter.override == override:
-            adj = 'already'
+
+        if not pattern:
+            pattern = _filter.pattern
+            desc = 'is currently:\n' + box(pattern)
         else:
-            adj = 'now'
-            _filter.override = override
-            settings.update_order()
+            try:
+                re.compile(pattern, flags_to_int(_filter.flags))
+            except Exception as e:
+                await self.bot.say(error("Error compiling regular expression:\n") +
+                                   box(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
+                return
+
+            inline_flags = re.match(r"^\(\?([a-z]+)\)(.*)", pattern, re.IGNORECASE | re.DOTALL)
+
+            if inline_flags:
+                flags, pattern = inline_flags.groups()
+                _filter.flags = ''.join(sorted(set(flags.upper()).intersection(FLAGS_DESC)))
+                desc = 'set (auto-converted inline flags).'
+            else:
+                desc = 'set.'
+
+            _filter.pattern = pattern
+            _filter.rebuild_predicate()
+
+            if _filter.quarantine:
+                _filter.quarantine = None
+                settings.update_order()
+                desc += ' Quarantine lifted.'
+
             self.save()
 
-        desc = 'enabled' if override else 'disabled'
-        await self.bot.say('Filter override for %s is %s %s.' % (_filter.name, adj, desc))
+        await self.bot.say('Pattern for %s %s' % (_filter.name, desc))
 
-    @recensor_set.command(pass_context=True, name='priv-exempt')
+    @recensor_set.command(pass_context=True, name='attachment')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_priv_exempt(self, ctx, filter_name: str, priv_exempt: str = None):
+    async def recensor_set_attachment(self, ctx, filter_name: str, attachment_header: bool = None):
         """
-        Show/set filter privileged user exemption toggle
+        Show/set filter attachment header
 
-        priv_exempt must be a boolean option, 'inherit', or left blank to show the current setting
+        When enabled, each message will be prepended with {attachment:ATTACHMENT_FILENAME}
+        This allows advanced filtering based on whether an attachment is present, as well as
+        based on the file's full name and/or extension.
+
+        attachment_header must be a boolean option or left blank to show the current setting
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
 
-        inherit = object()
-
-        if type(priv_exempt) is str and priv_exempt.lower().strip("'`\" ") == 'inherit':
-            priv_exempt = inherit
-        elif type(priv_exempt) not in (bool, type(None)):
-            priv_exempt = await ctx.command.do_conversion(ctx, bool, priv_exempt)
+        if type(attachment_header) not in (bool, type(None)):
+            attachment_header = await ctx.command.do_conversion(ctx, bool, attachment_header)
 
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif priv_exempt is None:
-            priv_exempt = _filter.priv_exempt
+        elif attachment_header is None:
+            attachment_header = _filter.attachment_header
             adj = 'currently'
-        elif _filter.priv_exempt == priv_exempt or (_filter.priv_exempt is None and priv_exempt is inherit):
+        elif _filter.attachment_header == attachment_header:
             adj = 'already'
         else:
             adj = 'now'
-            _filter.priv_exempt = None if priv_exempt is inherit else priv_exempt
+            _filter.attachment_header = attachment_header
             self.save()
 
-        if priv_exempt in (None, inherit):
-            desc = 'inherit (%s)' % ('enabled' if _filter.parent.priv_exempt else 'disabled')
-        else:
-            desc = 'enabled' if priv_exempt else 'disabled'
+        desc = 'enabled' if attachment_header else 'disabled'
+        msg = 'Attachment filename headers for %s are %s %s.' % (_filter.name, adj, desc)
 
-        await self.bot.say('Privilege user exemption for %s is %s %s.' % (_filter.name, adj, desc))
+        await self.bot.say(msg)
 
-    @recensor_set.command(pass_context=True, name='asciify')
+    @recensor_set.command(pass_context=True, name='channels')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_asciify(self, ctx, filter_name: str, asciify: str = None):
+    async def recensor_set_channels(self, ctx, filter_name: str, operation: str = None, *options):
         """
-        Show/set filter ASCIIfy toggle
-
-        If enabled, the filter will attempt to reduce unicode text to its equivalent ASCII before matching
-
-        For full effectiveness, unidecode must be installed
-
-        asciify must be a boolean option, 'inherit', or left blank to show the current setting
+        Configure a filter's channels list
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
 
-        inherit = object()
-
-        if type(asciify) is str and asciify.lower().strip("'`\" ") == 'inherit':
-            asciify = inherit
-        elif type(asciify) not in (bool, type(None)):
-            asciify = await ctx.command.do_conversion(ctx, bool, asciify)
-
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif asciify is None:
-            asciify = _filter.asciify
-            adj = 'currently'
-        elif _filter.asciify == asciify or (_filter.asciify is None and asciify is inherit):
-            adj = 'already'
-        else:
-            adj = 'now'
-            _filter.asciify = None if asciify is inherit else asciify
-            self.save()
+        elif not operation:
+            ctx.view = StringView(filter_name)
+            await self.recensor_list.invoke(ctx)
 
-        if asciify in (None, inherit):
-            desc = 'inherit (%s)' % ('enabled' if _filter.parent.asciify else 'disabled')
-        else:
-            desc = 'enabled' if asciify else 'disabled'
+        await self._list_command_main(ctx, _filter, 'channels_list', operation, *options)
 
-        msg = 'ASCIIfy for %s is %s %s.' % (_filter.name, adj, desc)
+    @recensor_set.command(pass_context=True, name='roles')
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_set_roles(self, ctx, filter_name: str, operation: str = None, *options):
+        """
+        Configure a filter's roles list
+        """
+        server = ctx.message.server
+        settings = self.settings.get(server.id)
+        name = filter_name.lower()
+        _filter = settings and settings.get_filter(name)
 
-        if not unidecode:
-            msg += '\n\n' + warning("Note that the `unidecode` package is not installed on the bot, so this feature "
-                                    "will not be fully functional. The bot owner should run:\n"
-                                    "`%sdebug bot.pip_install('unidecode')`\nand then reload this cog." % ctx.prefix)
+        if not _filter:
+            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            return
+        elif not operation:
+            ctx.view = StringView(filter_name)
+            await self.recensor_list.invoke(ctx)
 
-        await self.bot.say(msg)
+        await self._list_command_main(ctx, _filter, 'roles_list', operation, *options)
 
-    @recensor_set.command(pass_context=True, name='multi-msg', aliases=['multi'])
+    @recensor_set.command(pass_context=True, name='msg')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_multi_msg(self, ctx, filter_name: str, multi_msg: bool = None):
+    async def recensor_set_msg(self, ctx, filter_name: str, *, msg: str = None):
         """
-        Show/set filter multi-message search toggle
+        Show/set the trigger message template
 
-        When enabled, the filter will check the last 64 messages or 10 minutes
-        of messages per user per channel for a match. Matched spans of messages
-        will be deleted as a group. Only works in blacklist mode.
+        Message can't be longer than 512 characters. Set to NONE to disable.
 
-        multi_msg must be a boolean option or left blank to show the current setting
+        Valid template entries are:
+        - filter: the Filter object that was matched
+        - author: the author of the matched message
+        - channel: the channel of the matched message
+        - match: the matched substring, for black-mode filters
+
+        More template objects may be added later.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
 
-        if type(multi_msg) not in (bool, type(None)):
-            multi_msg = await ctx.command.do_conversion(ctx, bool, multi_msg)
+        if msg == 'NONE':
+            msg = False
 
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif multi_msg is None:
-            multi_msg = _filter.multi_msg
+        elif msg is None:
+            msg = _filter.flash_msg
             adj = 'currently'
-        elif _filter.multi_msg == multi_msg:
+        elif msg and len(msg) > 512:
+            return await self.bot.send_cmd_help(ctx)
+        elif _filter.flash_msg == msg:
             adj = 'already'
         else:
             adj = 'now'
-            _filter.multi_msg = multi_msg
+            _filter.flash_msg = msg
             self.save()
 
-        desc = 'enabled' if multi_msg else 'disabled'
-        msg = 'Multi-message search for %s is %s %s.' % (_filter.name, adj, desc)
+        if msg:
+            desc = ':\n\n' + msg
+        else:
+            desc = 'disabled.'
 
-        await self.bot.say(msg)
+        await self.bot.say('Trigger message for %s is %s %s' % (_filter.name, adj, desc))
 
-    @recensor_set.command(pass_context=True, name='multi-join')
+    @recensor_set.command(pass_context=True, name='msg-dm')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_multi_msg_join(self, ctx, filter_name: str, join: str = None):
+    async def recensor_set_msg_dm(self, ctx, filter_name: str, msg_dm: bool = None):
         """
-        Show/set multi-message join
-
-        join must be an escaped string (double quotes can be used for spaces), or left blank to show the current setting
+        Show/set DMing of trigger messages
 
-        For example, "\\n" is translated into a newline for the join, and " " is stored as a simple space.
-        "" (an empty string) is also acceptable.
+        Trigger messsages sent via DM will not be auto-deleted.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
 
-        join = join and bytes(join, "utf-8").decode("unicode_escape")
+        if type(msg_dm) not in (bool, type(None)):
+            msg_dm = await ctx.command.do_conversion(ctx, bool, msg_dm)
 
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif join is None:
-            join = _filter.multi_msg_join
+        elif msg_dm is None:
+            msg_dm = _filter.flash_dm
             adj = 'currently'
-        elif _filter.multi_msg_join == join:
+        elif _filter.flash_dm == msg_dm:
             adj = 'already'
         else:
             adj = 'now'
-            _filter.multi_msg_join = join
+            _filter.flash_dm = msg_dm
             self.save()
 
-        disp = '`"%s"`' % join.encode('unicode_escape').decode()
-
-        if join == '':
-            disp += ' (empty string)'
+        desc = 'enabled' if msg_dm else 'disabled'
+        msg = 'DMing of trigger messages for %s is %s %s.' % (_filter.name, adj, desc)
 
-        await self.bot.say('Multi-message join for %s is %s set to %s.' % (_filter.name, adj, disp))
+        await self.bot.say(msg)
 
-    @recensor_set.command(pass_context=True, name='multi-group')
+    @recensor_set.command(pass_context=True, name='shadow')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_multi_msg_group(self, ctx, filter_name: str, group: int = None):
+    async def recensor_set_shadow(self, ctx, filter_name: str, percent: float = None):
         """
-        Show/set multi-message group ID
+        Show/set the share of messages a disabled filter is tried on without acting
 
-        If set, the section of a match belonging to this group is deleted instead of the whole series.
-        This does nothing in whitelist mode (it's forced to use the whole match)
+        While a shadowed filter is disabled, a sample of messages is checked against it after the real
+        filters are done. What it would have deleted is shown by `recensor shadowlog`, and its hit rate
+        and timings by `recensor stats <filter>`. Multi-message filters can't be shadowed.
+
+        percent must be from 0 (off) to 100 (every message), or left blank to show the current setting.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
@@ -2123,534 +5114,684 @@ class ReCensor:
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif group is None:
-            group = _filter.multi_msg_group
+        elif _filter.multi_msg:
+            await self.bot.say(error('Multi-message filters can\'t be shadowed.'))
+            return
+        elif percent is None:
+            percent = _filter.shadow * 100
             adj = 'currently'
-        elif _filter.multi_msg_group == group:
+        elif not 0 <= percent <= 100:
+            return await self.bot.send_cmd_help(ctx)
+        elif _filter.shadow == percent / 100:
             adj = 'already'
         else:
-            try:
-                compiled = re.compile(_filter.pattern, flags_to_int(_filter.flags))
-            except Exception as e:
-                await self.bot.say(error("Error compiling regular expression:\n") +
-                                   box(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
-                return
-
-            if group > compiled.groups:
-                await self.bot.say(warning("This filter's pattern only has %i groups. Current pattern:\n%s"
-                                           % (compiled.groups, box(_filter.pattern))))
-                return
-
             adj = 'now'
-            _filter.multi_msg_group = group
+            _filter.shadow = percent / 100
+            settings.update_order()
             self.save()
 
-        await self.bot.say('Multi-message group for %s is %s %i.' % (_filter.name, adj, group))
+        if not percent:
+            desc = 'not shadowed'
+        else:
+            desc = 'shadowing %g%% of messages' % percent
 
-    @recensor_set.command(pass_context=True, name='mode')
+            if _filter.enabled:
+                desc += ' (no effect while it\'s enabled)'
+
+        await self.bot.say('%s is %s %s.' % (_filter.name, adj, desc))
+
+    @recensor_set.command(pass_context=True, name='msg-sec')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_mode(self, ctx, filter_name: str, mode: str = None):
+    async def recensor_set_msg_sec(self, ctx, filter_name: str, seconds: int = None):
         """
-        Show/set filter matching mode
+        Show/set how long the trigger message stays
 
-        mode MUST be blacklist, whitelist, or left blank to show the current setting
+        If set to 0, the trigger message won't be deleted. If -1, the feature is disabled.
+        Maximum value is 60 seconds. Trigger messsages sent via DM will not be auto-deleted.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
 
-        if mode.lower().startswith('black'):
-            mode = False
-        elif mode.lower().startswith('white'):
-            mode = True
-        else:
-            return await self.bot.send_cmd_help(ctx)
-
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif mode is None:
-            mode = _filter.mode
+        elif seconds is None:
+            seconds = _filter.flash_sec
             adj = 'currently'
-        elif _filter.mode == mode:
+        elif seconds > 60:
+            return await self.bot.send_cmd_help(ctx)
+        elif _filter.flash_sec == seconds:
             adj = 'already'
         else:
             adj = 'now'
-            _filter.mode = mode
-            settings.update_order()
+            _filter.flash_sec = seconds
             self.save()
 
-        desc = 'DO' if mode else 'do NOT'
-        await self.bot.say('%s is %s set to only allow messages that %s match its pattern.'
-                           % (_filter.name, adj, desc))
+        if seconds > 0:
+            extra = ''
 
-    @recensor_set.command(pass_context=True, name='position')
+            if _filter.flash_dm:
+                extra = '\n\nNote that trigger messages sent via DM will NOT be auto-deleted.'
+
+            await self.bot.say('Trigger messages for %s are %s set to be auto-deleted after %ds.%s'
+                               % (_filter.name, adj, seconds, extra))
+        elif seconds == 0:
+            await self.bot.say('Trigger messages for %s will %s remain indefinitely.' % (_filter.name, adj))
+        else:
+            await self.bot.say('Trigger messages for %s are %s disabled.' % (_filter.name, adj))
+
+    @recensor.command(pass_context=True, name='test')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_position(self, ctx, filter_name: str, position: str = None):
+    async def recensor_test(self, ctx, filter_name: str = None):
         """
-        Configures a filter's matching position
-
-        Position MUST be one of the following (or left blank to show the current value):
-        - start:    only looks at the beginning of the message
-        - anywhere: scans through the full message looking for a match
-        - full:     the entire message must match, from start to finish
+        Interactively tests a single filter
 
-        This does nothing in multi-message whitelist mode (all matches are scanned)
+        Testing does not take role, channel or priv_exempt into account, only mode, pattern and flags.
+        The cog will not filter any of your messages in the channel while testing is active.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
+        already_testing = self._ignore_filters.get((ctx.message.channel.id, ctx.message.author.id))
 
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
+        elif already_testing:
+            desc = 'that' if already_testing is _filter else ('the %s filter' % already_testing.name)
+            await self.bot.say(warning('You are already testing %s filter in this channel!' % desc))
+            return
 
-        try:
-            position = position and POSITION(position)
-        except ValueError:
-            return await self.bot.send_cmd_help(ctx)
+        await self.bot.reply("I will respond to your messages with whether the message matched the %s filter and what "
+                             "action would be taken as a result.\n\nAny changes to the filter's mode, pattern or flags "
+                             "take effect immediately. Testing will stop when you post `stop test` or after 5 minutes "
+                             "of no messages." % _filter.name)
 
-        if position is None:
-            position = _filter.position
-            adj = 'currently'
-        elif _filter.position == position:
-            adj = 'already'
-        else:
-            adj = 'now'
-            _filter.position = position
-            self.save()
+        self._ignore_filters[(ctx.message.channel.id, ctx.message.author.id)] = _filter
 
-        if position is POSITION.START:
-            desc = 'only at the beginning of the message'
-        elif position is POSITION.FULL:
-            desc = 'the entire message from start to finish'
-        elif position is POSITION.ANYWHERE:
-            desc = 'anywhere in the message'
-        else:
-            raise ValueError("Unhandled position value, please report this bug.")
+        while True:
+            msg = await self.bot.wait_for_message(author=ctx.message.author,
+                                                  channel=ctx.message.channel,
+                                                  timeout=5 * 60)
 
-        await self.bot.say('%s is %s set to match %s.' % (_filter.name, adj, desc))
+            if self.bot.get_cog("ReCensor") is not self:
+                return
+            elif msg is None:
+                await self.bot.reply('testing for %s stopped due to inactivity.' % _filter.name)
+                break
+            elif msg.content.lower().strip('\'"` ') == 'stop test':
+                await self.bot.say('Testing stopped.')
+                break
 
-    @recensor_set.command(pass_context=True, name='flags')
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_flags(self, ctx, filter_name: str, *, flags: str = None):
-        """
-        Configures a filter's regex flags
+            content = preprocess_msg(_filter, msg)
 
-        Python's regex flags are documented here:
-        https://docs.python.org/3/howto/regex.html#compilation-flags
+            if _filter.asciify or (_filter.asciify is None and settings.asciify):
+                content = self.asciify_memo(content)
 
-        flags must be a combination of the following (or left blank to show the current setting):
-        - A: Perform ASCII-only matching instead of Unicode matching
-        - I: Do case-insensitive matches
-        - L: Do a locale-aware match (depends on bot host's locale)
-        - M: Make ^ and $ match line start/end instead of the whole message
-        - S: Make . match any character, including newlines
-        - X: Ignore ALL whitespace and #comments in the pattern (for readability)
+            match_dict = (await self.run_diagnostic_checks(settings, [(_filter.name, content, False, False)]))[0]
+            match = match_dict.get('match', False)
 
-        Any other characters are ignored.
+            if 'exception' in match_dict:
+                e = match_dict['exception']
+                await self.bot.say(error('Checking your message failed after %s: %s: %s'
+                                         % (format_seconds(match_dict['time']), type(e).__name__, e)))
+                continue
+
+            wl_msg = 'Your message will **not** be deleted because it matched and the filter is in whitelist mode.'
+            bl_msg = 'Your message **will** be deleted because it matched and the filter is in blacklist mode.'
+            nm_msg = "Your message will **not** be deleted because it didn't match and the filter is in blacklist mode."
+
+            if _filter.override:
+                if match:
+                    if _filter.mode:
+                        action = wl_msg + ' Since this is an override filter, no further checks will be made.'
+                    else:
+                        action = bl_msg + (" Since this is an override filter, it won't matter if it matches any "
+                                           "applicable (non-override) whitelist-mode filters.")
+                else:
+                    if _filter.mode:
+                        action = ("Your message *might* be deleted because it did not match this whitelist mode filter."
+                                  " If it matches another applicable whitelist filter, it will be allowed.")
+                    else:
+                        action = nm_msg
+            elif match and not _filter.mode:
+                action = bl_msg
+            elif _filter.mode:
+                if match:
+                    action = wl_msg
+                else:
+                    action = ('Your message *might* be deleted because it did not match this whitelist mode filter. '
+                              'If it matches another applicable whitelist filter, it will be allowed.')
+            else:
+                action = nm_msg
+
+            await self.bot.say('%s (Checked in %s.)' % (action, format_seconds(match_dict['time'])))
+
+        self._ignore_filters.pop((ctx.message.channel.id, ctx.message.author.id), None)
+
+    @recensor.command(pass_context=True, name='debug')
+    @checks.mod_or_permissions(manage_messages=True)
+    async def recensor_debug(self, ctx, message_id: str, channel: discord.Channel = None):
+        """
+        Tests a message against all configured filters
+
+        Channel defaults to the current channel.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
-        name = filter_name.lower()
-        _filter = settings and settings.get_filter(name)
 
-        if not _filter:
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
-            return
+        if not settings:
+            await self.bot.say(warning('No settings in this server.'))
 
-        flags = flags and ''.join(sorted(set(flags.upper()).intersection(FLAGS_DESC)))
+        if channel is None:
+            channel = ctx.message.channel
 
-        if flags is None:
-            flags = _filter.flags
-            adj = 'currently'
-        elif _filter.flags == flags:
-            adj = 'already'
-        else:
-            adj = 'now'
-            _filter.flags = flags
-            _filter.rebuild_predicate()
-            self.save()
+        try:
+            message = await self.bot.get_message(channel, message_id)
+        except discord.HTTPException:
+            await self.bot.say(error('Retrieving the message failed.'))
+            return
 
-        if flags:
-            desc = ':\n' + '\n'.join('`%c` - %s' % (k, FLAGS_DESC[k]) for k in flags)
+        lines = []
+        results, action = await settings.debug_message(message)
+
+        for t in results:
+            lines.append(' | '.join(map(str, t)))
+
+        if action:
+            lines.append('\nAction filter: %s: %s' % (action[0], 'delete' if action[1] else 'allow'))
         else:
-            desc = ' empty.'
+            lines.append('No action.')
 
-        await self.bot.say('Flags for %s are %s%s' % (_filter.name, adj, desc))
+        msg = '\n'.join(lines)
+        await self.bot.say(box(msg))
 
-    @recensor_set.command(pass_context=True, name='pattern', rest_is_raw=True)
+    @recensor.group(pass_context=True, name='scan', invoke_without_command=True)
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_pattern(self, ctx, filter_name: str, *, pattern):
+    async def recensor_scan(self, ctx, target: str, since: str = SCAN_DEFAULT_SINCE):
         """
-        Configures a filter's pattern
+        Applies the current filters to a channel's or the whole server's recent history
 
-        Regex how to:
-        https://docs.python.org/3/howto/regex.html#regex-howto
+        target is a channel or "server". since is how far back to go, e.g. 12h or "3 days" (default 1 day).
+        Matching messages newer than 14 days are deleted in bulk, older ones one at a time. No flash
+        messages are posted. Use `scan dry` to only count matches, and `scan cancel` to stop.
+        """
+        await self.start_scan(ctx, target, since, dry_run=False)
 
-        Full syntax documentation:
-        https://docs.python.org/3/library/re.html#regular-expression-syntax
+    @recensor_scan.command(pass_context=True, name='dry')
+    async def recensor_scan_dry(self, ctx, target: str, since: str = SCAN_DEFAULT_SINCE):
         """
+        Counts what a scan would delete, without deleting anything
+        """
+        await self.start_scan(ctx, target, since, dry_run=True)
+
+    @recensor_scan.command(pass_context=True, name='cancel')
+    async def recensor_scan_cancel(self, ctx):
+        """
+        Cancels the scan running in this server
+        """
+        job = self._scans.get(ctx.message.server.id)
+
+        if not job:
+            await self.bot.say('Nothing to cancel.')
+            return
+
+        job.task.cancel()
+        await self.bot.say('Scan cancelled.')
+
+    async def start_scan(self, ctx, target: str, since: str, dry_run: bool):
         server = ctx.message.server
         settings = self.settings.get(server.id)
-        name = filter_name.lower()
-        _filter = settings and settings.get_filter(name)
-        pattern = pattern.lstrip()
 
-        if len(pattern) >= 2 and pattern[0] == pattern[-1] == '"':
-            pattern = pattern[1:-1]
+        if not (settings and settings.order):
+            await self.bot.say(warning('There are no enabled filters in this server.'))
+            return
+        elif server.id in self._scans:
+            await self.bot.say(warning('A scan is already running in this server. Use `%srecensor scan cancel` to '
+                                       'stop it.' % ctx.prefix))
+            return
 
-        if not _filter:
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+        try:
+            since = datetime.utcnow() - timedelta(seconds=_parse_time(since))
+        except (BadTimeExpr, ValueError) as e:
+            await self.bot.say(error('Invalid time: %s' % e))
             return
 
-        if not pattern:
-            pattern = _filter.pattern
-            desc = 'is currently:\n' + box(pattern)
+        def check(channel):
+            perms = channel.permissions_for(server.me)
+            return perms.read_message_history and (dry_run or perms.manage_messages)
+
+        if target.lower() == 'server':
+            channels = [c for c in server.channels if c.type is discord.ChannelType.text and check(c)]
         else:
             try:
-                re.compile(pattern, flags_to_int(_filter.flags))
-            except Exception as e:
-                await self.bot.say(error("Error compiling regular expression:\n") +
-                                   box(', '.join((x if type(x) is str else repr(x)) for x in e.args)))
+                channel = await ctx.command.do_conversion(ctx, discord.Channel, target)
+            except BadArgument:
+                await self.bot.say(error('Target must be a channel or "server".'))
                 return
 
-            inline_flags = re.match(r"^\(\?([a-z]+)\)(.*)", pattern, re.IGNORECASE | re.DOTALL)
+            if channel.server != server:
+                await self.bot.say(error('That channel is not in this server.'))
+                return
+            elif not check(channel):
+                await self.bot.say(error('I need the read message history and manage messages permissions in %s.'
+                                         % channel.mention))
+                return
 
-            if inline_flags:
-                flags, pattern = inline_flags.groups()
-                _filter.flags = ''.join(sorted(set(flags.upper()).intersection(FLAGS_DESC)))
-                desc = 'set (auto-converted inline flags).'
-            else:
-                desc = 'set.'
+            channels = [channel]
 
-            _filter.pattern = pattern
-            _filter.rebuild_predicate()
-            self.save()
+        if not channels:
+            await self.bot.say(error('There are no channels I can scan.'))
+            return
 
-        await self.bot.say('Pattern for %s %s' % (_filter.name, desc))
+        job = ScanJob(ctx, channels, since, dry_run)
+        job.status_msg = await self.bot.say('Starting scan...')
+        job.task = self.bot.loop.create_task(self.scan_task(job))
+        self._scans[server.id] = job
 
-    @recensor_set.command(pass_context=True, name='attachment')
+    @recensor.command(pass_context=True, name='stats')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_attachment(self, ctx, filter_name: str, attachment_header: bool = None):
+    async def recensor_stats(self, ctx, filter_name: str = None):
         """
-        Show/set filter attachment header
-
-        When enabled, each message will be prepended with {attachment:ATTACHMENT_FILENAME}
-        This allows advanced filtering based on whether an attachment is present, as well as
-        based on the file's full name and/or extension.
+        Shows filtering performance statistics for this server or one filter
 
-        attachment_header must be a boolean option or left blank to show the current setting
+        Without a filter name, shows the verdict cache and the filters that have used the most time.
+        Counts start over when the cog is loaded.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
-        name = filter_name.lower()
-        _filter = settings and settings.get_filter(name)
 
-        if type(attachment_header) not in (bool, type(None)):
-            attachment_header = await ctx.command.do_conversion(ctx, bool, attachment_header)
+        if not settings:
+            await self.bot.say(info('There are no filters in this server.'))
+            return
+        elif filter_name:
+            _filter = settings.filters.get(filter_name.lower())
 
-        if not _filter:
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+            if not _filter:
+                await self.bot.say(error('No filter named %s.' % filter_name))
+                return
+
+            await self.bot.say(box(self.format_telemetry(_filter)))
             return
-        elif attachment_header is None:
-            attachment_header = _filter.attachment_header
-            adj = 'currently'
-        elif _filter.attachment_header == attachment_header:
-            adj = 'already'
-        else:
-            adj = 'now'
-            _filter.attachment_header = attachment_header
-            self.save()
 
-        desc = 'enabled' if attachment_header else 'disabled'
-        msg = 'Attachment filename headers for %s are %s %s.' % (_filter.name, adj, desc)
+        cache = settings.verdict_cache
+        lookups = cache.hits + cache.misses
+        hit_rate = (100 * cache.hits / lookups) if lookups else 0
+
+        lines = [
+            'Verdict cache:',
+            '  hits:    %i (%.1f%%)' % (cache.hits, hit_rate),
+            '  misses:  %i' % cache.misses,
+            '  entries: %i/%i' % (len(cache.entries), cache.entries.maxlen)
+        ]
+
+        index = settings.eligibility
+        lookups = index.hits + index.misses
+        hit_rate = (100 * index.hits / lookups) if lookups else 0
+
+        lines.extend([
+            'Eligibility index:',
+            '  hits:    %i (%.1f%%)' % (index.hits, hit_rate),
+            '  misses:  %i' % index.misses,
+            '  entries: %i/%i' % (len(index.entries), index.entries.maxlen)
+        ])
 
-        await self.bot.say(msg)
+        history = self._message_cache
 
-    @recensor_set.command(pass_context=True, name='channels')
+        lines.extend([
+            'Message history (bot-wide):',
+            '  keys:    %i (%i expired, %i evicted)' % (len(history), history.expired, history.evicted),
+            '  entries: %i/%i' % (history.entries, history.max_entries),
+            '  memory:  ~%.1f/%i KiB' % (history.nbytes / 1024, history.max_bytes // 1024)
+        ])
+
+        deleter = self.deleter
+        p50, p95 = FilterTelemetry.percentiles(deleter.latencies, (50, 95))
+
+        lines.extend([
+            'Deletion queue (bot-wide):',
+            '  pending: %i in %i channel(s), peak %i' % (deleter.depth, len(deleter.queues), deleter.max_depth),
+            '  deleted: %i in %i bulk and %i single call(s)' % (deleter.deleted, deleter.bulk_calls,
+                                                               deleter.single_calls),
+            '  dropped: %i duplicate(s), %i failure(s)' % (deleter.deduped, deleter.failed),
+            '  latency: p50 %s, p95 %s' % (format_seconds(p50), format_seconds(p95))
+        ])
+
+        batcher = self.batcher
+        max_messages, max_delay = self.batch_limits
+
+        lines.extend([
+            'Check batching (bot-wide):',
+            '  limits:  %i message(s) or %s' % (max_messages, format_seconds(max_delay) if max_delay > 0 else 'off'),
+            '  batches: %i carrying %i message(s), mean %.1f, peak %i'
+            % (batcher.batches, batcher.messages, batcher.messages / batcher.batches if batcher.batches else 0,
+               batcher.max_size)
+        ])
+
+        lines.extend([
+            'Compiled patterns (bot-wide):',
+            '  unique:  %i, shared by %i filter(s)' % (len(PATTERN_REGISTRY.entries), PATTERN_REGISTRY.references)
+        ])
+
+        mod_status = self.mod_status
+        lookups = mod_status.hits + mod_status.misses
+
+        lines.extend([
+            'Mod status cache (bot-wide):',
+            '  hits:    %i (%.1f%%)' % (mod_status.hits, (100 * mod_status.hits / lookups) if lookups else 0),
+            '  entries: %i/%i' % (len(mod_status.entries), mod_status.entries.maxlen)
+        ])
+
+        memo = self.asciify_memo
+        lookups = memo.hits + memo.misses
+        hit_rate = (100 * memo.hits / lookups) if lookups else 0
+
+        lines.extend([
+            'Asciify memo (bot-wide):',
+            '  hits:    %i (%.1f%%)' % (memo.hits, hit_rate),
+            '  misses:  %i' % memo.misses,
+            '  entries: %i/%i' % (len(memo.entries), memo.entries.maxlen)
+        ])
+
+        busiest = sorted(settings.filters.values(), key=lambda f: f.telemetry.total_time, reverse=True)
+        busiest = [f for f in busiest[:TELEMETRY_TOP_FILTERS] if f.telemetry.evaluations]
+
+        if busiest:
+            width = max(len(f.name) for f in busiest)
+            lines.extend(['', 'Most expensive filters:',
+                          '  %-*s  %8s  %6s  %8s  %8s' % (width, 'name', 'checks', 'hits', 'p95', 'total')])
+
+            for f in busiest:
+                t = f.telemetry
+                p95 = t.percentiles(t.times, (95,))[0]
+                lines.append('  %-*s  %8i  %5.1f%%  %8s  %7.3fs' % (width, f.name, t.evaluations,
+                                                                   100 * t.hits / t.evaluations,
+                                                                   format_seconds(p95), t.total_time))
+
+        await self.bot.say(box('\n'.join(lines)))
+
+    @staticmethod
+    def format_telemetry(_filter: Filter) -> str:
+        t = _filter.telemetry
+        data = t.to_json()
+        hit_rate = 100 * (data['hit_rate'] or 0)
+        time_fmt = 'p50 %s, p95 %s, p99 %s'
+
+        return '\n'.join([
+            'Filter %s:' % _filter.name,
+            '  checks:      %i (%i inline)' % (t.evaluations, t.inline),
+            '  hits:        %i (%.1f%%)' % (t.hits, hit_rate),
+            '  skipped:     %i' % t.skipped,
+            '  match time:  ' + time_fmt % tuple(map(format_seconds, (data['time_p50'], data['time_p95'],
+                                                                      data['time_p99']))),
+            '  total time:  %.3fs' % t.total_time,
+            '  pool wait:   ' + time_fmt % tuple(map(format_seconds, (data['wait_p50'], data['wait_p95'],
+                                                                      data['wait_p99']))),
+            '  rescans:     %i (%i chars)' % (t.rescans, t.rescan_chars)
+        ])
+
+    @recensor.command(pass_context=True, name='shadowlog')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_channels(self, ctx, filter_name: str, operation: str = None, *options):
+    async def recensor_shadowlog(self, ctx, filter_name: str = None, count: int = 10):
         """
-        Configure a filter's channels list
+        Shows what shadow filters would have deleted recently
+
+        Also summarizes each shadow filter's sampled checks, matches and match times since the cog was loaded.
+        Shows up to 25 entries, newest first.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
-        name = filter_name.lower()
-        _filter = settings and settings.get_filter(name)
+        name = filter_name and filter_name.lower()
 
-        if not _filter:
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
+        if not (settings and settings.shadow_order):
+            await self.bot.say(info('There are no shadow filters in this server.'))
+            return
+        elif name and name not in settings.filters:
+            await self.bot.say(error('No filter named %s.' % name))
             return
-        elif not operation:
-            ctx.view = StringView(filter_name)
-            await self.recensor_list.invoke(ctx)
 
-        await self._list_command_main(ctx, _filter, 'channels_list', operation, *options)
+        lines = []
 
-    @recensor_set.command(pass_context=True, name='roles')
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_roles(self, ctx, filter_name: str, operation: str = None, *options):
+        for f in settings.shadow_order:
+            if name in (None, f.name):
+                t = f.telemetry
+                p95 = FilterTelemetry.percentiles(t.times, (95,))[0]
+                lines.append('%s: %g%% sampled, %i checks, %i matches (%.1f%%), p95 %s'
+                             % (f.name, f.shadow * 100, t.evaluations, t.hits,
+                                100 * t.hits / t.evaluations if t.evaluations else 0, format_seconds(p95)))
+
+        entries = [e for e in reversed(settings.shadow_log) if name in (None, e['filter'])]
+        lines.append('')
+
+        if not entries:
+            lines.append('No would-be deletions yet.')
+
+        for entry in entries[:max(0, min(count, 25))]:
+            channel = server.get_channel(entry['channel'])
+            author = server.get_member(entry['author'])
+            match = entry['match']
+
+            lines.append('[%s] %s in #%s by %s: %s' % (
+                entry['time'].strftime('%H:%M:%S'), entry['filter'],
+                channel.name if channel else entry['channel'],
+                author.display_name if author else entry['author'],
+                ('"%s"' % ellipsize(match, to_length=60)) if match else '(no whitelist match)'
+            ))
+
+        await self.bot.say(box('\n'.join(lines)))
+
+    @recensor.command(pass_context=True, name='telemetry')
+    @checks.is_owner()
+    async def recensor_telemetry(self, ctx):
         """
-        Configure a filter's roles list
+        Uploads every server's per-filter statistics as JSON
         """
-        server = ctx.message.server
-        settings = self.settings.get(server.id)
-        name = filter_name.lower()
-        _filter = settings and settings.get_filter(name)
+        data = {}
 
-        if not _filter:
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
-            return
-        elif not operation:
-            ctx.view = StringView(filter_name)
-            await self.recensor_list.invoke(ctx)
+        for server_id, settings in self.settings.items():
+            data[server_id] = {name: f.telemetry.to_json() for name, f in settings.filters.items()}
 
-        await self._list_command_main(ctx, _filter, 'roles_list', operation, *options)
+        buf = BytesIO(json.dumps(data, indent=2, sort_keys=True).encode())
+        fname = 'recensor_telemetry_%i.json' % time.time()
+        await self.bot.upload(buf, filename=fname)
 
-    @recensor_set.command(pass_context=True, name='msg')
+    @recensor.command(pass_context=True, name='release')
     @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_msg(self, ctx, filter_name: str, *, msg: str = None):
+    async def recensor_release(self, ctx, filter_name: str):
         """
-        Show/set the trigger message template
-
-        Message can't be longer than 512 characters. Set to NONE to disable.
+        Releases a filter from quarantine
 
-        Valid template entries are:
-        - filter: the Filter object that was matched
-        - author: the author of the matched message
-        - channel: the channel of the matched message
-        - match: the matched substring, for black-mode filters
-
-        More template objects may be added later.
+        Filters are quarantined when they take longer than the bot's time budget to run.
+        Changing a quarantined filter's pattern also releases it.
         """
         server = ctx.message.server
         settings = self.settings.get(server.id)
         name = filter_name.lower()
         _filter = settings and settings.get_filter(name)
 
-        if msg == 'NONE':
-            msg = False
-
         if not _filter:
             await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
             return
-        elif msg is None:
-            msg = _filter.flash_msg
-            adj = 'currently'
-        elif msg and len(msg) > 512:
-            return await self.bot.send_cmd_help(ctx)
-        elif _filter.flash_msg == msg:
-            adj = 'already'
-        else:
-            adj = 'now'
-            _filter.flash_msg = msg
-            self.save()
-
-        if msg:
-            desc = ':\n\n' + msg
-        else:
-            desc = 'disabled.'
+        elif not _filter.quarantine:
+            await self.bot.say('%s is not quarantined.' % _filter.name)
+            return
 
-        await self.bot.say('Trigger message for %s is %s %s' % (_filter.name, adj, desc))
+        _filter.quarantine = None
+        settings.update_order()
+        self.save()
+        await self.bot.say('%s has been released from quarantine.' % _filter.name)
 
-    @recensor_set.command(pass_context=True, name='msg-dm')
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_msg_dm(self, ctx, filter_name: str, msg_dm: bool = None):
+    @recensor.command(pass_context=True, name='budget')
+    @checks.is_owner()
+    async def recensor_budget(self, ctx, filter_seconds: float = None, message_seconds: float = None):
         """
-        Show/set DMing of trigger messages
+        Show/set the bot-wide regex time budgets
 
-        Trigger messsages sent via DM will not be auto-deleted.
+        If a single filter runs longer than filter_seconds, or the filters checked against one
+        message take longer than message_seconds in total, the worker pool is restarted and the
+        offending filter is quarantined until it is released or its pattern is changed.
         """
-        server = ctx.message.server
-        settings = self.settings.get(server.id)
-        name = filter_name.lower()
-        _filter = settings and settings.get_filter(name)
-
-        if type(msg_dm) not in (bool, type(None)):
-            msg_dm = await ctx.command.do_conversion(ctx, bool, msg_dm)
-
-        if not _filter:
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
-            return
-        elif msg_dm is None:
-            msg_dm = _filter.flash_dm
+        if filter_seconds is None and message_seconds is None:
             adj = 'currently'
-        elif _filter.flash_dm == msg_dm:
-            adj = 'already'
+        elif any(x is not None and x <= 0 for x in (filter_seconds, message_seconds)):
+            await self.bot.say(error('Budgets must be greater than zero.'))
+            return
         else:
             adj = 'now'
-            _filter.flash_dm = msg_dm
-            self.save()
+            budget = self.misc_data.setdefault('_time_budget', {})
 
-        desc = 'enabled' if msg_dm else 'disabled'
-        msg = 'DMing of trigger messages for %s is %s %s.' % (_filter.name, adj, desc)
+            if filter_seconds is not None:
+                budget['filter'] = filter_seconds
+            if message_seconds is not None:
+                budget['message'] = message_seconds
 
-        await self.bot.say(msg)
+            self.save()
 
-    @recensor_set.command(pass_context=True, name='msg-sec')
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_set_msg_sec(self, ctx, filter_name: str, seconds: int = None):
-        """
-        Show/set how long the trigger message stays
+        filter_budget, message_budget = self.time_budget
+        await self.bot.say('Time budgets are %s %gs per filter and %gs per message.'
+                           % (adj, filter_budget, message_budget))
 
-        If set to 0, the trigger message won't be deleted. If -1, the feature is disabled.
-        Maximum value is 60 seconds. Trigger messsages sent via DM will not be auto-deleted.
+    @recensor.command(pass_context=True, name='batching')
+    @checks.is_owner()
+    async def recensor_batching(self, ctx, max_messages: int = None, max_ms: float = None):
         """
-        server = ctx.message.server
-        settings = self.settings.get(server.id)
-        name = filter_name.lower()
-        _filter = settings and settings.get_filter(name)
+        Show/set how checks from concurrent messages are batched together
 
-        if not _filter:
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
-            return
-        elif seconds is None:
-            seconds = _filter.flash_sec
+        Messages arriving together in a server have their checks sent to the worker pool in one job,
+        once max_messages have been gathered or the first has waited max_ms milliseconds. Larger values
+        save more round trips under load; max_ms is the most latency batching can add. 0 ms disables it.
+        """
+        if max_messages is None and max_ms is None:
             adj = 'currently'
-        elif seconds > 60:
-            return await self.bot.send_cmd_help(ctx)
-        elif _filter.flash_sec == seconds:
-            adj = 'already'
+        elif (max_messages is not None and max_messages < 1) or (max_ms is not None and max_ms < 0):
+            await self.bot.say(error('The message limit must be at least 1 and the delay can\'t be negative.'))
+            return
         else:
             adj = 'now'
-            _filter.flash_sec = seconds
-            self.save()
+            batching = self.misc_data.setdefault('_batching', {})
 
-        if seconds > 0:
-            extra = ''
+            if max_messages is not None:
+                batching['messages'] = max_messages
+            if max_ms is not None:
+                batching['delay'] = max_ms / 1000
 
-            if _filter.flash_dm:
-                extra = '\n\nNote that trigger messages sent via DM will NOT be auto-deleted.'
+            self.save()
 
-            await self.bot.say('Trigger messages for %s are %s set to be auto-deleted after %ds.%s'
-                               % (_filter.name, adj, seconds, extra))
-        elif seconds == 0:
-            await self.bot.say('Trigger messages for %s will %s remain indefinitely.' % (_filter.name, adj))
+        max_messages, max_delay = self.batch_limits
+
+        if max_delay > 0 and max_messages > 1:
+            await self.bot.say('Checks are %s batched for up to %i messages or %gms.'
+                               % (adj, max_messages, max_delay * 1000))
         else:
-            await self.bot.say('Trigger messages for %s are %s disabled.' % (_filter.name, adj))
+            await self.bot.say('Check batching is %s off.' % adj)
 
-    @recensor.command(pass_context=True, name='test')
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_test(self, ctx, filter_name: str = None):
+    @recensor.group(pass_context=True, name='bench', hidden=True)
+    @checks.is_owner()
+    async def recensor_bench(self, ctx):
         """
-        Interactively tests a single filter
+        Runs synthetic benchmarks of the matching engine
 
-        Testing does not take role, channel or priv_exempt into account, only mode, pattern and flags.
-        The cog will not filter any of your messages in the channel while testing is active.
+        Benchmarks run in a thread on the bot's host; expect a short CPU spike.
         """
-        server = ctx.message.server
-        settings = self.settings.get(server.id)
-        name = filter_name.lower()
-        _filter = settings and settings.get_filter(name)
-        already_testing = self._ignore_filters.get((ctx.message.channel.id, ctx.message.author.id))
+        if ctx.invoked_subcommand is None:
+            await self.bot.send_cmd_help(ctx)
 
-        if not _filter:
-            await self.bot.say(warning('There is no filter named "%s" in this server.' % name))
-            return
-        elif already_testing:
-            desc = 'that' if already_testing is _filter else ('the %s filter' % already_testing.name)
-            await self.bot.say(warning('You are already testing %s filter in this channel!' % desc))
-            return
+    @recensor_bench.command(pass_context=True, name='fused')
+    async def recensor_bench_fused(self, ctx, messages: int = 2000):
+        """
+        Compares messages/sec with and without fused filter sets as the filter count grows
+
+        Runs without the executor round trip on synthetic blacklist filters and messages.
+        """
+        await self.bot.type()
+        results = await self.bot.loop.run_in_executor(None, partial(benchmark_fused, num_messages=messages))
+        lines = ['Filters | Separate msg/s | Fused msg/s | Speedup']
 
-        await self.bot.reply("I will respond to your messages with whether the message matched the %s filter and what "
-                             "action would be taken as a result.\n\nAny changes to the filter's mode, pattern or flags "
-                             "take effect immediately. Testing will stop when you post `stop test` or after 5 minutes "
-                             "of no messages." % _filter.name)
+        for count, separate, fused in results:
+            lines.append('%7i | %14.0f | %11.0f | %6.2fx' % (count, separate, fused, fused / separate))
 
-        self._ignore_filters[(ctx.message.channel.id, ctx.message.author.id)] = _filter
+        await self.bot.say(box('\n'.join(lines)))
 
-        while True:
-            msg = await self.bot.wait_for_message(author=ctx.message.author,
-                                                  channel=ctx.message.channel,
-                                                  timeout=5 * 60)
+    @recensor_bench.command(pass_context=True, name='asciify')
+    async def recensor_bench_asciify(self, ctx, messages: int = 500):
+        """
+        Compares the per-message cost of asciify implementations on synthetic input
 
-            if self.bot.get_cog("ReCensor") is not self:
-                return
-            elif msg is None:
-                await self.bot.reply('testing for %s stopped due to inactivity.' % _filter.name)
-                break
-            elif msg.content.lower().strip('\'"` ') == 'stop test':
-                await self.bot.say('Testing stopped.')
-                break
+        Shows the old per-character implementation, the translation table, and a warm memo.
+        """
+        await self.bot.type()
+        results = await self.bot.loop.run_in_executor(None, partial(benchmark_asciify, num_messages=messages))
+        lines = ['Input    | Naive us/msg | Table us/msg | Memo us/msg | Speedup']
 
-            content = preprocess_msg(_filter, msg)
+        for kind, naive, table, memo in results:
+            lines.append('%-8s | %12.1f | %12.1f | %11.1f | %6.2fx' % (kind, naive, table, memo, naive / table))
 
-            if _filter.asciify or (_filter.asciify is None and settings.asciify):
-                content = asciify_string(content)
+        if not unidecode:
+            lines.append('\n(unidecode is not installed)')
 
-            match_dict = await self.bot.loop.run_in_executor(self.executor, _filter.predicate, content)
-            match = match_dict.get('match', False)
-            wl_msg = 'Your message will **not** be deleted because it matched and the filter is in whitelist mode.'
-            bl_msg = 'Your message **will** be deleted because it matched and the filter is in blacklist mode.'
-            nm_msg = "Your message will **not** be deleted because it didn't match and the filter is in blacklist mode."
+        await self.bot.say(box('\n'.join(lines)))
 
-            if _filter.override:
-                if match:
-                    if _filter.mode:
-                        action = wl_msg + ' Since this is an override filter, no further checks will be made.'
-                    else:
-                        action = bl_msg + (" Since this is an override filter, it won't matter if it matches any "
-                                           "applicable (non-override) whitelist-mode filters.")
-                else:
-                    if _filter.mode:
-                        action = ("Your message *might* be deleted because it did not match this whitelist mode filter."
-                                  " If it matches another applicable whitelist filter, it will be allowed.")
-                    else:
-                        action = nm_msg
-            elif match and not _filter.mode:
-                action = bl_msg
-            elif _filter.mode:
-                if match:
-                    action = wl_msg
-                else:
-                    action = ('Your message *might* be deleted because it did not match this whitelist mode filter. '
-                              'If it matches another applicable whitelist filter, it will be allowed.')
-            else:
-                action = nm_msg
+    @recensor_bench.command(pass_context=True, name='lists')
+    async def recensor_bench_lists(self, ctx, members: int = 500):
+        """
+        Compares role list checks before and after effective sets, for members with 100+ roles
+        """
+        await self.bot.type()
+        results = await self.bot.loop.run_in_executor(None, partial(benchmark_lists, num_members=members))
+        lines = ['Scenario       | Naive us/check | Sets us/check | Speedup']
 
-            await self.bot.say(action)
+        for scenario, naive, effective in results:
+            lines.append('%-14s | %14.1f | %13.1f | %6.2fx' % (scenario, naive, effective, naive / effective))
 
-        self._ignore_filters.pop((ctx.message.channel.id, ctx.message.author.id), None)
+        await self.bot.say(box('\n'.join(lines)))
 
-    @recensor.command(pass_context=True, name='debug')
-    @checks.mod_or_permissions(manage_messages=True)
-    async def recensor_debug(self, ctx, message_id: str, channel: discord.Channel = None):
+    @recensor_bench.command(pass_context=True, name='replay')
+    async def recensor_bench_replay(self, ctx, corpus: str, config: str = JSON_PATH,
+                                    messages: int = REPLAY_DEFAULT_MESSAGES):
         """
-        Tests a message against all configured filters
+        Replays recorded messages against a saved config at several pool sizes and filter counts
 
-        Channel defaults to the current channel.
+        corpus is a path on the bot's host: an activitylog .log file, a .jsonl file with one
+        {"content": ..., "server": ..., "channel": ..., "author": ..., "roles": [...]} object per line,
+        or a folder of either. The latest messages are replayed through check_message, check_sequence
+        and on_message using copies of the config's filters; nothing is deleted or sent. Messages from
+        servers the config doesn't have are replayed against its server with the most filters.
         """
-        server = ctx.message.server
-        settings = self.settings.get(server.id)
+        await self.bot.type()
 
-        if not settings:
-            await self.bot.say(warning('No settings in this server.'))
+        try:
+            corpus_messages = await self.bot.loop.run_in_executor(None, partial(load_corpus, corpus, messages))
+            data = dataIO.load_json(config)
+        except (OSError, ValueError) as e:
+            await self.bot.say(error('Couldn\'t load the corpus or config: %s' % e))
+            return
 
-        if channel is None:
-            channel = ctx.message.channel
+        if not corpus_messages:
+            await self.bot.say(error('There are no messages in that corpus.'))
+            return
 
         try:
-            message = await self.bot.get_message(channel, message_id)
-        except discord.HTTPException:
-            await self.bot.say(error('Retrieving the message failed.'))
+            results = await benchmark_replay(self.bot, corpus_messages, data)
+        except ValueError as e:
+            await self.bot.say(error('Couldn\'t replay the corpus: %s' % e))
             return
 
-        lines = []
-        results, action = await settings.debug_message(message)
-
-        for t in results:
-            lines.append(' | '.join(map(str, t)))
+        lines = [
+            '%i messages, up to %i in flight (1 for check_sequence).' % (len(corpus_messages), REPLAY_CONCURRENCY),
+            '',
+            'Stage          | Pool | Filters |  msg/s |    p50 |    p95 |    p99 |  Util'
+        ]
 
-        if action:
-            lines.append('\nAction filter: %s: %s' % (action[0], 'delete' if action[1] else 'allow'))
-        else:
-            lines.append('No action.')
+        for stage, workers, filter_count, rate, p50, p95, p99, utilization in results:
+            lines.append('%-14s | %4i | %7i | %6.0f | %6s | %6s | %6s | %4.1f%%'
+                         % (stage, workers, filter_count, rate, format_seconds(p50), format_seconds(p95),
+                            format_seconds(p99), utilization * 100))
 
-        msg = '\n'.join(lines)
-        await self.bot.say(box(msg))
+        for page in pagify('\n'.join(lines)):
+            await self.bot.say(box(page))
 
     @recensor.command(pass_context=True, name='regex101', aliases=['101'], rest_is_raw=True)
     @checks.mod_or_permissions(manage_messages=True)
@@ -3316,35 +6457,385 @@ class ReCensor:
                 await self.bot.say('Command cancelled.')
                 return False
 
-    def is_mod_or_superior(self, obj):  # Copied from red core mod.py
-        if not isinstance(obj, (Message, discord.Member, discord.Role)):
+    def is_mod_or_superior(self, obj):  # Based on red core mod.py; members' results are cached (see ModStatusCache)
+        if not isinstance(obj, (Message, MessageRecord, discord.Member, discord.Role)):
             raise TypeError('Only messages, members or roles may be passed')
 
         server = obj.server
-        admin_role = self.bot.settings.get_server_admin(server)
-        mod_role = self.bot.settings.get_server_mod(server)
 
         if isinstance(obj, discord.Role):
-            return obj.name in [admin_role, mod_role]
-        elif isinstance(obj, Message):
+            return obj.name in [self.bot.settings.get_server_admin(server), self.bot.settings.get_server_mod(server)]
+        elif isinstance(obj, (Message, MessageRecord)):
             user = obj.author
         elif isinstance(obj, discord.User):
             user = obj
         else:
             return False
 
-        if user.id == self.bot.settings.owner:
-            return True
-        elif user.id in self.bot.settings.co_owners:
-            return True
+        return self.mod_status.resolve(self.bot, server, user)
 
-        if hasattr(user, 'roles'):
-            if discord.utils.get(user.roles, name=admin_role):
-                return True
-            elif discord.utils.get(user.roles, name=mod_role):
-                return True
+    @property
+    def time_budget(self) -> Tuple[float, float]:
+        budget = self.misc_data.get('_time_budget', {})
+        return budget.get('filter', DEFAULT_FILTER_BUDGET), budget.get('message', DEFAULT_MESSAGE_BUDGET)
 
-        return False
+    @property
+    def batch_limits(self) -> Tuple[int, float]:
+        batching = self.misc_data.get('_batching', {})
+        return batching.get('messages', DEFAULT_BATCH_MESSAGES), batching.get('delay', DEFAULT_BATCH_DELAY)
+
+    async def run_checks(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]],
+                         no_stop: bool = False, messages: int = 1) -> List[dict]:
+        """
+        Runs checks against the server's filter set, enforcing the time budgets.
+
+        Checks whose filters have proven cheap run on the event loop (see plan_inline); the rest go
+        to the executor in one batch. If the message budget (multiplied by `messages`, for batches)
+        runs out, the pool is restarted and the pool checks are re-run one by one to find and
+        quarantine the filter(s) responsible. Filters that finish but exceed the filter budget are
+        quarantined as well.
+        """
+        inline_results, end = self.run_inline_checks(settings, checks, no_stop)
+        pool_checks = [c for i, c in enumerate(checks[:end]) if i not in inline_results]
+        pool_results = []
+        pool_wait = None
+
+        if pool_checks:
+            t0 = time.perf_counter()
+            pool_results = await self.run_pool_checks(settings, pool_checks, no_stop, messages)
+            pool_wait = max(0.0, time.perf_counter() - t0 - sum(check_time(m) for m in pool_results))
+
+        pool_results = iter(pool_results)
+        matches = []
+
+        for i, check in enumerate(checks[:end]):
+            if i in inline_results:
+                matches.append(inline_results[i])
+                continue
+
+            match = next(pool_results, None)
+
+            if match is None:  # the pool stopped on a match
+                break
+
+            matches.append(match)
+
+            if stops_on(check, match, no_stop):
+                break
+
+        self.record_checks(settings, checks, matches, inline_results, pool_wait)
+        return matches
+
+    def record_checks(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]],
+                      matches: List[dict], inline_results: Optional[dict] = None,
+                      pool_wait: Optional[float] = None):
+        """
+        Quarantines filters whose results exceeded the filter budget, and records the rest in each filter's
+        telemetry and cost profile. `inline_results` is keyed by the indices of checks that ran on the event loop.
+        """
+        filter_budget, message_budget = self.time_budget
+        inline_results = inline_results or {}
+
+        for i, ((name, content, *_), match) in enumerate(zip(checks, matches)):
+            elapsed = check_time(match)
+
+            if elapsed > filter_budget:
+                self.quarantine_filter(settings, name, 'exceeded the %gs filter budget' % filter_budget, elapsed)
+
+            _filter = settings.filters.get(name)
+
+            if not _filter:
+                continue
+            elif type(match) is dict and 'fused' in match:
+                # A fused miss says nothing about the filter's own cost
+                _filter.telemetry.skipped += 1
+                continue
+
+            hit = ('match' in match) if type(match) is dict else bool(match)
+            _filter.telemetry.record(elapsed, hit, None if i in inline_results else pool_wait)
+
+            if not (type(match) is dict and 'exception' in match):
+                _filter.cost.record(elapsed, len(content))
+
+    def plan_inline(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]]
+                    ) -> List[Tuple[bool, str]]:
+        """
+        Returns (inline, reason) for each check, going by each filter's cost profile. Checks are
+        planned inline in order while their predicted cost fits in INLINE_MESSAGE_BUDGET.
+        """
+        planned = 0.0
+        plan = []
+
+        for name, content, *_ in checks:
+            _filter = settings.filters.get(name)
+
+            if not (_filter and _filter.compiled):
+                plan.append((False, 'no predicate'))
+                continue
+
+            cost, reason = _filter.cost.estimate(len(content))
+
+            if cost is None:
+                plan.append((False, reason))
+            elif planned + cost > INLINE_MESSAGE_BUDGET:
+                plan.append((False, 'inline budget spent'))
+            else:
+                planned += cost
+                plan.append((True, reason))
+
+        return plan
+
+    def run_inline_checks(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]],
+                          no_stop: bool = False) -> Tuple[dict, int]:
+        """
+        Runs the checks that plan_inline picked on the event loop, stopping early if they actually take
+        longer than INLINE_MESSAGE_BUDGET. Returns {index: result} and the number of checks that still
+        matter: up to and including the first inline match that stops the run, or all of them.
+        """
+        results = {}
+        spent = 0.0
+
+        for i, (check, (inline, reason)) in enumerate(zip(checks, self.plan_inline(settings, checks))):
+            if not inline or spent > INLINE_MESSAGE_BUDGET:
+                continue
+
+            name, content, stop_on_match, iterate, *pos = check
+            match = settings.filters[name].run_check(content, iterate, pos[0] if pos else 0)
+            results[i] = match
+            spent += check_time(match)
+
+            if stops_on(check, match, no_stop):
+                return results, i + 1
+
+        return results, len(checks)
+
+    async def run_pool_checks(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]],
+                              no_stop: bool = False, messages: int = 1) -> List[dict]:
+        """
+        Runs checks in the executor under the message budget, diagnosing them one by one if it runs out.
+        Checks may share a round trip with other messages' (see CheckBatcher); the budget covers the wait.
+
+        A batch that runs out of budget times out for every message in it, so each one is first re-sent by
+        itself, one message at a time, and only the message(s) that run out again are diagnosed.
+        """
+        filter_budget, message_budget = self.time_budget
+        message_budget *= messages
+        executor = self.executor
+        job, batch = self.batcher.submit(settings, checks, no_stop, messages)
+
+        try:
+            return await asyncio.wait_for(job, timeout=message_budget)
+        except BrokenProcessPool:
+            # Another message's overrun restarted the pool out from under this one
+            pass
+        except asyncio.TimeoutError:
+            # Messages batched together time out together; only the first needs to restart the pool
+            if self.executor is executor:
+                logger.warning('checks for server %s exceeded the %gs message budget, restarting workers'
+                               % (settings.server_id, message_budget))
+                self.restart_executor()
+
+            if batch is None or len(batch.jobs) == 1:
+                return await self.diagnose_checks(settings, checks, no_stop)
+
+        # One at a time, so that a message re-sent alongside the slow one can't be held up by it again
+        async with self._diagnose_lock:
+            for attempt in range(2):
+                executor = self.executor
+
+                try:
+                    return await asyncio.wait_for(self._dispatch_checks(settings, checks, no_stop),
+                                                  timeout=message_budget)
+                except BrokenProcessPool:
+                    continue
+                except asyncio.TimeoutError:
+                    if self.executor is executor:
+                        self.restart_executor()
+
+                    return await self.diagnose_each(settings, checks, no_stop)
+
+        return [{'time': 0, 'exception': BrokenProcessPool(), 'name': c[0]} for c in checks]
+
+    async def diagnose_checks(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]],
+                              no_stop: bool = False) -> List[dict]:
+        """
+        Runs checks one at a time under the filter budget, quarantining any that time out.
+
+        Returns results in the same form as check_matches; timed out or skipped checks are misses.
+        """
+        async with self._diagnose_lock:
+            return await self.diagnose_each(settings, checks, no_stop)
+
+    async def diagnose_each(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]],
+                            no_stop: bool = False, pool: str = 'executor') -> List[dict]:
+        """
+        diagnose_checks on the pool named by `pool`, without taking the diagnosis lock. Each timeout
+        restarts only that pool.
+        """
+        filter_budget, message_budget = self.time_budget
+        matches = []
+
+        for check in checks:
+            name = check[0]
+            _filter = settings.filters.get(name)
+
+            if _filter is None or _filter.quarantine:
+                match = {'time': 0, 'name': name}
+            else:
+                try:
+                    # Unfused, so that one bad member doesn't implicate the rest of its group
+                    match = await asyncio.wait_for(self._dispatch_checks(settings, [check], fused=False,
+                                                                         executor=getattr(self, pool)),
+                                                   timeout=filter_budget)
+                    match = match[0]
+                except asyncio.TimeoutError as e:
+                    self.restart_executor(pool)
+                    self.quarantine_filter(settings, name, 'timed out after %gs' % filter_budget, filter_budget)
+                    match = {'time': filter_budget, 'exception': e, 'name': name}
+                except BrokenProcessPool as e:
+                    match = {'time': 0, 'exception': e, 'name': name}
+
+            matches.append(match)
+
+            if stops_on(check, match, no_stop):
+                break
+
+        return matches
+
+    async def run_shadow_checks(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]]
+                                ) -> List[dict]:
+        """
+        Runs shadow filters' checks in one job on the shadow pool, which has its own worker so that sampling
+        live traffic never competes with enforcement: nothing runs inline or shares the batcher's round trips.
+        Every check runs unfused and without stopping on a match, and results are recorded like run_checks'.
+
+        If the job runs over the message budget, only the shadow pool is restarted, and the checks are re-run
+        one by one on it to find and quarantine the filter(s) responsible.
+        """
+        filter_budget, message_budget = self.time_budget
+        executor = self.shadow_executor
+        t0 = time.perf_counter()
+
+        try:
+            matches = await asyncio.wait_for(self._dispatch_checks(settings, checks, no_stop=True, fused=False,
+                                                                   executor=executor),
+                                             timeout=message_budget)
+        except asyncio.TimeoutError:
+            # Concurrent shadow jobs time out together; only the first needs to restart the pool
+            if self.shadow_executor is executor:
+                logger.warning('shadow checks for server %s exceeded the %gs message budget, restarting the '
+                               'shadow pool' % (settings.server_id, message_budget))
+                self.restart_executor('shadow_executor')
+
+            t0 = time.perf_counter()
+            matches = await self.diagnose_each(settings, checks, no_stop=True, pool='shadow_executor')
+        except BrokenProcessPool as e:
+            # Another shadow job's overrun restarted the pool out from under this one
+            return [{'time': 0, 'exception': e, 'name': c[0]} for c in checks]
+
+        pool_wait = max(0.0, time.perf_counter() - t0 - sum(check_time(m) for m in matches))
+        self.record_checks(settings, checks, matches, pool_wait=pool_wait)
+        return matches
+
+    async def run_diagnostic_checks(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]]
+                                    ) -> List[dict]:
+        """
+        Runs checks for the debug and test commands in one job on the diagnostic pool, which has its own
+        worker so they never hold up enforcement. Every check runs by itself (no stopping on a match or
+        fused groups), so each result's time is its own filter's, and nothing is recorded in telemetry.
+
+        If the job runs over the message budget, the diagnostic pool is restarted and every check comes
+        back with the exception.
+        """
+        filter_budget, message_budget = self.time_budget
+
+        try:
+            return await asyncio.wait_for(self._dispatch_checks(settings, checks, no_stop=True, fused=False,
+                                                                executor=self.diagnostic_executor),
+                                          timeout=message_budget)
+        except asyncio.TimeoutError:
+            self.restart_executor('diagnostic_executor')
+            e = asyncio.TimeoutError('ran over the %gs message budget' % message_budget)
+            return [{'time': message_budget, 'exception': e, 'name': c[0]} for c in checks]
+        except BrokenProcessPool as e:
+            self.restart_executor('diagnostic_executor')
+            return [{'time': 0, 'exception': e, 'name': c[0]} for c in checks]
+
+    async def _dispatch_checks(self, settings: ServerConfig, checks: List[Tuple[str, str, bool, bool]],
+                               no_stop: bool = False, fused: bool = True, executor=None) -> List[dict]:
+        """
+        Runs checks against the server's filter set resident in the executor (or `executor`).
+
+        Only the server ID, config version and check inputs are sent, unless the worker
+        that picks up the job doesn't have that version yet.
+        """
+        return (await self._dispatch_batch(settings, [checks], no_stop, fused, executor))[0]
+
+    async def _dispatch_batch(self, settings: ServerConfig, batches: List[List[Tuple[str, str, bool, bool]]],
+                              no_stop: bool = False, fused: bool = True, executor=None) -> List[List[dict]]:
+        """
+        _dispatch_checks for several messages' checks in one executor job, returning each one's results
+        """
+        executor = executor or self.executor
+        func = partial(check_batches_resident, settings.server_id, settings.version, batches,
+                       no_stop=no_stop, fused=fused)
+        results = await self.bot.loop.run_in_executor(executor, func)
+
+        if results is None:
+            func = partial(check_batches_resident, settings.server_id, settings.version, batches,
+                           spec=settings.filter_spec(), no_stop=no_stop, fused=fused)
+            results = await self.bot.loop.run_in_executor(executor, func)
+
+        return results
+
+    def restart_executor(self, pool: str = 'executor'):
+        """
+        Replaces the executor (or the 'diagnostic_executor' or 'shadow_executor'), killing the old one's
+        workers so that a stalled pattern can't hold them.
+        """
+        workers = {'diagnostic_executor': DIAGNOSTIC_WORKERS, 'shadow_executor': SHADOW_WORKERS}.get(pool, self.workers)
+        old_executor = getattr(self, pool)
+        setattr(self, pool, ExecutorClass(workers))
+
+        # Threads can't be killed; on Windows a stalled thread keeps running until its pattern finishes
+        for process in list((getattr(old_executor, '_processes', None) or {}).values()):
+            process.terminate()
+
+        old_executor.shutdown(wait=False)
+
+    def quarantine_filter(self, settings: ServerConfig, name: str, reason: str, elapsed: float):
+        _filter = settings.filters.get(name)
+
+        if not _filter or _filter.quarantine:
+            return
+
+        _filter.quarantine = {
+            'reason'  : reason,
+            'time'    : datetime.utcnow().isoformat(),
+            'elapsed' : elapsed
+        }
+
+        settings.update_order()
+        self.save()
+
+        logger.warning('quarantined filter %s in server %s: %s' % (name, settings.server_id, reason))
+        self.bot.loop.create_task(self.notify_quarantine(settings, _filter))
+
+    async def notify_quarantine(self, settings: ServerConfig, _filter: Filter):
+        server = self.bot.get_server(settings.server_id)
+
+        if not (server and server.owner):
+            return
+
+        try:
+            await self.bot.send_message(server.owner, warning(
+                'The recensor filter `%s` in %s was quarantined because it %s. It will not be checked until a '
+                'moderator changes its pattern or releases it with `recensor release %s`.'
+                % (_filter.name, server.name, _filter.quarantine['reason'], _filter.name)
+            ))
+        except Exception:
+            logger.exception('error sending quarantine notice for filter %s in server %s'
+                             % (_filter.name, settings.server_id))
 
     async def post_flash(self, filter_hit: Filter, first_message: Message, **kwargs):
         if filter_hit.flash_sec == -1 or not filter_hit.flash_msg:
@@ -3372,11 +6863,7 @@ class ReCensor:
             msg = await self.bot.send_message(destination, msg)
 
             if filter_hit.flash_sec > 0 and not filter_hit.flash_dm:
-                async def delete_task():
-                    await asyncio.sleep(filter_hit.flash_sec)
-                    await self.bot.delete_message(msg)
-
-                self.bot.loop.create_task(delete_task())
+                self.deleter.queue(msg, delay=filter_hit.flash_sec)
         except Exception:
             logger.exception('error sending notification for filter %s on message %s/%s/%s by %s' %
                              (filter_hit.name, first_message.server.id, first_message.channel.id,
@@ -3399,12 +6886,14 @@ class ReCensor:
             return
 
         settings = self.settings[server.id]
-        message_deque = self._message_cache[cache_key]
+        message_deque = self._message_cache.get(cache_key, create=True)
         self.cleanup_deque(message_deque)
 
         # Only set if message is new or when updating existing
         if (message.id in message_deque) == _edit:
-            message_deque[message.id] = message
+            message_deque[message.id] = MessageRecord(message)
+
+        self._message_cache.update(cache_key)
 
         if not message.channel.permissions_for(server.me).manage_messages:
             return
@@ -3419,7 +6908,7 @@ class ReCensor:
                          (filter_name, message.server.id, message.channel.id,
                           message.id, message.author.id, _edit))
 
-            await self.bot.delete_message(message)
+            self.deleter.queue(message)
             # deleting a message may make a gap
             message_deque.pop(message.id, None)
 
@@ -3427,10 +6916,46 @@ class ReCensor:
                 await self.post_flash(filter_hit, message, match=match_substr)
 
         await self.handle_seq(self.settings[server.id], message_deque, list_cache)
+        self._message_cache.update(cache_key)
+
+        # Enforcement is done; shadow filters run in the background so they can't hold it up
+        if settings.shadow_order:
+            task = self.bot.loop.create_task(self.run_shadow(settings, message))
+            self._shadow_tasks.add(task)
+            task.add_done_callback(self._shadow_tasks.discard)
+
+    async def run_shadow(self, settings: ServerConfig, message: Message):
+        try:
+            await settings.check_shadow(message)
+        except Exception:
+            logger.exception('error running shadow filters on message %s/%s/%s'
+                             % (message.server.id, message.channel.id, message.id))
 
     async def on_message_edit(self, old_message, new_message):
         await self.on_message(new_message, _edit=True)
 
+    def clear_eligibility(self, server: discord.Server):
+        settings = server and self.settings.get(server.id)
+
+        if settings:
+            settings.eligibility.clear()
+
+    async def on_channel_update(self, before, after):
+        self.clear_eligibility(getattr(after, 'server', None))
+
+    async def on_channel_delete(self, channel):
+        self.clear_eligibility(getattr(channel, 'server', None))
+
+    async def on_server_role_update(self, before, after):
+        self.clear_eligibility(after.server)
+
+        if before.name != after.name:
+            self.mod_status.discard(after.server)
+
+    async def on_server_role_delete(self, role):
+        self.clear_eligibility(role.server)
+        self.mod_status.discard(role.server)
+
     async def on_message_delete(self, message):
         server = message.server
         cache_key = (message.channel.id, message.author.id)
@@ -3440,19 +6965,21 @@ class ReCensor:
                 or cache_key not in self._message_cache or cache_key in self._deleted:
             return
 
-        message_deque = self._message_cache[cache_key]
+        message_deque = self._message_cache.get(cache_key)
         self.cleanup_deque(message_deque)
         message_deque.pop(message.id, None)
+        self._message_cache.update(cache_key)
 
         if not message.channel.permissions_for(server.me).manage_messages:
             return
 
         self._deleted[cache_key] = True
         await self.handle_seq(self.settings[server.id], message_deque)
+        self._message_cache.update(cache_key)
 
     @staticmethod
-    def cleanup_deque(message_deque: BoundedOrderedDict):
-        cutoff = datetime.utcnow() - timedelta(seconds=MSG_HISTORY_MAX_TIME)
+    def cleanup_deque(message_deque: MessageHistory, now: datetime = None):
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=MSG_HISTORY_MAX_TIME)
 
         for message_obj in list(message_deque.values()):
             if message_obj.timestamp > cutoff:
@@ -3460,16 +6987,33 @@ class ReCensor:
             else:
                 message_deque.popitem(last=False)  # popleft
 
-    async def handle_seq(self, settings: ServerConfig, message_deque: BoundedOrderedDict,
+    async def handle_seq(self, settings: ServerConfig, message_deque: MessageHistory,
                          list_cache: Optional[dict] = None):
-        all_to_delete = []
+        for filter_hit, to_delete, match_substr in await self.sequence_hits(settings, message_deque, list_cache):
+            for message in to_delete:
+                self.deleter.queue(message)
+
+            if filter_hit:
+                await self.post_flash(filter_hit, to_delete[0], match=match_substr, messages=to_delete)
+
+    async def sequence_hits(self, settings: ServerConfig, message_deque: MessageHistory,
+                            list_cache: Optional[dict] = None
+                            ) -> List[Tuple[Optional[Filter], List[Message], Optional[str]]]:
+        """
+        Checks a message sequence until nothing more matches, removing matched messages from it as it goes.
+
+        Returns a (filter hit, messages to delete, match substring) tuple for each pass that matched.
+        """
+        hits = []
 
         if list_cache is None:
             list_cache = {}
 
         # Try until the deque is empty or we're out of stuff to delete (cascades)
         while message_deque:
-            filter_hit, to_delete, match_substr = await settings.check_sequence(message_deque.values(), list_cache)
+            filter_hit, to_delete, match_substr = await settings.check_sequence(message_deque.values(), list_cache,
+                                                                                history=message_deque,
+                                                                                cascade=bool(hits))
             to_delete = sorted(to_delete, key=lambda m: m.id)
 
             if not to_delete:
@@ -3481,23 +7025,137 @@ class ReCensor:
                 logger.debug('filter %s hit on messages %s/%s/[%s] by %s' %
                              (filter_name, first_msg.server.id, first_msg.channel.id,
                               message_ids, first_msg.author.id))
-                all_to_delete.extend(to_delete)
+                hits.append((filter_hit, to_delete, match_substr))
 
             for deleted_message in to_delete:
                 message_deque.pop(deleted_message.id, None)
 
-            if filter_hit:
-                await self.post_flash(filter_hit, to_delete[0], match=match_substr, messages=to_delete)
+        return hits
+
+    async def load_patterns(self):
+        """
+        Compiles enabled filters' patterns in the background after startup, yielding between each.
+        Filters compile on first use anyway; this just keeps that cost off the first messages.
+        """
+        for settings in list(self.settings.values()):
+            for _filter in list(settings.order):
+                if _filter._pattern_entry is None:
+                    _filter.load_pattern()
+                    await asyncio.sleep(0)
+
+    async def scan_task(self, job: ScanJob):
+        server = job.ctx.message.server
+        status = None
+
+        try:
+            for channel in job.channels:
+                job.channel = channel
+                await self.scan_channel(self.settings[server.id], job, channel)
+
+            status = 'Scan completed in %s.' % format_seconds((datetime.utcnow() - job.start).total_seconds())
+        except asyncio.CancelledError:
+            status = 'Scan cancelled after %s.' % format_seconds((datetime.utcnow() - job.start).total_seconds())
+        except Exception as e:
+            logger.exception('error scanning server %s' % server.id)
+            status = 'Scan stopped by an error in #%s: %s: %s' % (job.channel.name, type(e).__name__, e)
+        finally:
+            self._scans.pop(server.id, None)
+
+        await self.update_scan_status(job, status)
+
+    async def scan_channel(self, settings: ServerConfig, job: ScanJob, channel: discord.Channel):
+        """
+        Streams a channel's history since job.since through the filters, a page at a time
+        """
+        multi_msg = any(f.multi_msg for f in settings.order)
+        histories = defaultdict(MessageHistory)
+        after = job.since
+
+        while True:
+            page = []
+
+            async for message in self.bot.logs_from(channel, limit=SCAN_PAGE_SIZE, after=after, reverse=True):
+                page.append(message)
+
+            if not page:
+                break
+
+            after = page[-1]
+            page = [m for m in page if m.author != self.bot.user]
+            to_delete = []
+            job.scanned += len(page)
+
+            # Single-message checks for the whole page go to the executor together
+            for message, (filter_hit, should_delete, match_substr) in zip(page, await settings.check_messages(page)):
+                if should_delete:
+                    self.record_scan_hit(job, filter_hit, [message])
+                    to_delete.append(message)
+                elif multi_msg:
+                    # Sequences depend on what came before, so they're checked in order
+                    history = histories[message.author.id]
+                    self.cleanup_deque(history, now=message.timestamp)
+                    history[message.id] = MessageRecord(message)
+
+                    for seq_hit, seq_delete, seq_substr in await self.sequence_hits(settings, history):
+                        self.record_scan_hit(job, seq_hit, seq_delete)
+                        to_delete.extend(seq_delete)
+
+            if to_delete and not job.dry_run:
+                await self.delete_scanned(job, to_delete)
+
+            await self.update_scan_status(job)
+
+    @staticmethod
+    def record_scan_hit(job: ScanJob, filter_hit: Optional[Filter], messages: List[Message]):
+        job.matched += len(messages)
+        job.filter_hits[filter_hit.name if filter_hit else '<ambiguous>'] += len(messages)
+
+    async def delete_scanned(self, job: ScanJob, messages: List[Message]):
+        """
+        Deletes messages from one channel in bulk where Discord allows it, and one at a time otherwise
+        """
+        cutoff = datetime.utcnow() - BULK_DELETE_MAX_AGE
+        recent = [m for m in messages if m.timestamp > cutoff]
+        batches = [recent[i:i + BULK_DELETE_MAX] for i in range(0, len(recent), BULK_DELETE_MAX)]
+        batches.extend([m] for m in messages if m.timestamp <= cutoff)
+
+        for batch in batches:
+            try:
+                if len(batch) == 1:
+                    await self.bot.delete_message(batch[0])
+                else:
+                    await self.bot.delete_messages(batch)
+
+                job.deleted += len(batch)
+            except discord.HTTPException:
+                logger.exception('error deleting scanned messages in channel %s' % batch[0].channel.id)
+                job.failed += len(batch)
 
-        if len(all_to_delete) == 1:
-            await self.bot.delete_message(all_to_delete[0])
-        elif all_to_delete:
-            await self.bot.delete_messages(all_to_delete)
+    async def update_scan_status(self, job: ScanJob, status: str = None):
+        """
+        Edits the scan's status message, at most once per SCAN_EDIT_INTERVAL unless a final status is given
+        """
+        now = datetime.utcnow()
+
+        if status is None and job.last_edit and now - job.last_edit < SCAN_EDIT_INTERVAL:
+            return
+
+        job.last_edit = now
+        content = job.format_status(status)
+
+        try:
+            job.status_msg = await self.bot.edit_message(job.status_msg, new_content=content)
+        except discord.NotFound:
+            job.status_msg = await self.bot.send_message(job.ctx.message.channel, content)
 
     async def on_command(self, command, ctx):
         if ctx.cog is self and self.analytics:
             self.analytics.command(ctx)
 
+    async def on_command_completion(self, command, ctx):
+        if command.qualified_name in MOD_SETTING_COMMANDS:
+            self.mod_status.invalidate()
+
 
 def check_folder():
     if not os.path.exists(DATA_PATH):